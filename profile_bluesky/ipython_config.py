@@ -572,3 +572,9 @@ c.StoreMagics.autorestore = True
 #                                    #'pyOlog.cli.ipy',
 #                                    ]
 #c.TerminalIPythonApp.pylab = 'auto'
+
+# Profile the startup files (time, imports, memory, PV connections).
+# Writes JSON and prints a summary, see startup/custom/startup_profiler.py
+# Same as setting the BLUESKY_STARTUP_PROFILE environment variable.
+#import os
+#os.environ["BLUESKY_STARTUP_PROFILE"] = "/tmp/bluesky_startup_profile.json"
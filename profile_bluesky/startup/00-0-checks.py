@@ -1,8 +1,16 @@
-print(__file__)
-
 import sys
 import os
 
+# make the local packages (custom, synApps_ophyd) importable
+_startup_dir = os.path.dirname(os.path.abspath(__file__))
+if _startup_dir not in sys.path:
+    sys.path.insert(0, _startup_dir)
+
+# times and orders the startup files, connects devices in background
+from custom.startup_loader import StartupLoader
+startup = StartupLoader(globals())
+startup.stage(__file__)
+
 # ensure Python 3.6+
 
 req_version = (3,6)
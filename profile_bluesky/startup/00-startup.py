@@ -1,4 +1,4 @@
-print(__file__)
+startup.stage(__file__)
 
 # Make ophyd listen to pyepics.
 #from ophyd import setup_ophyd
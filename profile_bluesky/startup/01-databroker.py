@@ -1,4 +1,4 @@
-print(__file__)
+startup.stage(__file__)
 
 # set up the data broker (db)
 
@@ -6,8 +6,11 @@ import os
 callback_db = {}
 
 # load config from ~/.config/databroker/mongodb_config.yml
-from databroker import Broker
-db = Broker.named("mongodb_config")
+# (databroker import and mongodb connection run in the background)
+def _connect_databroker():
+    from databroker import Broker
+    return Broker.named("mongodb_config")
+db = startup.background("db", _connect_databroker)
 
 
 ### one-time setup for a mongodb server and "collection"
@@ -17,9 +20,23 @@ if False:
 	install_sentinels(db.reg.config, version=1)
 
 
+# Slow callbacks get documents through the dispatcher:
+# each one has its own queue and thread, the RunEngine does not wait.
+# print(dispatcher.report()) shows queue depth and lag.
+from custom.dispatcher import DocumentDispatcher
+dispatcher = DocumentDispatcher(RE)
+
 # Subscribe metadatastore to documents.
 # If this is removed, data is not saved to metadatastore.
-callback_db['Broker'] = RE.subscribe(db.insert)
+# (events are written in bulk; db is the placeholder until connected)
+# print(db_inserter.report()) shows the number of writes.
+# RE() returns once the run is in the databroker (stop_wait, seconds),
+# so db[-1] is complete.  Insert errors are logged and counted (errors
+# in dispatcher.report()), and the last one is raised at the end of the run.
+from custom.buffered_insert import BufferedInserter
+db_inserter = BufferedInserter.for_broker(db, max_events=500, max_seconds=1.0)
+callback_db['Broker'] = dispatcher.subscribe(
+    db_inserter, name="Broker", stop_wait=60)
 
 # Set up SupplementalData.
 from bluesky import SupplementalData
@@ -36,6 +53,7 @@ from bluesky.magics import BlueskyMagics
 get_ipython().register_magics(BlueskyMagics)
 
 # Set up the BestEffortCallback.
+# (it plots, so it stays in the RunEngine's thread)
 from bluesky.callbacks.best_effort import BestEffortCallback
 bec = BestEffortCallback()
 callback_db['BestEffortCallback'] = RE.subscribe(bec)
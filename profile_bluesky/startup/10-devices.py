@@ -1,4 +1,4 @@
-print(__file__)
+startup.stage(__file__)
 
 """Set up default complex devices"""
 
@@ -13,7 +13,7 @@ from ophyd import SingleTrigger, ImagePlugin, HDF5Plugin
 from ophyd.areadetector.filestore_mixins import FileStoreHDF5IterativeWrite
 
 import apstools.devices as APS_devices
-import apstools.plans as APS_plans
+APS_plans = startup.lazy_import("apstools.plans")
 
 # TODO: fix upstream!!
 class NullMotor(SoftPositioner):
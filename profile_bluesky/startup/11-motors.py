@@ -1,11 +1,12 @@
-print(__file__)
+startup.stage(__file__)
 
 """motors, stages, positioners, ..."""
 
-m1 = EpicsMotor('prj:m1', name='m1', labels=("general",))
-m2 = EpicsMotor('prj:m2', name='m2', labels=("general",))
-m3 = EpicsMotor('prj:m3', name='m3', labels=("general",))
-m4 = EpicsMotor('prj:m4', name='m4', labels=("general",))
+# motors connect in the background, first use waits for connection
+m1 = startup.device("m1", EpicsMotor, 'prj:m1', name='m1', labels=("general",))
+m2 = startup.device("m2", EpicsMotor, 'prj:m2', name='m2', labels=("general",))
+m3 = startup.device("m3", EpicsMotor, 'prj:m3', name='m3', labels=("general",))
+m4 = startup.device("m4", EpicsMotor, 'prj:m4', name='m4', labels=("general",))
 
 class MyRig(Device):
     t = Component(EpicsMotor, "m5", labels=("rig",),)
@@ -26,7 +27,7 @@ class MyRig(Device):
         return ['t.readback', 'l.readback', 'b.readback', 'r.readback']
 
 
-rig = MyRig("prj:", name="rig")
+rig = startup.device("rig", MyRig, "prj:", name="rig")
 
 # m5 = EpicsMotor('prj:m5', name='m5')
 # m6 = EpicsMotor('prj:m6', name='m6')
@@ -35,6 +36,12 @@ rig = MyRig("prj:", name="rig")
 
 # append_wa_motor_list(m1, m2, m3, m4, m5, m6, m7, m8)
 
-shutter = APS_devices.EpicsMotorShutter("prj:m9", name="shutter", labels=("shutter",))
-shutter.closed_position = 0.0
-shutter.open_position = 3.0        # takes a little time to get here
+def _setup_shutter(obj):
+    obj.closed_position = 0.0
+    obj.open_position = 3.0        # takes a little time to get here
+
+shutter = startup.device(
+    "shutter", 
+    APS_devices.EpicsMotorShutter, "prj:m9", 
+    name="shutter", labels=("shutter",),
+    setup=_setup_shutter)
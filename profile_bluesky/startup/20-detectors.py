@@ -1,10 +1,14 @@
-print(__file__)
+startup.stage(__file__)
 
 """various detectors and other signals"""
 
 # noisy = EpicsSignalRO('prj:userCalc1', name='noisy')
 # scaler = EpicsScaler('prj:scaler1', name='scaler')
 
-scaler = ScalerCH('prj:scaler1', name='scaler')
-scaler.match_names()
-APS_devices.use_EPICS_scaler_channels(scaler)
+def _setup_scaler(obj):
+    obj.match_names()
+    APS_devices.use_EPICS_scaler_channels(obj)
+
+scaler = startup.device(
+    "scaler", ScalerCH, 'prj:scaler1', name='scaler', 
+    setup=_setup_scaler)
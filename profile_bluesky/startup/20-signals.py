@@ -1,4 +1,4 @@
-print(__file__)
+startup.stage(__file__)
 
 """other signals"""
 
@@ -9,3 +9,7 @@ print(__file__)
 # calcs.enable.put("Enable")
 # swait_setup_incrementer(calcs.calc2)
 # calcs.calc2.desc.put("incrementer")
+
+# the IOC steps the scan (see sscan_fly() in 50-plans.py)
+# sscan_flyer = SscanFlyer(scans, name="sscan_flyer")
+# RE(sscan_fly(sscan_flyer, [I0, diode], m2, -1, 1, 11, m1, -2, 2, 41))
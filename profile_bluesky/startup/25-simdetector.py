@@ -1,4 +1,4 @@
-print(__file__)
+startup.stage(__file__)
 
 """ADSimDetector"""
 
@@ -30,33 +30,43 @@ class MySingleTriggerHdf5SimDetector(SingleTrigger, SimDetector):
     )
 
 
-try:
-    _ad_prefix = "13SIM1:"
-    
-    # Preset the FrameType mbbo records for the HDF5 addresses
-    # to store each type of acquisition.  Coordinates with
-    # configuration in the attributes and layout XML files for AD.
-    class MyMbboLabels(Device):
-        label0 = Component(EpicsSignal, ".ZRST")
-        label1 = Component(EpicsSignal, ".ONST")
-        label2 = Component(EpicsSignal, ".TWST")
-    mbbo     = MyMbboLabels(_ad_prefix+"cam1:FrameType",     name="mbbo")
-    mbbo_rbv = MyMbboLabels(_ad_prefix+"cam1:FrameType_RBV", name="mbbo_rbv")
-    for obj in (mbbo, mbbo_rbv):                # original values
-        obj.label0.put("/exchange/data")        # Normal
-        obj.label1.put("/exchange/data_dark")   # Background
-        obj.label2.put("/exchange/data_white")  # FlatField
-    del mbbo, mbbo_rbv, obj, MyMbboLabels       # dispose temporary items
-        
-    adsimdet = MySingleTriggerHdf5SimDetector(_ad_prefix, name='adsimdet')
-    adsimdet.read_attrs.append("hdf1")
+_ad_prefix = "13SIM1:"
+
+
+# Preset the FrameType mbbo records for the HDF5 addresses
+# to store each type of acquisition.  Coordinates with
+# configuration in the attributes and layout XML files for AD.
+class MyMbboLabels(Device):
+    label0 = Component(EpicsSignal, ".ZRST")
+    label1 = Component(EpicsSignal, ".ONST")
+    label2 = Component(EpicsSignal, ".TWST")
+
+
+def _preset_frame_type_labels(obj):     # original values
+    obj.label0.put("/exchange/data")        # Normal
+    obj.label1.put("/exchange/data_dark")   # Background
+    obj.label2.put("/exchange/data_white")  # FlatField
+
+
+def _setup_adsimdet(det):
+    det.read_attrs.append("hdf1")
     # option: 
-    # del adsimdet.hdf1.stage_sigs["array_counter"]
-    adsimdet.hdf1.stage_sigs["file_template"] = '%s%s_%3.3d.h5'
-    # adsimdet.hdf1.file_name.put("test")
+    # del det.hdf1.stage_sigs["array_counter"]
+    det.hdf1.stage_sigs["file_template"] = '%s%s_%3.3d.h5'
+    # det.hdf1.file_name.put("test")
+
 
-except TimeoutError:
-    print(f"Could not connect {_ad_prefix} sim detector")
+# all three connect together in the background
+# if 13SIM1: is not available, each becomes a DisconnectedDevice
+_mbbo = startup.device(
+    "_mbbo", MyMbboLabels, _ad_prefix+"cam1:FrameType", 
+    name="mbbo", setup=_preset_frame_type_labels)
+_mbbo_rbv = startup.device(
+    "_mbbo_rbv", MyMbboLabels, _ad_prefix+"cam1:FrameType_RBV", 
+    name="mbbo_rbv", setup=_preset_frame_type_labels)
+adsimdet = startup.device(
+    "adsimdet", MySingleTriggerHdf5SimDetector, _ad_prefix, 
+    name='adsimdet', setup=_setup_adsimdet)
 
 
 def demo_count_simdet(det, count_time=0.2):
@@ -1,14 +1,45 @@
-print(__file__)
+startup.stage(__file__)
 
 """plans"""
 
+from custom.frame_acquisition import FrameAcquisition
 
-def frame_set(det, frame_type=0, num_frames=1):
-    yield from bps.mv(det.cam.frame_type, frame_type)
-    for frame_num in range(num_frames):
-        yield from bps.mv(det.cam.acquire, 1)
-        while det.cam.acquire.value != 0:
-            yield from bps.sleep(0.01)
+
+# cam.FrameType: HDF5 dataset of each frame (see 25-simdetector.py)
+FRAME_TYPE_NORMAL = 0
+FRAME_TYPE_BACKGROUND = 1
+FRAME_TYPE_FLATFIELD = 2
+FRAME_TYPE_DATASETS = {
+    FRAME_TYPE_NORMAL: "/exchange/data",
+    FRAME_TYPE_BACKGROUND: "/exchange/data_dark",
+    FRAME_TYPE_FLATFIELD: "/exchange/data_white",
+}
+
+
+def _report_block(label, acq):
+    print("{}: {} frames in {:.3f} s, {:.1f} frames/s".format(
+        label, acq.frames, acq.elapsed, acq.frames_per_second))
+
+
+def frame_set(det, frame_type=0, num_frames=1, acq=None, moves=()):
+    """
+    acquire ``num_frames`` of ``frame_type`` with one Acquire
+
+    The camera takes all the frames (ImageMode Multiple, NumImages),
+    the plan waits for the end of the acquisition (Acquire monitor).
+    ``moves`` (such as ``(shutter, "open")``) are made in parallel
+    with the camera settings, before the acquisition.
+    Returns the ``FrameAcquisition`` (frames, elapsed, frames/s).
+    """
+    acq = acq or FrameAcquisition(det.cam)
+    yield from bps.mv(
+        det.cam.frame_type, frame_type,
+        det.cam.image_mode, "Multiple",
+        det.cam.num_images, num_frames,
+        *moves
+    )
+    yield from bps.trigger(acq, wait=True)
+    return acq
 
 
 def series(det, num_images=4, num_darks=3, num_flats=2):
@@ -26,15 +57,17 @@ def series(det, num_images=4, num_darks=3, num_flats=2):
         det.hdf1.capture, 1,
     )
 
+    acq = FrameAcquisition(det.cam)
     for i, num in enumerate(num_frames):
-        print("type {}, frames {}".format(i, num))
-        yield from frame_set(det, frame_type=i, num_frames=num)
+        yield from frame_set(det, frame_type=i, num_frames=num, acq=acq)
+        _report_block("type {}".format(i), acq)
 
     print("restore")
     yield from bps.mv(
         det.hdf1.num_capture, 1,
         det.hdf1.file_write_mode, 'Single',
         det.cam.image_mode, "Single",
+        det.cam.num_images, 1,
         det.cam.num_exposures, 1,
         det.cam.frame_type, 0,
     )
@@ -43,33 +76,97 @@ def series(det, num_images=4, num_darks=3, num_flats=2):
 def darks_flats_images(det, shutter, stage, pos_in, pos_out, n_darks=3, n_flats=4, n_images=5, count_time=0.2, md=None):
     """
     (demo only) take a sequence of area detector frames and store them all in one file
-    
+
     dark frames are stored into one dataset
     flat frames are stored into another dataset
     image frames are stored into a third dataset
-    
+
     The area detector HDF5 file plugin has a feature that diverts the image stream
     based on a specific global variable defined in the layout file.
+
+    Each block (darks, flats, images) is one acquisition of all its
+    frames (``frame_set()``), one event: frame type, frames,
+    frames/s, HDF5 file and dataset of the frames, stage position.
+    The frames are not in databroker (no resource or datum: the
+    AD_HDF5 handler does not read these datasets), read them from
+    the HDF5 file.  Moves are made in parallel with
+    the camera settings, and with each other where the frames
+    do not depend on their order:
+
+    * darks: shutter closes, the stage moves out (the darks
+      do not wait for the stage)
+    * flats: shutter opens once the stage is out
+    * images: stage moves in (shutter stays open)
     """
     det.cam.stage_sigs["acquire_time"] = count_time
+    det.cam.stage_sigs["num_images"] = 1
+    acq = FrameAcquisition(det.cam)
+    fps = Signal(name="frames_per_second", value=0)
+    dataset = Signal(name="hdf5_dataset", value="")
+    _md = dict(
+        plan_name="darks_flats_images",
+        num_darks=n_darks,
+        num_flats=n_flats,
+        num_images=n_images,
+        count_time=count_time,
+    )
+    _md.update(md or {})
 
-    yield from bps.mv(
-        shutter, "close", 
-        det.cam.frame_type, 1,   # Background
-        det.hdf1.num_capture, n_darks + n_flats + n_images,
-        )
-    yield from bp.count([det], num=n_darks, md=md)
+    def block(label, frame_type, num_frames, moves=()):
+        yield from frame_set(
+            det, frame_type=frame_type, num_frames=num_frames,
+            acq=acq, moves=moves)
+        _report_block(label, acq)
+        yield from bps.mv(
+            fps, acq.frames_per_second,
+            dataset, FRAME_TYPE_DATASETS[frame_type])
+        # the frames are acquired: read, nothing to trigger
+        yield from bps.create()
+        for obj in (det.cam.frame_type, det.cam.num_images_counter, fps,
+                    det.hdf1.full_file_name, dataset, stage):
+            yield from bps.read(obj)
+        yield from bps.save()
 
-    yield from bps.mv(
-        shutter, "open", 
-        stage, pos_out,
-        det.cam.frame_type, 2)   # FlatField
-    yield from bp.count([det], num=n_flats, md=md)
+    @bpp.stage_decorator([det])
+    @bpp.run_decorator(md=_md)
+    def _inner():
+        yield from bps.abs_set(stage, pos_out, group="stage_out")
+        yield from block(
+            "darks", FRAME_TYPE_BACKGROUND, n_darks,
+            moves=(shutter, "close"))
 
-    yield from bps.mv(
-        shutter, "open", 
-        stage, pos_in,
-        det.cam.frame_type, 0)   # images
-    yield from bp.count([det], num=n_images, md=md)
+        yield from bps.wait(group="stage_out")
+        yield from block(
+            "flats", FRAME_TYPE_FLATFIELD, n_flats,
+            moves=(shutter, "open"))
+
+        yield from block(
+            "images", FRAME_TYPE_NORMAL, n_images,
+            moves=(stage, pos_in))
+
+        yield from bps.mv(shutter, "close")
 
-    yield from bps.mv(shutter, "close")
+    # one file for all frames (opened when det is staged)
+    yield from bps.mv(det.hdf1.num_capture, n_darks + n_flats + n_images)
+    return (yield from _inner())
+
+
+def sscan_fly(flyer, detectors, *args, md=None, **kwargs):
+    """
+    grid scan stepped by the IOC's sscan records (``SscanFlyer``)
+
+    ``args`` as ``bp.grid_scan()``: ``motor, start, stop, num``
+    for each dimension, slowest first.  ``kwargs`` are passed
+    to ``flyer.prepare()`` (triggers, settle_time, ...).
+    Data are collected as event pages, one each line.
+    """
+    flyer.prepare(detectors, *args, **kwargs)
+    _md = dict(
+        plan_name="sscan_fly",
+        detectors=[det.name for det in detectors],
+        motors=[motor.name for motor, _s, _e, _n in flyer.dimensions],
+        shape=flyer.shape,
+        num_points=int(np.prod(flyer.shape)),
+    )
+    _md.update(md or {})
+    yield from bp.fly([flyer], md=_md)
@@ -1,4 +1,4 @@
-print(__file__)
+startup.stage(__file__)
 
 from datetime import datetime
 import apstools
@@ -1,10 +1,14 @@
-print(__file__)
+startup.stage(__file__)
 
 """ophyd Flyer example with the busy record fly scan"""
 
+from collections import OrderedDict
 import os
 from enum import Enum
 
+from custom.busy_sim import BusyIocSimulator, sim_device
+from custom.waveform_flyer import waveform_flyer_class
+
 
 logger = logging.getLogger(os.path.split(__file__)[-1])
 
@@ -48,6 +52,18 @@ class BusyFlyerDevice(Device):
         self.complete_status = None
         self.t0 = time.time()
         self.waves = (self.time, self.axis, self.signal)
+        self.points_ready = 0       # NORD of the time waveform, this flight
+        self.points_collected = 0   # points already returned by collect()
+        self._subscriptions = []
+
+    @property
+    def flying(self):
+        """has been kicked off and is not done yet"""
+        return self.complete_status is not None and not self.complete_status.done
+
+    def new_points(self):
+        """number of points ready but not yet collected"""
+        return self.points_ready - self.points_collected
 
     def kickoff(self):
         """
@@ -55,19 +71,34 @@ class BusyFlyerDevice(Device):
         """
         logger.info("kickoff()")
         self.complete_status = DeviceStatus(self.busy)
+        self.points_ready = 0
+        self.points_collected = 0
         
-        def cb(*args, **kwargs):
-            if self.busy.value in (BusyStatus.done):
+        def busy_cb(value=None, **kwargs):
+            if value in (BusyStatus.done, 0):
+                self._unsubscribe()
                 self.complete_status._finished(success=True)
         
+        def nord_cb(value=None, **kwargs):
+            self.points_ready = int(value)
+        
         self.t0 = time.time()
+        # only changes from now on (NORD is from the last flight until updated)
+        self._subscriptions = [
+            (self.time.number_read, self.time.number_read.subscribe(nord_cb, run=False)),
+            (self.busy, self.busy.subscribe(busy_cb, run=False)),
+        ]
         self.busy.put(BusyStatus.busy)
-        self.busy.subscribe(cb)
 
         kickoff_status = DeviceStatus(self)
         kickoff_status._finished(success=True)
         return kickoff_status
 
+    def _unsubscribe(self):
+        for signal, cid in self._subscriptions:
+            signal.unsubscribe(cid)
+        self._subscriptions = []
+
     def complete(self):
         """
         Wait for flying to be complete
@@ -83,35 +114,131 @@ class BusyFlyerDevice(Device):
         schema = {}
         for item in self.waves:
             structure = dict(
-                source = item.wave.pvname,
+                # (simulated signals have no pvname)
+                source = getattr(item.wave, "pvname", item.wave.name),
                 dtype = "number",
                 shape = (1,)
             )
             schema[item.name] = structure
         return {self.name: schema}
 
+    def read_waveforms(self):
+        """
+        read each waveform once, trimmed to the points collected (NORD)
+        
+        :returns: OrderedDict of name : numpy array, all the same length
+        """
+        arrays = OrderedDict()
+        for item in self.waves:
+            arrays[item.name] = np.asarray(item.wave.get())
+        nord = min(
+            [int(item.number_read.get()) for item in self.waves]
+            + [len(v) for v in arrays.values()])
+        for k, v in arrays.items():
+            arrays[k] = v[:nord]
+        return arrays
+
+    def _page(self, start=0):
+        """
+        data from the waveforms (points ``start`` and after), as one event page
+        
+        Each point's timestamp is its value in the time waveform.
+        """
+        arrays = self.read_waveforms()
+        for k, v in arrays.items():
+            arrays[k] = v[start:]
+        times = arrays[self.time.name].tolist()
+        # demo: offset time instead (removes large offset)
+        arrays[self.time.name] = arrays[self.time.name] - self.t0
+        data = OrderedDict((k, v.tolist()) for k, v in arrays.items())
+        timestamps = {k: times for k in data}
+        return dict(time=times, data=data, timestamps=timestamps)
+
+    def _new_page(self):
+        """
+        page of the points not yet collected
+        
+        While flying (streaming), the waveforms are only read
+        when NORD reports new points.
+        """
+        if self.flying and self.new_points() <= 0:
+            return dict(time=[], data={}, timestamps={})
+        page = self._page(start=self.points_collected)
+        self.points_collected += len(page["time"])
+        if not self.flying:
+            self.complete_status = None
+        return page
+
     def collect(self):
         """
-        Start this Flyer
+        Retrieve data from the flyer as *proto-events*
+        
+        Can be called while flying: returns only the points
+        not collected before (see ``fly_streaming()``).
         """
         logger.info("collect(): " + str(self.complete_status))
-        self.complete_status = None
-        for i in range(int(self.time.number_read.value)):
-            data = {}
-            timestamps = {}
-            t = time.time()
-            for item in self.waves:
-                data[item.name] = item.wave.value[i]
-                timestamps[item.name] = t
-            
-            # demo: offset time instead (removes large offset)
-            data[self.time.name] -= self.t0
-            
-            yield dict(time=time.time(), data=data, timestamps=timestamps)
+        page = self._new_page()
+        keys = list(page["data"].keys())
+        for i, t in enumerate(page["time"]):
+            data = {k: page["data"][k][i] for k in keys}
+            timestamps = {k: t for k in keys}
+            yield dict(time=t, data=data, timestamps=timestamps)
+
+    def collect_pages(self):
+        """
+        Retrieve data from the flyer as one *proto-event-page*
+        
+        (used instead of ``collect()`` by RunEngines that support pages)
+        """
+        logger.info("collect_pages(): " + str(self.complete_status))
+        page = self._new_page()
+        if len(page["time"]) > 0:
+            yield page
 
 
 bfly = BusyFlyerDevice(name="bfly")
 
+# same, with simulated records (no IOC needed), see custom/busy_sim.py
+bfly_sim = sim_device(BusyFlyerDevice, BusyIocSimulator(), name="bfly_sim")
+
+# same PVs, with the general waveform flyer (event pages, any channels)
+BusyWaveformFlyer = waveform_flyer_class(
+    OrderedDict(time=TIME_WAVE_PV, axis=X_WAVE_PV, signal=Y_WAVE_PV),
+    trigger_pv=BUSY_PV,
+    time_channel="time",
+    class_name="BusyWaveformFlyer")
+wfly = BusyWaveformFlyer(name="wfly")
+
+
+def fly_streaming(flyers, *, md=None, period=0.2):
+    """
+    variant of bp.fly() that collects while flying, stream=True on collect()
+    
+    Every ``period`` seconds, the new points of each flyer are 
+    collected, so callbacks (live plots, SPEC file) see the data 
+    during the scan and little is left to collect at the end.
+    
+    EXAMPLE::
+    
+        RE(fly_streaming([bfly], md=dict(purpose="streaming busy flyer")))
+    """
+    group = "fly_streaming"
+    yield from bps.open_run(md)
+    for flyer in flyers:
+        yield from bps.kickoff(flyer, wait=True)
+    statuses = []
+    for flyer in flyers:
+        status = yield from bps.complete(flyer, group=group, wait=False)
+        statuses.append(status)
+    while not all(status.done for status in statuses):
+        yield from bps.sleep(period)
+        for flyer in flyers:
+            yield from bps.collect(flyer, stream=True)
+    yield from bps.wait(group=group)
+    for flyer in flyers:
+        yield from bps.collect(flyer, stream=True)
+    yield from bps.close_run()
+
 
 # RE(bp.fly([bfly], md=dict(purpose="develop busy flyer model")))
 # https://github.com/NSLS-II/bluesky/blob/master/bluesky/plans.py#L1415
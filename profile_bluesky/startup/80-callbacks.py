@@ -1,15 +1,20 @@
-print(__file__)
+startup.stage(__file__)
 
 # custom callbacks
 
-import apstools.callbacks
-import apstools.filewriters
+from custom.adsimdet_specwriter import SpecWriterCallback
 
 
+#import apstools.callbacks
 #doc_collector = apstools.callbacks.DocumentCollectorCallback()
 #callback_db['doc_collector'] = RE.subscribe(doc_collector.receiver)
 
-specwriter = apstools.filewriters.SpecWriterCallback()
+# this SpecWriterCallback keeps a scan index (<file>.idx) next to the data file
+# so newfile() and usefile() do not need to read all the scans
+specwriter = SpecWriterCallback()
 specwriter.newfile(os.path.join("/tmp", specwriter.spec_filename))
-callback_db['specwriter'] = RE.subscribe(specwriter.receiver)
+callback_db['specwriter'] = dispatcher.subscribe(specwriter.receiver, name="specwriter")
 print("SPEC data file:", specwriter.spec_filename)
+
+# end of startup: print the timing report
+startup.finish()
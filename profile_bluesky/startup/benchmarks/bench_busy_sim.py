@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+"""
+benchmark: BusyIocSimulator steps per second and step timing
+
+Runs simulated busy record scans (no IOC):
+
+* ``records``: the simulator alone
+* ``ophyd``: with a fake ophyd device bound to the records
+  (the busy flyer's waveforms and NORD, monitored by ophyd)
+* ``fly``: ``bp.fly()`` of the busy flyer (``BusyFlyerDevice``
+  of 70-busy_flyer.py) with simulated records, in a RunEngine
+* ``paced``: with ``--step-time``, measures how close each step
+  is to its due time
+"""
+
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+from bluesky import RunEngine
+import bluesky.plan_stubs as bps
+import bluesky.plans as bp
+import numpy as np
+from ophyd import Component, Device, DeviceStatus, EpicsSignal, EpicsSignalRO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from custom.busy_sim import BusyIocSimulator, sim_device
+
+
+class Waveform(Device):
+    wave = Component(EpicsSignalRO, "")
+    number_read = Component(EpicsSignalRO, ".NORD")
+
+
+class BusyScan(Device):
+    """the PVs of the busy flyer (70-busy_flyer.py)"""
+    busy = Component(EpicsSignal, "prj:mybusy")
+    time = Component(Waveform, "prj:t_array")
+    axis = Component(Waveform, "prj:x_array")
+    signal = Component(Waveform, "prj:y_array")
+
+
+def load_busy_flyer():
+    """``BusyFlyerDevice`` class, from the startup file 70-busy_flyer.py"""
+    filename = os.path.join(os.path.dirname(__file__), "..", "70-busy_flyer.py")
+    # names from the earlier startup files
+    namespace = dict(
+        __file__=filename,
+        startup=type("Startup", (), dict(stage=staticmethod(lambda f: None))),
+        logging=logging, time=time, np=np, bps=bps,
+        Component=Component, Device=Device, DeviceStatus=DeviceStatus,
+        EpicsSignal=EpicsSignal, EpicsSignalRO=EpicsSignalRO,
+    )
+    # (its EPICS devices are made, never connected)
+    with open(filename) as f:
+        exec(compile(f.read(), filename, "exec"), namespace)
+    return namespace["BusyFlyerDevice"]
+
+
+def fly(sim, flyer):
+    """``bp.fly()`` of one scan, returns (seconds, cpu seconds, points)"""
+    RE = RunEngine({})
+    points = []
+
+    def count(name, doc):
+        if name == "event":
+            points.append(1)
+        elif name == "event_page":
+            points.append(len(doc["seq_num"]))
+
+    RE.subscribe(count)
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    RE(bp.fly([flyer]))
+    return time.perf_counter() - t0, time.process_time() - cpu0, sum(points)
+
+
+def run(sim, busy):
+    """one scan, returns (seconds, cpu seconds)"""
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    busy.put(1)
+    sim.wait()
+    return time.perf_counter() - t0, time.process_time() - cpu0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--steps", type=int, default=10000)
+    parser.add_argument("--step-time", type=float, default=0.001)
+    args = parser.parse_args()
+
+    fmt = "{:<8s} {:>8s} {:>10s} {:>12s} {:>14s}"
+    print(fmt.format("test", "steps", "seconds", "steps/s", "cpu us/step"))
+
+    sim = BusyIocSimulator(num_steps=args.steps, nelm=args.steps)
+    seconds, cpu = run(sim, sim.busy)
+    print(fmt.format(
+        "records", str(sim.steps), "%.3f" % seconds,
+        "%.0f" % (sim.steps / seconds), "%.1f" % (1e6 * cpu / sim.steps)))
+
+    device = sim_device(BusyScan, sim, name="scan")
+    seconds, cpu = run(sim, device.busy)
+    assert device.time.number_read.get() == sim.steps
+    print(fmt.format(
+        "ophyd", str(sim.steps), "%.3f" % seconds,
+        "%.0f" % (sim.steps / seconds), "%.1f" % (1e6 * cpu / sim.steps)))
+
+    flyer = sim_device(load_busy_flyer(), sim, name="bfly_sim")
+    seconds, cpu, points = fly(sim, flyer)
+    assert points == sim.steps
+    print(fmt.format(
+        "fly", str(sim.steps), "%.3f" % seconds,
+        "%.0f" % (sim.steps / seconds), "%.1f" % (1e6 * cpu / sim.steps)))
+
+    steps = min(args.steps, 1000)
+    sim.num_steps = steps
+    sim.step_time = args.step_time
+    seconds, cpu = run(sim, sim.busy)
+    print(fmt.format(
+        "paced", str(sim.steps), "%.3f" % seconds,
+        "%.0f" % (sim.steps / seconds), "%.1f" % (1e6 * cpu / sim.steps)))
+    t = sim.pv("prj:t_array").value
+    late = (t - t[0]) - np.arange(len(t)) * args.step_time
+    print("paced: {} ms steps, late by {:.3f} ms mean, {:.3f} ms max (no drift)".format(
+        1000 * args.step_time, 1000 * late.mean(), 1000 * late.max()))
+    sim.stop()
+
+
+if __name__ == "__main__":
+    main()
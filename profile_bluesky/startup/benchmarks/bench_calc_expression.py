@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""
+benchmark: EPICS calc expressions (synApps_ophyd.calc_expression)
+
+For each expression: time to parse (first ``compile_calc()``) and
+to get it from the cache, then inputs per second, evaluated one
+point at a time (``--single`` points) and all ``--points`` at once.
+"""
+
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from synApps_ophyd.calc_expression import compile_calc
+from synApps_ophyd.swait_sim import (
+    CALC_GAUSSIAN, CALC_LORENTZIAN, CALC_PSEUDOVOIGT, CALC_RANDOM, CALC_INCREMENTER)
+
+
+def expressions(n):
+    """(expression, inputs) -- inputs as arrays of n"""
+    a = np.linspace(-1.5, -0.5, n)
+    peak = dict(A=a, B=-1, C=0.05, D=1e5, E=0.05, F=0.3)
+    steps = np.floor(np.linspace(-10, 10, n) / 2.5)
+    return (
+        (CALC_GAUSSIAN, peak),
+        (CALC_LORENTZIAN, peak),
+        (CALC_PSEUDOVOIGT, peak),
+        (CALC_RANDOM, dict(A=a)),
+        (CALC_INCREMENTER, dict(A=np.arange(n), B=100000)),
+        ("floor(A/B)", dict(A=np.linspace(-10, 10, n), B=2.5)),
+        ("C&&(A!=B)", dict(A=np.roll(steps, 1), B=steps, C=1)),
+    )
+
+
+def elapsed(function, *args, **kwargs):
+    t0 = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - t0
+
+
+def one_at_a_time(calc, inputs, rng):
+    arrays = {k: v for k, v in inputs.items() if np.ndim(v) > 0}
+    for i in range(len(next(iter(arrays.values())))):
+        point = dict(inputs)
+        point.update({k: v[i] for k, v in arrays.items()})
+        calc(rng=rng, **point)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, default=1000000)
+    parser.add_argument("--single", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(1)
+    fmt = "{:<60s} {:>10s} {:>10s} {:>14s} {:>14s}"
+    print("{} points, one at a time: {} points".format(args.points, args.single))
+    print(fmt.format("expression", "parse", "cached", "single pts/s", "array pts/s"))
+    single = dict(expressions(args.single))
+    for expression, inputs in expressions(args.points):
+        compile_calc.cache_clear()
+        parse = elapsed(compile_calc, expression)
+        cached = elapsed(compile_calc, expression)
+        calc = compile_calc(expression)
+        t_single = elapsed(one_at_a_time, calc, single[expression], rng)
+        t_array = elapsed(calc, rng=rng, **inputs)
+        print(fmt.format(
+            expression,
+            "%.0f us" % (parse * 1e6),
+            "%.1f us" % (cached * 1e6),
+            "%.0f" % (args.single / t_single),
+            "%.0f" % (args.points / t_array)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""
+benchmark: databroker insert, one document at a time vs. BufferedInserter
+
+Inserts the documents of a synthetic scan and reports events per
+second.  The database is ``MemoryStore`` with a round-trip latency
+(default: 0.5 ms, about that of a local mongod) or, with ``--mongo``,
+a MongoDB server (needs pymongo).
+"""
+
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from custom.buffered_insert import BufferedInserter, MemoryStore
+from bench_specwriter import documents
+
+
+class MongoStore(object):
+    """documents into a MongoDB database, one collection per document type"""
+
+    def __init__(self, uri, database="bench_inserter"):
+        import pymongo
+        self.client = pymongo.MongoClient(uri)
+        self.client.drop_database(database)
+        self.db = self.client[database]
+
+    def insert(self, name, doc):
+        self.db[name].insert_one(dict(doc))
+
+    def bulk_insert_events(self, descriptor_uid, events):
+        self.db["event"].insert_many([dict(event) for event in events])
+
+
+def run(store, buffered, num_points, num_channels, max_events):
+    """insert one scan, return seconds"""
+    if buffered:
+        inserter = BufferedInserter(
+            store.insert, store.bulk_insert_events, max_events=max_events)
+    else:
+        inserter = store.insert
+    docs = list(documents(num_points, num_channels, "uid-%s" % buffered))
+    t0 = time.perf_counter()
+    for key, doc in docs:
+        inserter(key, doc)
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, default=5000)
+    parser.add_argument("--channels", type=int, default=8)
+    parser.add_argument("--max-events", type=int, default=500)
+    parser.add_argument(
+        "--latency", type=float, default=0.0005,
+        help="MemoryStore round-trip time, seconds (default: 0.0005)")
+    parser.add_argument(
+        "--mongo", default=None,
+        help="MongoDB URI, such as mongodb://localhost:27017/")
+    args = parser.parse_args()
+
+    print("scan: {} points, {} channels".format(args.points, args.channels))
+    fmt = "{:<10s} {:>10s} {:>10s} {:>12s}"
+    print(fmt.format("insert", "seconds", "events/s", "round_trips"))
+    for label, buffered in (("each", False), ("buffered", True)):
+        if args.mongo:
+            store = MongoStore(args.mongo)
+            round_trips = lambda: "n/a"
+        else:
+            store = MemoryStore(latency=args.latency)
+            round_trips = lambda: str(store.round_trips)
+        elapsed = run(store, buffered, args.points, args.channels, args.max_events)
+        print(fmt.format(
+            label, "%.3f" % elapsed, "%.0f" % (args.points / elapsed), round_trips()))
+
+
+if __name__ == "__main__":
+    main()
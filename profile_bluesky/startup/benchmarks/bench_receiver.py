@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+"""
+benchmark: SpecWriterCallback.receiver, documents per second
+
+Sends a synthetic scan through ``receiver()`` (as the RunEngine
+does) and reports documents per second, before and after
+the receiver's per-document overhead was removed.
+
+The *before* variant reproduces the previous ``receiver()``:
+print every document, rebuild the dispatch table, get the logger,
+and make a datetime from each document's time.
+The scan is not written (``auto_write=False``).
+Console output goes to ``os.devnull`` (a real terminal is slower).
+"""
+
+
+import argparse
+import contextlib
+import datetime
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from custom.adsimdet_specwriter import SpecWriterCallback
+from bench_specwriter import documents
+
+
+class BeforeSpecWriter(SpecWriterCallback):
+    """the previous receiver()"""
+
+    def receiver(self, key, document):
+        print("receiver", key, document)
+        xref = dict(
+            start = self.start,
+            descriptor = self.descriptor,
+            event = self.event,
+            bulk_events = self.bulk_events,
+            stop = self.stop,
+        )
+        logger = logging.getLogger(__name__)
+        uid = document.get("uid")
+        if uid is None:
+            uid = document["datum_id"]
+        logger.debug("{} document, uid={}".format(key, uid))
+        if key in xref:
+            self._datetime = datetime.datetime.fromtimestamp(document["time"])
+            self._time = document["time"]
+            xref[key](document)
+        else:
+            msg = "custom_callback encountered: {} : {}".format(key, document)
+            logger.warning(msg)
+
+
+def run(writer_class, num_points, num_channels):
+    """send one scan through receiver(), return (documents, seconds)"""
+    path = tempfile.mkdtemp()
+    writer = writer_class(os.path.join(path, "bench.dat"), auto_write=False)
+    docs = list(documents(num_points, num_channels, "uid-1"))
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            t0 = time.perf_counter()
+            for key, doc in docs:
+                writer.receiver(key, doc)
+            elapsed = time.perf_counter() - t0
+    for name in os.listdir(path):
+        os.remove(os.path.join(path, name))
+    os.rmdir(path)
+    return len(docs), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, default=10000)
+    parser.add_argument("--channels", type=int, default=8)
+    args = parser.parse_args()
+
+    print("scan: {} points, {} channels".format(args.points, args.channels))
+    fmt = "{:<8s} {:>10s} {:>10s} {:>12s}"
+    print(fmt.format("receiver", "documents", "seconds", "documents/s"))
+    for label, cls in (("before", BeforeSpecWriter), ("after", SpecWriterCallback)):
+        num_docs, elapsed = run(cls, args.points, args.channels)
+        print(fmt.format(
+            label, str(num_docs), "%.3f" % elapsed, "%.0f" % (num_docs / elapsed)))
+
+
+if __name__ == "__main__":
+    main()
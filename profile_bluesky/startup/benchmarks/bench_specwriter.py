@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+"""
+benchmark: SpecWriterCallback, NumPy columns vs. Python lists
+
+Feeds a synthetic scan (default: 100k points, 70 detector channels,
+as many as an sscan record) to the SPEC writer and reports the
+throughput (events/s) and peak memory (Python allocations) for
+collecting the events and for writing the scan.
+
+The *lists* variant reproduces the previous implementation
+(one Python list per column, formatted row by row).
+"""
+
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from custom.adsimdet_specwriter import SpecWriterCallback
+
+
+class ListColumnsSpecWriter(SpecWriterCallback):
+    """the previous implementation: one Python list per column"""
+
+    def descriptor(self, doc):
+        super().descriptor(doc)
+        if doc["name"] == "primary":
+            for k in self.data.keys():
+                self.data[k] = []
+
+    def _commit_rows(self):
+        rows, self._rows = self._rows, []
+        for row in rows:
+            for column, v in zip(self.data.values(), row):
+                column.append(v)
+
+    def _data_lines(self, start=0, stop=None):
+        lines = []
+        keys = list(self.data.keys())
+        for i in range(self.num_primary_data)[start:stop]:
+            lines += self._format_row(i, [self.data[k][i] for k in keys])
+        return lines
+
+    def _scan_chunks(self, rows=None):
+        """the whole scan as one list of lines, as before"""
+        lines = []
+        for chunk in super()._scan_chunks(rows=max(self.num_primary_data, 1)):
+            lines += chunk
+        yield lines
+
+
+def documents(num_points, num_channels, uid):
+    """synthetic document stream: a step scan of one motor"""
+    t0 = time.time()
+    channels = ["D%02d" % (k + 1) for k in range(num_channels)]
+    yield "start", dict(
+        uid=uid, time=t0, scan_id=1, plan_type="generator", 
+        plan_name="scan", detectors=channels, motors=["m1"], hints={})
+    yield "descriptor", dict(
+        uid="desc-" + uid, name="primary", time=t0, 
+        data_keys={k: {} for k in ["m1"] + channels})
+    rng = np.random.RandomState(1)
+    pool = [     # reuse a few data dicts, the writer copies the values
+        dict(zip(channels, rng.random_sample(num_channels).tolist()))
+        for _ in range(100)
+    ]
+    for i in range(num_points):
+        data = dict(pool[i % len(pool)])
+        data["m1"] = 0.001 * i
+        yield "event", dict(
+            uid="e%d" % i, descriptor="desc-" + uid, time=t0 + 0.001*i, 
+            seq_num=i + 1, data=data, timestamps={})
+    yield "stop", dict(
+        uid="stop-" + uid, time=t0 + 0.001*num_points, 
+        exit_status="success", num_events=dict(primary=num_points))
+
+
+def run(writer_class, num_points, num_channels, memory=False):
+    """feed one scan, return (collect_s, write_s, peak_MB)"""
+    path = tempfile.mkdtemp()
+    writer = writer_class(
+        os.path.join(path, "bench.dat"), auto_write=False)
+    if memory:
+        tracemalloc.start()
+    t_collect = 0
+    for key, doc in documents(num_points, num_channels, "uid-1"):
+        if "time" in doc:
+            writer._time = doc["time"]
+        t0 = time.perf_counter()
+        getattr(writer, key)(doc)
+        t_collect += time.perf_counter() - t0
+    t0 = time.perf_counter()
+    writer.write_scan()
+    t_write = time.perf_counter() - t0
+    peak = 0
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1] / 1024**2
+        tracemalloc.stop()
+    for name in os.listdir(path):
+        os.remove(os.path.join(path, name))
+    os.rmdir(path)
+    return t_collect, t_write, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--channels", type=int, default=70)
+    args = parser.parse_args()
+
+    print("scan: {} points, {} channels".format(args.points, args.channels))
+    fmt = "{:<8s} {:>12s} {:>12s} {:>12s} {:>12s}"
+    print(fmt.format("columns", "collect_s", "write_s", "events/s", "peak_MB"))
+    for label, cls in (("lists", ListColumnsSpecWriter), ("numpy", SpecWriterCallback)):
+        t_collect, t_write, _peak = run(cls, args.points, args.channels)
+        _c, _w, peak = run(cls, args.points, args.channels, memory=True)
+        rate = args.points / (t_collect + t_write)
+        print(fmt.format(
+            label, 
+            "%.3f" % t_collect, "%.3f" % t_write, 
+            "%.0f" % rate, "%.1f" % peak))
+
+
+if __name__ == "__main__":
+    main()
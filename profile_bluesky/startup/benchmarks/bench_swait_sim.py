@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""
+benchmark: swait simulators (synApps_ophyd.swait_sim), points per second
+
+For each simulator, evaluates ``--points`` positions one at a
+time (``sim(x)``) and in batches of ``--batch`` (``sim.evaluate()``).
+Then runs ``bp.scan()`` of ``--scan`` points with ``sim.signal()``
+as the detector (the RunEngine's rate, for comparison).
+"""
+
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from synApps_ophyd.swait_sim import (
+    GaussianSim, LorentzianSim, PseudoVoigtSim, RandomSim, IncrementerSim)
+
+
+def simulators():
+    return (
+        GaussianSim(center=-1, width=0.05, scale=1e5, seed=1),
+        LorentzianSim(center=-1, width=0.05, scale=1e5, seed=1),
+        PseudoVoigtSim(center=-1, width=0.05, scale=1e5, eta=0.3, seed=1),
+        RandomSim(seed=1),
+        IncrementerSim(),
+    )
+
+
+def point_by_point(sim, positions):
+    for x in positions:
+        sim(x)
+
+
+def batches(sim, positions, batch_size):
+    for i in range(0, len(positions), batch_size):
+        sim.evaluate(positions[i:i + batch_size])
+
+
+def rate(function, *args, num):
+    t0 = time.perf_counter()
+    function(*args)
+    return num / (time.perf_counter() - t0)
+
+
+def scan_rate(num_points):
+    from bluesky import RunEngine
+    import bluesky.plans as bp
+    from ophyd.sim import motor
+
+    RE = RunEngine({})
+    det = GaussianSim(center=-1, width=0.05, scale=1e5, seed=1).signal(motor, name="noisy")
+    t0 = time.perf_counter()
+    RE(bp.scan([det], motor, -1.5, -0.5, num_points))
+    return num_points / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, default=1000000)
+    parser.add_argument("--batch", type=int, default=100000)
+    parser.add_argument("--scan", type=int, default=1000, help="points of bp.scan()")
+    args = parser.parse_args()
+
+    positions = np.linspace(-1.5, -0.5, args.points)
+    fmt = "{:<16s} {:>16s} {:>16s}"
+    print("points/s, {} points".format(args.points))
+    print(fmt.format("", "point by point", "batch %d" % args.batch))
+    for sim in simulators():
+        one = rate(point_by_point, sim, positions, num=args.points)
+        many = rate(batches, sim, positions, args.batch, num=args.points)
+        print(fmt.format(sim.__class__.__name__, "%.0f" % one, "%.0f" % many))
+
+    print("bp.scan() of {} points: {:.0f} points/s".format(
+        args.scan, scan_rate(args.scan)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+"""
+benchmark: make synApps_ophyd devices, channels made when used vs. all at once
+
+Makes ``--devices`` each of ``EpicsSscanDevice`` and
+``EpicsUserCalcsDevice``, with lazy channels (as in synApps_ophyd)
+and with all channels made at once (as before).  Reports the
+seconds, memory (Python allocations), and EPICS signals
+(each a PV search) of each.  No IOC is needed: nothing waits
+for a connection until a channel is used.
+"""
+
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+from ophyd.signal import EpicsSignal, EpicsSignalBase
+from ophyd.device import Component as Cpt, DynamicDeviceComponent as DDC
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import synApps_ophyd
+from synApps_ophyd.synApps_sscan import (
+    _sscan_positioners, _sscan_detectors, _sscan_triggers)
+from synApps_ophyd.synApps_swait import _swait_channels
+
+
+class EagerSscanRecord(synApps_ophyd.EpicsSscanRecord):
+    positioners = DDC(_sscan_positioners("1 2 3 4".split(), lazy=False))
+    detectors = DDC(_sscan_detectors(["%02d" % k for k in range(1,71)], lazy=False))
+    triggers = DDC(_sscan_triggers("1 2 3 4".split(), lazy=False))
+
+
+class EagerSscanDevice(synApps_ophyd.EpicsSscanDevice):
+    scan1 = Cpt(EagerSscanRecord, 'scan1')
+    scan2 = Cpt(EagerSscanRecord, 'scan2')
+    scan3 = Cpt(EagerSscanRecord, 'scan3')
+    scan4 = Cpt(EagerSscanRecord, 'scan4')
+    scanH = Cpt(EagerSscanRecord, 'scanH')
+
+
+class EagerSwaitRecord(synApps_ophyd.EpicsSwaitRecord):
+    channels = DDC(_swait_channels("A B C D E F G H I J K L".split(), lazy=False))
+
+
+class EagerUserCalcsDevice(synApps_ophyd.EpicsUserCalcsDevice):
+    calc1 = Cpt(EagerSwaitRecord, 'userCalc1')
+    calc2 = Cpt(EagerSwaitRecord, 'userCalc2')
+    calc3 = Cpt(EagerSwaitRecord, 'userCalc3')
+    calc4 = Cpt(EagerSwaitRecord, 'userCalc4')
+    calc5 = Cpt(EagerSwaitRecord, 'userCalc5')
+    calc6 = Cpt(EagerSwaitRecord, 'userCalc6')
+    calc7 = Cpt(EagerSwaitRecord, 'userCalc7')
+    calc8 = Cpt(EagerSwaitRecord, 'userCalc8')
+    calc9 = Cpt(EagerSwaitRecord, 'userCalc9')
+    calc10 = Cpt(EagerSwaitRecord, 'userCalc10')
+
+
+def count_signals(device):
+    """EPICS signals made so far (lazy channels not yet used are not counted)"""
+    n = 0
+    for sub in device._signals.values():
+        if isinstance(sub, EpicsSignalBase):
+            n += 1
+        elif hasattr(sub, "_signals"):
+            n += count_signals(sub)
+    return n
+
+
+def make(device_class, num_devices):
+    """make the devices, returns (devices, seconds, bytes)"""
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    devices = [
+        device_class("bench%d:" % i, name="dev%d" % i)
+        for i in range(num_devices)]
+    seconds = time.perf_counter() - t0
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return devices, seconds, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--devices", type=int, default=1, help="of each class")
+    args = parser.parse_args()
+
+    # start Channel Access first, not in the first case timed
+    EpicsSignal("bench:warmup", name="warmup")
+
+    fmt = "{:<30s} {:>10s} {:>10s} {:>10s}"
+    print(fmt.format("", "seconds", "MB", "signals"))
+    cases = (
+        ("EpicsSscanDevice", EagerSscanDevice, synApps_ophyd.EpicsSscanDevice),
+        ("EpicsUserCalcsDevice", EagerUserCalcsDevice, synApps_ophyd.EpicsUserCalcsDevice),
+    )
+    for label, eager, lazy in cases:
+        for how, device_class in (("all", eager), ("lazy", lazy)):
+            devices, seconds, size = make(device_class, args.devices)
+            signals = sum(count_signals(d) for d in devices)
+            print(fmt.format(
+                "%s (%s)" % (label, how),
+                "%.3f" % seconds, "%.2f" % (size / 1e6), str(signals)))
+            del devices
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""
+benchmark: WaveformFlyer, points per second collected as events vs. pages
+
+A fake (simulated) double buffered flyer with ``--channels``
+waveforms is fed ``--buffers`` full buffers of ``--points`` each,
+as an IOC would.  Reports the points per second of the whole
+flight (read the waveforms, make pages) and then of ``collect()``
+(one event per point) and ``collect_pages()``.
+"""
+
+
+import argparse
+from collections import OrderedDict
+import os
+import sys
+import time
+
+import numpy as np
+from ophyd.sim import make_fake_device
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from custom.waveform_flyer import waveform_flyer_class
+
+
+def fly(num_channels, num_points, num_buffers):
+    """one flight, returns (flyer, seconds)"""
+    channels = OrderedDict(
+        ("ch%02d" % i, "bench:wave%02d" % i) for i in range(num_channels))
+    cls = waveform_flyer_class(
+        channels, "bench:start", done_pv="bench:done",
+        buffer_suffixes=("_A", "_B"), ready_pv="bench:ready")
+    flyer = make_fake_device(cls)(name="wfly")
+    flyer.buffers_ready.sim_put(0)
+    flyer.done_signal.sim_put(1)
+    data = np.random.random_sample(num_points)
+
+    t0 = time.perf_counter()
+    flyer.kickoff()
+    for k in range(num_buffers):
+        # the "IOC" fills buffer k while the flyer reads buffer k-1
+        buffer = flyer.buffer(k)
+        for name in flyer.channel_names:
+            channel = getattr(buffer, name)
+            channel.wave.sim_put(data)
+            channel.number_read.sim_put(num_points)
+        # (no overrun: buffer k-1 is read before the next fill starts)
+        while flyer.buffers_read < k:
+            time.sleep(0.0001)
+        flyer.buffers_ready.sim_put(k + 1)
+    flyer.done_signal.sim_put(0)
+    flyer.complete_status.wait(60)
+    return flyer, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--channels", type=int, default=40)
+    parser.add_argument("--points", type=int, default=1000, help="per buffer")
+    parser.add_argument("--buffers", type=int, default=20)
+    args = parser.parse_args()
+
+    total = args.points * args.buffers
+    print("{} channels, {} buffers of {} points".format(
+        args.channels, args.buffers, args.points))
+    fmt = "{:<16s} {:>10s} {:>12s}"
+    print(fmt.format("", "seconds", "points/s"))
+
+    flyer, seconds = fly(args.channels, args.points, args.buffers)
+    assert flyer.points_read == total and flyer.overruns == 0
+    print(fmt.format("flight", "%.3f" % seconds, "%.0f" % (total / seconds)))
+
+    for method in ("collect", "collect_pages"):
+        flyer, _ = fly(args.channels, args.points, args.buffers)
+        t0 = time.perf_counter()
+        items = list(getattr(flyer, method)())
+        seconds = time.perf_counter() - t0
+        print(fmt.format(
+            "%s()" % method, "%.3f" % seconds, "%.0f" % (total / seconds)))
+
+
+if __name__ == "__main__":
+    main()
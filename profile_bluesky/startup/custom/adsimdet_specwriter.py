@@ -24,10 +24,14 @@ import datetime
 import getpass
 import logging
 import os
+import numpy as np
 import socket
 import time
 
-logger = logging.getLogger(__name__).addHandler(logging.NullHandler())
+from .spec_index import SpecScanIndex
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
 
 #    Programmer's Note: subclassing from `object` avoids the need 
 #    to import `bluesky.callbacks.core.CallbackBase`.  
@@ -42,6 +46,7 @@ logger = logging.getLogger(__name__).addHandler(logging.NullHandler())
 
 
 SPEC_TIME_FORMAT = "%a %b %d %H:%M:%S %Y"
+ROWS_PER_BLOCK = 1024       # event rows added to the data columns at once
 
 image_file_path = "/tmp/simdet/%Y/%m/%d/"
 _ad_prefix = "13SIM1:"
@@ -69,6 +74,135 @@ class MySingleTriggerHdf5SimDetector(SingleTrigger, SimDetector):
 
 
 
+class ColumnBuffer(object):
+    """
+    one column of scan data, kept in a growable NumPy array
+    
+    Numbers are stored with a numeric dtype (int becomes float if
+    needed), anything else (such as a str, or True/False mixed
+    with numbers) in an object array.
+    Capacity doubles as needed, so adding values is amortized O(1).
+    Values are best added in blocks, with ``extend()``.
+    """
+    
+    def __init__(self, capacity=1024):
+        self._array = None
+        self._capacity = capacity
+        self.size = 0
+    
+    def __len__(self):
+        return self.size
+    
+    def __getitem__(self, i):
+        return self.values[i]
+    
+    @property
+    def values(self):
+        """NumPy array of the data in this column"""
+        if self._array is None:
+            return np.empty(0)
+        return self._array[:self.size]
+    
+    @staticmethod
+    def _as_array(values):
+        """values as a 1-D array: numeric dtype if possible, else object"""
+        try:
+            array = np.array(values)
+        except ValueError:
+            array = None    # ragged, such as lists of different lengths
+        if array is not None and array.ndim == 1 and array.dtype.kind in "bif":
+            types = set(map(type, values))
+            mixed_bool = array.dtype.kind in "if" and (
+                bool in types or np.bool_ in types)
+            if not mixed_bool:
+                return array
+        array = np.empty(len(values), dtype=object)
+        for i, v in enumerate(values):
+            array[i] = v    # each value as is, even a list or array
+        return array
+    
+    def _reserve(self, count, dtype):
+        """make room (and the right dtype) for ``count`` more values"""
+        needed = self.size + count
+        if self._array is None:
+            self._array = np.empty(max(self._capacity, needed), dtype=dtype)
+            return
+        current = self._array.dtype
+        if current != dtype:
+            if object in (current, dtype) or bool in (current, dtype):
+                dtype = np.dtype(object)    # keep True/False as written
+            else:
+                dtype = np.promote_types(current, dtype)
+        if needed > len(self._array) or dtype != current:
+            capacity = len(self._array)
+            while capacity < needed:
+                capacity *= 2
+            array = np.empty(capacity, dtype=dtype)
+            array[:self.size] = self._array[:self.size]
+            self._array = array
+    
+    def append(self, value):
+        """add one value to the end of the column"""
+        self.extend((value,))
+    
+    def extend(self, values):
+        """add several values (a sequence or array) to the end of the column"""
+        if len(values) == 0:
+            return
+        values = self._as_array(values)
+        self._reserve(len(values), values.dtype)
+        end = self.size + len(values)
+        self._array[self.size:end] = values
+        self.size = end
+    
+    def text(self, start=0, stop=None):
+        """
+        format the column (or rows ``start:stop``) for the data file
+        
+        :returns: ([str] text of each row, {row: str} of the str values)
+        
+        As written in SPEC data files, a str value is replaced
+        by its row number (and reported on a #U line).
+        """
+        values = self.values[start:stop]
+        if values.dtype != object:
+            # same text as str() of each value, done in C
+            return list(map(str, values.tolist())), {}
+        text, strings = [], {}
+        for i, v in enumerate(values, start=start):
+            if isinstance(v, str):
+                strings[i] = v
+                v = i
+            text.append(str(v))
+        return text, strings
+
+
+def _document_time(key, doc):
+    """time of a document (of the last event in a page or bulk_events)"""
+    if key == "event_page":
+        return max(doc["time"], default=time.time())
+    if key == "bulk_events":
+        return max(
+            (event["time"] 
+             for events in doc.values() 
+             for event in events),
+            default=time.time())
+    return doc["time"]
+
+
+def _events_to_page(descriptor_uid, events):
+    """combine the event documents of one descriptor into an event page"""
+    keys = events[0]["data"].keys()
+    return dict(
+        descriptor=descriptor_uid,
+        uid=[event["uid"] for event in events],
+        seq_num=[event["seq_num"] for event in events],
+        time=[event["time"] for event in events],
+        data={k: [event["data"][k] for event in events] for k in keys},
+        timestamps={k: [event["timestamps"].get(k) for event in events] for k in keys},
+    )
+
+
 def _rebuild_scan_command(doc):
     """reconstruct the scan command for SPEC data file #S line"""
     
@@ -116,7 +250,13 @@ class SpecWriterCallback(object):
     collect data from BlueSky RunEngine documents to write as SPEC data
     
     This gathers data from all documents and appends scan to the file 
-    when the *stop* document is received.
+    when the *stop* document is received.  In *streaming* mode, the 
+    scan header is written at the *descriptor* document and each 
+    *event* is written as it arrives (buffered, flushed periodically).
+    
+    Scan numbers and uids are kept in a sidecar index file 
+    (see ``spec_index.SpecScanIndex``) so the data file is not
+    read back to check for duplicates.
     
     Parameters
     filename : string, optional
@@ -128,6 +268,18 @@ class SpecWriterCallback(object):
         is received.
         If False, the caller is responsible for calling `write_scan()`
         before the next *start* document is received.
+        (ignored in streaming mode)
+    streaming : boolean, optional
+        If True, write each event as it arrives.  (default: False)
+        The scan's #N line reports the number of data columns
+        (as SPEC does), in both modes.
+    flush_lines : int, optional
+        streaming: flush after this many buffered data lines (default: 100)
+    flush_seconds : float, optional
+        streaming: flush when buffered data is this old (default: 1.0)
+    trace : boolean, optional
+        If True, print (and log at DEBUG level) every document
+        received.  For debugging only, this is slow.  (default: False)
     User Interface methods
     .. autosummary::
        
@@ -145,21 +297,39 @@ class SpecWriterCallback(object):
        ~start
        ~descriptor
        ~event
+       ~event_page
        ~bulk_events
        ~stop
     """
     
-    def __init__(self, filename=None, auto_write=True):
+    def __init__(self, filename=None, auto_write=True, 
+                 streaming=False, flush_lines=100, flush_seconds=1.0,
+                 trace=False):
+        self._stream_file = None
         self.clear()
         self.spec_filename = filename
         self.auto_write = auto_write
+        self.streaming = streaming
+        self.flush_lines = flush_lines
+        self.flush_seconds = flush_seconds
+        self.index = None           # SpecScanIndex of spec_filename
         self.uid_short_length = 8
         self.write_file_header = False
         self.spec_epoch = None      # for both #E & #D line in header, also offset for all scans
         self.spec_host = None
         self.spec_user = None
-        self._datetime = None       # most recent document time as datetime object
+        self.trace = trace
+        self._time = None           # time of the most recent document
         self._streams = {}          # descriptor documents, keyed by uid
+        self._handlers = dict(      # document key : handler
+            start = self.start,
+            descriptor = self.descriptor,
+            event = self.event,
+            event_page = self.event_page,
+            bulk_events = self.bulk_events,
+            stop = self.stop,
+        )
+        self._unhandled = set()     # keys of documents not handled
         if filename is None or not os.path.exists(filename):
             self.newfile(filename)
         else:
@@ -178,6 +348,7 @@ class SpecWriterCallback(object):
         self.motors = OrderedDict()         # names of motors in the scan
         self.positioners = OrderedDict()    # names in #O, values in #P
         self.num_primary_data = 0
+        self._rows = []                     # event rows not yet in self.data
         #
         # note: for one scan, #O & #P information is not provided
         # unless collecting baseline data
@@ -185,37 +356,42 @@ class SpecWriterCallback(object):
         #
         self.columns = OrderedDict()        # #L in scan
         self.scan_command = None            # #S line
+        self._stream_close()
+        self._stream_buffer = []            # streaming: lines not yet written
+        self._stream_flushed = time.time()  # streaming: time of last flush
+
+    def _timestamp(self):
+        """time of the most recent document, as written in comments"""
+        dt = datetime.datetime.fromtimestamp(self._time)
+        return datetime.datetime.strftime(dt, SPEC_TIME_FORMAT)
 
     def _cmt(self, key, text):
         """enter a comment"""
-        ts = datetime.datetime.strftime(self._datetime, SPEC_TIME_FORMAT)
-        self.comments[key].append("{}.  {}".format(ts, text))
+        self.comments[key].append("{}.  {}".format(self._timestamp(), text))
 
     def receiver(self, key, document):
         """BlueSky callback: receive all documents for handling"""
-        print("receiver", key, document)
-        xref = dict(
-            start = self.start,
-            descriptor = self.descriptor,
-            event = self.event,
-            bulk_events = self.bulk_events,
-            stop = self.stop,
-        )
-        logger = logging.getLogger(__name__)
+        if self.trace:
+            self._trace(key, document)
+        handler = self._handlers.get(key)
+        if handler is not None:
+            self._time = _document_time(key, document)
+            handler(document)
+        elif key not in self._unhandled:
+            # such as resource & datum: say so once
+            self._unhandled.add(key)
+            logger.info("custom_callback does not handle %s documents", key)
+
+    def _trace(self, key, document):
+        """debug: report each document received"""
         uid = document.get("uid")
         if uid is None:
             # datum document does not have a "uid"
             # see: https://github.com/NSLS-II/bluesky/issues/1070
-            uid = document["datum_id"]
-        logger.debug("{} document, uid={}".format(key, uid))
-        if key in xref:
-            self._datetime = datetime.datetime.fromtimestamp(document["time"])
-            xref[key](document)
-        else:
-            msg = "custom_callback encountered: {} : {}".format(key, document)
-            # raise ValueError(msg)
-            logger.warn(msg)
-        return
+            # (nor does bulk_events)
+            uid = document.get("datum_id")
+        print("receiver", key, document)
+        logger.debug("%s document, uid=%s", key, uid)
     
     def start(self, doc):
         """handle *start* documents"""
@@ -252,8 +428,7 @@ class SpecWriterCallback(object):
                     obj[key] = None
         
         cmt = "plan_type = " + doc["plan_type"]
-        ts = datetime.datetime.strftime(self._datetime, SPEC_TIME_FORMAT)
-        self.comments["start"].insert(0, "{}.  {}".format(ts, cmt))
+        self.comments["start"].insert(0, "{}.  {}".format(self._timestamp(), cmt))
         self.scan_command = _rebuild_scan_command(doc)
     
     def descriptor(self, doc):
@@ -273,9 +448,9 @@ class SpecWriterCallback(object):
         self._streams[doc["uid"]] = doc
         
         if doc["name"] == "primary":
-            self.data.update({k: [] for k in sorted(doc["data_keys"].keys())})
-            self.data["Epoch"] = []
-            self.data["Epoch_float"] = []
+            self.data.update({k: ColumnBuffer() for k in sorted(doc["data_keys"].keys())})
+            self.data["Epoch"] = ColumnBuffer()
+            self.data["Epoch_float"] = ColumnBuffer()
         
             # SPEC data files have implied defaults
             # SPEC default: X axis in 1st column and Y axis in last column
@@ -299,6 +474,9 @@ class SpecWriterCallback(object):
                     det_name = list(doc["data_keys"].keys())[0]
                 if det_name in self.data:
                     self.data.move_to_end(det_name)
+            
+            if self.streaming:
+                self._stream_scan_header()
 
     def event(self, doc):
         """
@@ -314,6 +492,7 @@ class SpecWriterCallback(object):
                     fmt = "unexpected failure here, key {} not found"
                     raise KeyError(fmt.format(k))
                     #return                  # not our expected event data
+            row = []
             for k in self.data.keys():
                 if k == "Epoch":
                     v = int(doc["time"] - self.time + 0.5)
@@ -321,12 +500,72 @@ class SpecWriterCallback(object):
                     v = doc["time"] - self.time
                 else:
                     v = doc["data"][k]  # TODO: What if data is a str?  Handle below in write_scan()
-                self.data[k].append(v)
+                row.append(v)
+            if self.streaming:
+                self._stream_buffer += self._format_row(
+                    self.num_primary_data, row)
+                self._stream_flush()
+            else:
+                self._rows.append(row)
+                if len(self._rows) >= ROWS_PER_BLOCK:
+                    self._commit_rows()
             self.num_primary_data += 1
     
+    def _commit_rows(self):
+        """move the waiting event rows into the data columns, as a block"""
+        rows, self._rows = self._rows, []
+        if len(rows) > 0:
+            for column, values in zip(self.data.values(), zip(*rows)):
+                column.extend(values)
+    
+    def event_page(self, doc):
+        """
+        handle *event_page* documents
+        
+        A page holds many events of one descriptor, column by column.
+        Its columns are added to the scan data in one step.
+        """
+        stream_doc = self._streams.get(doc["descriptor"])
+        if stream_doc is None:
+            fmt = "descriptor UID {} not found"
+            raise KeyError(fmt.format(doc["descriptor"]))
+        if stream_doc["name"] != "primary":
+            return
+        for k in doc["data"].keys():
+            if k not in self.data.keys():
+                fmt = "unexpected failure here, key {} not found"
+                raise KeyError(fmt.format(k))
+        num_events = len(doc["time"])
+        if num_events == 0:
+            return
+        times = np.asarray(doc["time"]) - self.time
+        page = OrderedDict()
+        for k in self.data.keys():
+            if k == "Epoch":
+                page[k] = (times + 0.5).astype(np.int64).tolist()
+            elif k == "Epoch_float":
+                page[k] = times.tolist()
+            else:
+                page[k] = doc["data"][k]
+        if self.streaming:
+            for i, row in enumerate(zip(*page.values()), start=self.num_primary_data):
+                self._stream_buffer += self._format_row(i, row)
+            self._stream_flush()
+        else:
+            self._commit_rows()
+            for k, values in page.items():
+                self.data[k].extend(values)
+        self.num_primary_data += num_events
+    
     def bulk_events(self, doc):
-        """handle *bulk_events* documents"""
-        pass
+        """
+        handle *bulk_events* documents
+        
+        ``{descriptor_uid: [event, ...]}``, handled as one page per descriptor
+        """
+        for descriptor_uid, events in doc.items():
+            if len(events) > 0:
+                self.event_page(_events_to_page(descriptor_uid, events))
     
     def stop(self, doc):
         """handle *stop* documents"""
@@ -338,15 +577,50 @@ class SpecWriterCallback(object):
         else:
             self._cmt("stop", "exit_status = not available")
 
-        if self.auto_write:
+        self._commit_rows()
+        if self.streaming:
+            self._stream_scan_trailer()
+        elif self.auto_write:
             self.write_scan()
 
-    def prepare_scan_contents(self):
+    def _format_row(self, i, values):
         """
-        format the scan for a SPEC data file
+        format one row of data: the data line and any #U lines
         
-        :returns: [str] a list of lines to append to the data file
+        :returns: [str] lines for the data file
         """
+        str_data = OrderedDict()
+        s = []
+        for k, datum in zip(self.data.keys(), values):
+            if isinstance(datum, str):
+                str_data[k] = datum
+                datum = i
+            s.append(str(datum))
+        lines = [" ".join(s)]
+        for k in str_data.keys():
+            lines.append("#U {} {} {}".format(i, k, str_data[k]))
+        return lines
+
+    def _data_lines(self, start=0, stop=None):
+        """format data rows ``start:stop`` (and #U lines), column by column"""
+        columns = []
+        str_data = {}           # row : [#U lines]
+        for k, column in self.data.items():
+            text, strings = column.text(start, stop)
+            columns.append(text)
+            for i, v in strings.items():
+                str_data.setdefault(i, []).append("#U {} {} {}".format(i, k, v))
+        rows = [" ".join(row) for row in zip(*columns)]
+        if len(str_data) == 0:
+            return rows
+        lines = []
+        for i, row in enumerate(rows, start=start):
+            lines.append(row)
+            lines += str_data.get(i, [])
+        return lines
+
+    def _scan_header_lines(self):
+        """lines of the scan header, from #S through #L"""
         dt = datetime.datetime.fromtimestamp(self.scan_epoch)
         lines = []
         lines.append("")
@@ -365,31 +639,102 @@ class SpecWriterCallback(object):
             # "#MD" is our ad hoc SPEC data tag
             lines.append("#MD {} = {}".format(k, v))
 
-        lines.append("#N " + str(self.num_primary_data))
+        lines.append("#N " + str(len(self.data)))
         if len(self.data.keys()) > 0:
             lines.append("#L " + "  ".join(self.data.keys()))
-            for i in range(self.num_primary_data):
-                str_data = OrderedDict()
-                s = []
-                for k in self.data.keys():
-                    datum = self.data[k][i]
-                    if isinstance(datum, str):
-                        str_data[k] = datum
-                        datum = i
-                    s.append(str(datum))
-                lines.append(" ".join(s))
-                for k in str_data.keys():
-                    lines.append("#U {} {} {}".format(i, k, str_data[k]))
         else:
             lines.append("#C no data column labels identified")
+        return lines
+
+    def _check_new_uid(self):
+        """raise exception if uid is already in the file!"""
+        if self.index.contains(self.uid):
+            fmt = "{} already contains uid={}"
+            raise ValueError(fmt.format(self.spec_filename, self.uid))
+
+    def _stream_scan_header(self):
+        """streaming: start writing the scan to the file"""
+        self._check_new_uid()
+        if self.write_file_header:
+            self.write_header()
+            logger.info("wrote header to SPEC file: " + self.spec_filename)
+        self._stream_offset = os.path.getsize(self.spec_filename) + 1
+        self._stream_file = open(self.spec_filename, "a")
+        self._stream_buffer = self._scan_header_lines()
+        self._stream_flush(force=True)
+
+    def _stream_flush(self, force=False):
+        """streaming: write buffered lines if enough or old enough"""
+        if self._stream_file is None or len(self._stream_buffer) == 0:
+            return
+        now = time.time()
+        if (force
+                or len(self._stream_buffer) >= self.flush_lines
+                or now - self._stream_flushed >= self.flush_seconds):
+            self._stream_file.write("\n".join(self._stream_buffer) + "\n")
+            self._stream_file.flush()
+            self._stream_buffer = []
+            self._stream_flushed = now
+
+    def _stream_scan_trailer(self):
+        """streaming: finish writing the scan"""
+        if self._stream_file is None:
+            return      # no primary stream in this scan
+        for key in ("event", "stop"):
+            for v in self.comments[key]:
+                self._stream_buffer.append("#C " + v)
+        self._stream_flush(force=True)
+        self._stream_close()
+        self._index_scan(self._stream_offset)
+        logger.info("wrote scan {} to SPEC file: {}".format(self.scan_id, self.spec_filename))
+
+    def _index_scan(self, offset):
+        """add the scan just written to the scan index"""
+        self.index.add(
+            self.scan_id, 
+            self.uid, 
+            offset=offset, 
+            end=os.path.getsize(self.spec_filename), 
+            num_points=self.num_primary_data, 
+            N=len(self.data), 
+            columns=list(self.data.keys()))
+
+    def _stream_close(self):
+        if getattr(self, "_stream_file", None) is not None:
+            self._stream_file.close()
+            self._stream_file = None
+
+    def prepare_scan_contents(self):
+        """
+        format the scan for a SPEC data file
+        
+        :returns: [str] a list of lines to append to the data file
+        """
+        lines = []
+        for chunk in self._scan_chunks():
+            lines += chunk
+        return lines
+    
+    def _scan_chunks(self, rows=ROWS_PER_BLOCK):
+        """
+        format the scan in pieces of at most ``rows`` data lines
+        
+        Writing piece by piece avoids holding the text of
+        a long scan in memory all at once.
+        """
+        self._commit_rows()
+        yield self._scan_header_lines()
+        if len(self.data.keys()) > 0:
+            for start in range(0, self.num_primary_data, rows):
+                yield self._data_lines(start, start + rows)
 
+        lines = []
         for v in self.comments["event"]:
             lines.append("#C " + v)
 
         for v in self.comments["stop"]:
             lines.append("#C " + v)
-        
-        return lines
+        yield lines
     
     def _write_lines_(self, lines, mode="a"):
         """write (more) lines to the file"""
@@ -421,22 +766,17 @@ class SpecWriterCallback(object):
         
         note:  does nothing if there are no lines to be written
         """
-        if os.path.exists(self.spec_filename):
-            with open(self.spec_filename) as f:
-                buf = f.read()
-                if buf.find(self.uid) >= 0:
-                    # raise exception if uid is already in the file!
-                    fmt = "{} already contains uid={}"
-                    raise ValueError(fmt.format(self.spec_filename, self.uid))
-        logger = logging.getLogger(__name__)
-        lines = self.prepare_scan_contents()
-        lines.append("")
-        if lines is not None:
-            if self.write_file_header:
-                self.write_header()
-                logger.info("wrote header to SPEC file: " + self.spec_filename)
-            self._write_lines_(lines, mode="a")
-            logger.info("wrote scan {} to SPEC file: {}".format(self.scan_id, self.spec_filename))
+        self._check_new_uid()
+        if self.write_file_header:
+            self.write_header()
+            logger.info("wrote header to SPEC file: " + self.spec_filename)
+        offset = os.path.getsize(self.spec_filename) + 1   # after blank line
+        with open(self.spec_filename, "a") as f:
+            for lines in self._scan_chunks():
+                if len(lines) > 0:
+                    f.write("\n".join(lines) + "\n")
+        self._index_scan(offset)
+        logger.info("wrote scan {} to SPEC file: {}".format(self.scan_id, self.spec_filename))
 
     def make_default_filename(self):
         """generate a file name to be used as default"""
@@ -448,25 +788,37 @@ class SpecWriterCallback(object):
         prepare to use a new SPEC data file
         
         but don't create it until we have data
+
+        If ``filename`` exists, scans are added to it
+        (as ``usefile()``, its scan index is kept).
         """
         self.clear()
         filename = filename or self.make_default_filename()
         if os.path.exists(filename):
-            ValueError("file {} exists".format(filename))
+            logger.warning("file %s exists, adding scans to it", filename)
+            self.usefile(filename)
+            self.write_file_header = False
+            return self.spec_filename
         self.spec_filename = filename
         self.spec_epoch = int(time.time())  # ! no roundup here!!!
         self.spec_host = socket.gethostname() or 'localhost'
         self.spec_user = getpass.getuser() or 'BlueSkyUser' 
         self.write_file_header = True       # don't write the file yet
+        self.index = SpecScanIndex(filename)
+        self.index.reset()
         if reset_scan_id:
             raise NotImplemented("How to reset the BlueSky RE scan_id?")
         return self.spec_filename
     
     def usefile(self, filename):
-        """read from existing SPEC data file"""
-        if not os.path.exists(self.spec_filename):
-            IOError("file {} does not exist".format(filename))
-        scan_id = None
+        """
+        read from existing SPEC data file
+        
+        Only the file header is read, the last scan number
+        comes from the scan index (built once if missing).
+        """
+        if not os.path.exists(filename):
+            raise IOError("file {} does not exist".format(filename))
         with open(filename, "r") as f:
             key = "#F"
             line = f.readline().strip()
@@ -494,11 +846,10 @@ class SpecWriterCallback(object):
             if len(p) > 4 and p[2] == "user":
                 username = p[4]
             
-            # find the last scan number used
-            key = "#S"
-            for line in f.readlines():
-                if line.startswith(key+" ") and len(line.split())>1:
-                    scan_id = int(line.split()[1])
+        # find the last scan number used
+        self.index = SpecScanIndex(filename)
+        self.index.load()
+        scan_id = self.index.last_scan_id()
 
         self.spec_filename = filename
         self.spec_epoch = epoch
@@ -0,0 +1,262 @@
+
+"""
+insert documents into the databroker with events grouped in bulk writes
+
+``db.insert`` makes one round trip to MongoDB for each document,
+each event included.  The ``BufferedInserter`` holds the events
+and writes them in bulk, one write per descriptor:
+
+* when ``max_events`` events are waiting (size)
+* when the oldest waiting event is ``max_seconds`` old (time)
+* before the *stop* document (end of run)
+
+Other documents are inserted right away, so a run's *start* and
+*descriptor* (and any *resource* and *datum*) are in the database
+before its events.  Once the *stop* document has been inserted,
+all of the run is in the database.
+
+Events leave the buffer only once written.  A write that fails is
+tried again at the next flush; the *stop* document waits until all
+its run's events are written.  A failure is raised (to the caller)
+only at the *stop* document, never in the timer thread.
+
+EXAMPLE::
+
+    inserter = BufferedInserter.for_broker(db)
+    RE.subscribe(inserter)
+    ...
+    print(inserter.report())
+
+``MemoryStore`` is a stand-in for the database
+(with optional round-trip latency), such as for benchmarks.
+
+.. autosummary::
+
+   ~BufferedInserter
+   ~MemoryStore
+"""
+
+
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _unpack_event_page(page):
+    """the event documents of an event page"""
+    keys = page["data"].keys()
+    events = []
+    for i, uid in enumerate(page["uid"]):
+        events.append(dict(
+            descriptor=page["descriptor"],
+            uid=uid,
+            seq_num=page["seq_num"][i],
+            time=page["time"][i],
+            data={k: page["data"][k][i] for k in keys},
+            timestamps={k: page["timestamps"][k][i] for k in keys},
+        ))
+    return events
+
+
+class BufferedInserter(object):
+    """
+    RunEngine callback: insert documents, events in bulk
+
+    Parameters
+
+    insert : callable
+        ``insert(name, doc)`` for one document (such as ``db.insert``)
+    bulk_insert : callable, optional
+        ``bulk_insert(descriptor_uid, events)`` for many events
+        (default: call ``insert()`` for each event)
+    max_events : int, optional
+        write when this many events are waiting (default: 500)
+    max_seconds : float, optional
+        write when the oldest event has waited this long (default: 1)
+
+    .. autosummary::
+
+       ~__call__
+       ~for_broker
+       ~flush
+       ~metrics
+       ~report
+    """
+
+    def __init__(self, insert, bulk_insert=None, max_events=500, max_seconds=1.0):
+        self.insert = insert
+        self.bulk_insert = bulk_insert or self._insert_each
+        self.max_events = max_events
+        self.max_seconds = max_seconds
+        self._events = OrderedDict()    # descriptor uid : [event documents]
+        self._waiting = 0               # number of events in self._events
+        self._stops = []                # stop documents, after the events
+        self._timer = None
+        self.error = None               # last failed write
+        self._lock = threading.RLock()
+        self.counts = OrderedDict(
+            documents=0,
+            events=0,
+            round_trips=0,
+            bulk_writes=0,
+            largest_write=0,
+            flush_size=0,
+            flush_time=0,
+            flush_stop=0,
+            failed_writes=0,
+        )
+        self.insert_seconds = 0
+
+    @classmethod
+    def for_broker(cls, db, **kwargs):
+        """
+        inserter for a databroker ``Broker``
+
+        ``db`` is looked up at each insert, so it can be a placeholder
+        (such as ``startup.background()`` returns) until connected.
+        """
+        def insert(name, doc):
+            db.insert(name, doc)
+
+        def bulk_insert(descriptor_uid, events):
+            mds = getattr(db, "mds", None)
+            if hasattr(mds, "bulk_insert_events"):
+                mds.bulk_insert_events(descriptor_uid, events)
+            else:
+                for event in events:
+                    db.insert("event", event)
+
+        return cls(insert, bulk_insert=bulk_insert, **kwargs)
+
+    def _insert_each(self, descriptor_uid, events):
+        for event in events:
+            self.insert("event", event)
+
+    def __call__(self, name, doc):
+        """RunEngine subscription: receive one document"""
+        with self._lock:
+            self.counts["documents"] += 1
+            if name == "event":
+                self._buffer([doc])
+            elif name == "event_page":
+                self._buffer(_unpack_event_page(doc))
+            elif name == "bulk_events":
+                for events in doc.values():
+                    self._buffer(events)
+            elif name == "stop":
+                self._stops.append(doc)
+                self.flush("stop")
+            else:
+                self._timed(self.insert, name, doc)
+
+    def _buffer(self, events):
+        """hold events, write them when there are enough"""
+        for event in events:
+            self._events.setdefault(event["descriptor"], []).append(event)
+        self._waiting += len(events)
+        self.counts["events"] += len(events)
+        if self._waiting >= self.max_events:
+            self.flush("size")
+        elif self._timer is None and self._waiting > 0:
+            self._timer = threading.Timer(self.max_seconds, self.flush, args=("time",))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timed(self, function, *args):
+        t0 = time.perf_counter()
+        try:
+            function(*args)
+        finally:
+            self.insert_seconds += time.perf_counter() - t0
+            self.counts["round_trips"] += 1
+
+    def flush(self, reason="size"):
+        """
+        write all waiting events now (reason: size, time, or stop)
+
+        Events that could not be written stay in the buffer.
+        Raises the failure only if ``reason`` is stop.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._waiting == 0 and len(self._stops) == 0:
+                return
+            if self._waiting > 0:
+                self.counts["flush_" + reason] += 1
+                self.counts["largest_write"] = max(
+                    self.counts["largest_write"], self._waiting)
+            try:
+                for descriptor_uid in list(self._events.keys()):
+                    events = self._events[descriptor_uid]
+                    self._timed(self.bulk_insert, descriptor_uid, events)
+                    del self._events[descriptor_uid]     # written
+                    self._waiting -= len(events)
+                    self.counts["bulk_writes"] += 1
+                while len(self._stops) > 0:
+                    self._timed(self.insert, "stop", self._stops[0])
+                    self._stops.pop(0)
+            except Exception as exc:
+                self.error = exc
+                self.counts["failed_writes"] += 1
+                logger.error(
+                    "could not insert (%d events waiting, will retry): %s",
+                    self._waiting, exc)
+                if reason == "stop":
+                    raise
+
+    def metrics(self):
+        """dict of counts and timing"""
+        result = OrderedDict(self.counts)
+        result["waiting"] = self._waiting
+        result["stops_waiting"] = len(self._stops)
+        result["insert_seconds"] = self.insert_seconds
+        if result["bulk_writes"] > 0:
+            result["events_per_write"] = (
+                result["events"] - self._waiting) / result["bulk_writes"]
+        return result
+
+    def report(self):
+        """table of the metrics"""
+        lines = ["buffered databroker insert"]
+        for k, v in self.metrics().items():
+            if isinstance(v, float):
+                v = "%.3f" % v
+            lines.append("  {:<24s} {}".format(k, v))
+        return "\n".join(lines)
+
+
+class MemoryStore(object):
+    """
+    stand-in for the databroker: keeps documents in lists
+
+    Parameters
+
+    latency : float, optional
+        seconds to wait in each call, as for a round trip to
+        the database server (default: 0)
+    """
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.documents = []     # (name, doc), in order of insertion
+        self.round_trips = 0
+
+    def _round_trip(self):
+        self.round_trips += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def insert(self, name, doc):
+        """insert one document"""
+        self._round_trip()
+        self.documents.append((name, doc))
+
+    def bulk_insert_events(self, descriptor_uid, events):
+        """insert many events of one descriptor"""
+        self._round_trip()
+        self.documents += [("event", event) for event in events]
@@ -0,0 +1,370 @@
+
+"""
+in-process simulator of the busy record fly scan IOC (no EPICS needed)
+
+Simulates the records that ``busyExample.py`` uses and the
+``busyExample.py`` process itself: setting the busy record to 1
+runs a scan of the motor, each step processes the calc record
+(random numbers) and adds the time, motor readback, and calc value
+to the waveform records (and their NORD).  At the end of the scan
+(or when the busy record is set to 0) the busy record returns to 0.
+
+========  =================  ==============================
+record    PV (prefix prj:)   fields
+========  =================  ==============================
+busy      ``mybusy``         (VAL)
+motor     ``m1``             .VAL .RBV .DMOV .MOVN
+swait     ``userCalc1``      (VAL) .CALC .PROC
+waveform  ``t_array``        (VAL) .NELM .NORD
+waveform  ``x_array``        (VAL) .NELM .NORD
+waveform  ``y_array``        (VAL) .NELM .NORD
+========  =================  ==============================
+
+The scan runs as a coroutine in an asyncio event loop, in one
+thread of this process.  Step ``i`` is due ``i * step_time``
+seconds after the scan starts (no drift, no busy waiting).
+With ``step_time=0``, the scan runs as fast as the callbacks allow
+(thousands of steps per second) for stress tests.  Calc values
+come from a random generator, seeded at each scan, so scans repeat.
+
+Records have the parts of the pyepics ``PV`` interface used here
+(``value``, ``get()``, ``put()``, ``add_callback()``,
+``remove_callback()``).  An ophyd device made with
+``make_fake_device()`` is connected to the records by PV name
+with ``bind()`` (or use ``sim_device()``).
+
+EXAMPLE::
+
+    sim = BusyIocSimulator(num_steps=1000, step_time=0.001, nelm=1000)
+    bfly_sim = sim_device(BusyFlyerDevice, sim, name="bfly_sim")
+    RE(bp.fly([bfly_sim]))
+    sim.stop()
+
+.. autosummary::
+
+   ~BusyIocSimulator
+   ~SimRecord
+   ~sim_device
+"""
+
+
+import asyncio
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BUSY_STATES = {"Done": 0, "Busy": 1}
+
+
+class SimRecord(object):
+    """
+    one simulated PV (record field): value and monitor callbacks
+
+    Callbacks receive keyword arguments, as from pyepics:
+    ``callback(pvname=..., value=..., timestamp=...)``
+    """
+
+    def __init__(self, pvname, value=0, on_put=None):
+        self.pvname = pvname
+        self.value = value
+        self.timestamp = time.time()
+        self.on_put = on_put        # on_put(value) handles a client put
+        self._callbacks = OrderedDict()
+        self._next_index = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        return self.value
+
+    def put(self, value, **kwargs):
+        """client put: processed by the record (or stored)"""
+        if self.on_put is not None:
+            self.on_put(value)
+        else:
+            self.post(value)
+
+    def post(self, value):
+        """new value from the record: store and call the monitors"""
+        self.value = value
+        self.timestamp = time.time()
+        with self._lock:
+            callbacks = list(self._callbacks.values())
+        for callback in callbacks:
+            try:
+                callback(pvname=self.pvname, value=value, timestamp=self.timestamp)
+            except Exception as exc:
+                logger.exception("%s monitor callback failed: %s", self.pvname, exc)
+
+    def add_callback(self, callback):
+        """monitor: returns index for ``remove_callback()``"""
+        with self._lock:
+            index = self._next_index
+            self._next_index += 1
+            self._callbacks[index] = callback
+        return index
+
+    def remove_callback(self, index):
+        with self._lock:
+            self._callbacks.pop(index, None)
+
+
+class BusyIocSimulator(object):
+    """
+    busy, motor, calc, and waveform records with the busyExample.py scan
+
+    Parameters
+
+    prefix : str, optional
+        PV prefix (default: ``prj:``)
+    num_steps : int, optional
+        steps in a scan, at most ``nelm`` (default: 5)
+    step_size : float, optional
+        motor step (default: 2.1)
+    origin : float, optional
+        first motor position (default: -1.23456)
+    step_time : float, optional
+        seconds per step, 0: as fast as possible (default: 0)
+    nelm : int, optional
+        length of the waveforms (default: 256)
+    seed : int, optional
+        seed of the calc record's random numbers, each scan (default: 0)
+
+    .. autosummary::
+
+       ~pv
+       ~start
+       ~stop
+       ~scan
+       ~wait
+       ~bind
+    """
+
+    def __init__(self, prefix="prj:", num_steps=5, step_size=2.1,
+                 origin=-1.23456, step_time=0, nelm=256, seed=0):
+        self.prefix = prefix
+        self.num_steps = num_steps
+        self.step_size = step_size
+        self.origin = origin
+        self.step_time = step_time
+        self.nelm = nelm
+        self.seed = seed
+
+        self.records = OrderedDict()
+        self.processing = False
+        self.steps = 0              # steps of the last scan
+        self.scan_seconds = 0       # duration of the last scan
+        self.loop = None
+        self._thread = None
+        self._idle = threading.Event()
+        self._idle.set()
+        self._scan_lock = threading.Lock()
+        self._rng = np.random.RandomState(seed)
+
+        self.busy = self._record("mybusy", 0, on_put=self._put_busy)
+        self.motor = {
+            field: self._record("m1" + field, value)
+            for field, value in ((".RBV", 0.0), (".DMOV", 1), (".MOVN", 0))}
+        self.motor[".VAL"] = self._record("m1.VAL", 0.0, on_put=self.move_motor)
+        self.calc = self._record("userCalc1", 0.0)
+        self.calc_expression = self._record("userCalc1.CALC", "RNDM")
+        self._record("userCalc1.PROC", 0, on_put=lambda value: self.process_calc())
+        self.waves = OrderedDict()
+        for axis in "txy":
+            name = axis + "_array"
+            self.waves[axis] = (
+                self._record(name, np.zeros(0)),
+                self._record(name + ".NORD", 0),
+            )
+            self._record(name + ".NELM", nelm)
+
+    def _record(self, suffix, value, on_put=None):
+        record = SimRecord(self.prefix + suffix, value, on_put=on_put)
+        self.records[record.pvname] = record
+        return record
+
+    def pv(self, pvname):
+        """record of ``pvname`` (a field name: ``prj:m1.RBV``)"""
+        return self.records[pvname]
+
+    # - - - - - - - - - - - event loop thread
+
+    def start(self):
+        """start the event loop thread (if not running)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def _run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.call_soon(ready.set)
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=_run, name="busy_sim", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def stop(self, timeout=5):
+        """end any scan, stop the event loop thread"""
+        if self.processing:
+            self.busy.put(0)
+            self.wait(timeout)
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
+            self.loop.close()
+        self.loop = None
+        self._thread = None
+
+    def wait(self, timeout=None):
+        """wait for the scan to end, returns False if timed out"""
+        return self._idle.wait(timeout)
+
+    # - - - - - - - - - - - record processing
+
+    def _put_busy(self, value):
+        value = int(BUSY_STATES.get(value, value))
+        self.busy.post(value)
+        if value == 1:
+            self.scan()
+
+    def move_motor(self, position):
+        """motor record: move (at once) to ``position``"""
+        position = float(position)
+        self.motor[".DMOV"].post(0)
+        self.motor[".MOVN"].post(1)
+        self.motor[".VAL"].post(position)
+        self.motor[".RBV"].post(position)
+        self.motor[".MOVN"].post(0)
+        self.motor[".DMOV"].post(1)
+
+    def process_calc(self):
+        """calc record: compute a new value (RNDM or a number)"""
+        expression = str(self.calc_expression.value).strip().upper()
+        if expression == "RNDM":
+            value = self._rng.random_sample()
+        else:
+            try:
+                value = float(expression)
+            except ValueError:
+                value = 0.0
+        self.calc.post(value)
+        return value
+
+    def scan(self):
+        """start a scan in the event loop (as when busy is set to 1)"""
+        with self._scan_lock:
+            if self.processing:
+                return
+            self.processing = True
+            self._idle.clear()
+        self.start()
+        asyncio.run_coroutine_threadsafe(self._scan(), self.loop)
+
+    async def _scan(self):
+        """busyExample.py ``Demonstrator.process()``, as a coroutine"""
+        logger.info("simulated scan start")
+        try:
+            num_steps = min(self.num_steps, self.nelm)
+            self._rng = np.random.RandomState(self.seed)     # each scan the same
+            # new buffers for each scan: published views stay valid
+            buffers = OrderedDict((k, np.zeros(self.nelm)) for k in self.waves)
+            self.steps = 0
+            self.move_motor(self.origin)
+            t_start = self.loop.time()
+            for step in range(num_steps):
+                if self.busy.value != 1:
+                    logger.info("simulated scan interrupted")
+                    break
+                self.move_motor(self.origin + step * self.step_size)
+                buffers["t"][step] = time.time()
+                buffers["x"][step] = self.motor[".RBV"].value
+                buffers["y"][step] = self.process_calc()
+                self._publish(buffers, step + 1)
+                self.steps = step + 1
+                # next step is due at a fixed time from the start
+                delay = t_start + (step + 1) * self.step_time - self.loop.time()
+                await asyncio.sleep(max(delay, 0))
+            self.scan_seconds = self.loop.time() - t_start
+        finally:
+            self.processing = False
+            self.busy.post(0)
+            self._idle.set()
+            logger.info("simulated scan complete: %d steps", self.steps)
+
+    def _publish(self, buffers, nord):
+        """post the first ``nord`` points of each waveform, then NORD"""
+        for k, (wave, _nord) in self.waves.items():
+            wave.post(buffers[k][:nord])
+        for k, (_wave, number_read) in self.waves.items():
+            number_read.post(nord)
+
+    # - - - - - - - - - - - ophyd
+
+    def bind(self, device):
+        """
+        connect the fake signals of ``device`` to the records, by PV name
+
+        ``device`` is made with ``ophyd.sim.make_fake_device()``.
+        Signals with PVs not simulated here are left alone.
+
+        :returns: list of the PV names bound
+        """
+        bound = []
+        for walk in device.walk_signals():
+            signal = walk.item
+            record = self.records.get(_pvname(signal))
+            if record is None or not hasattr(signal, "sim_put"):
+                continue
+            record.add_callback(_forward_to(signal))
+            if hasattr(signal, "sim_set_putter"):
+                signal.sim_set_putter(_forward_from(record))
+            signal.sim_put(record.value)
+            bound.append(record.pvname)
+        return bound
+
+
+def _pvname(signal):
+    """PV name of a (fake) ophyd signal: parent prefix + component suffix"""
+    pvname = getattr(signal, "pvname", None)
+    if pvname:
+        return pvname
+    parent = signal.parent
+    if parent is None:
+        return None
+    component = getattr(type(parent), signal.attr_name, None)
+    return getattr(parent, "prefix", "") + (getattr(component, "suffix", None) or "")
+
+
+def _forward_to(signal):
+    def _update(value=None, **kwargs):
+        signal.sim_put(value)
+    return _update
+
+
+def _forward_from(record):
+    def _putter(value, *args, **kwargs):
+        record.put(value)
+    return _putter
+
+
+def sim_device(device_class, sim, **kwargs):
+    """
+    instance of ``device_class`` with fake signals, bound to simulator ``sim``
+
+    EXAMPLE::
+
+        bfly_sim = sim_device(BusyFlyerDevice, BusyIocSimulator(), name="bfly_sim")
+    """
+    try:
+        from ophyd.sim import make_fake_device
+    except ImportError:
+        raise RuntimeError("sim_device() needs ophyd.sim.make_fake_device (ophyd 1.2+)")
+    device = make_fake_device(device_class)(**kwargs)
+    sim.bind(device)
+    return device
@@ -0,0 +1,198 @@
+
+"""
+connect a whole inventory of ophyd devices at once
+
+Creating an ophyd device starts the Channel Access searches of its
+PVs but does not wait for them.  The ``ConnectionManager`` creates
+every device of its inventory first, then waits for all of them
+against one shared deadline, so the total wait is about one timeout
+instead of one timeout per device.  Devices that do not connect
+are replaced by a ``DisconnectedDevice`` placeholder.
+
+EXAMPLE::
+
+    cm = ConnectionManager(timeout=5)
+    cm.add("m1", EpicsMotor, "prj:m1", name="m1")
+    cm.add("scaler", ScalerCH, "prj:scaler1", name="scaler",
+           setup=lambda obj: obj.match_names())
+    devices = cm.connect()
+    print(cm.report())
+
+.. autosummary::
+
+   ~ConnectionManager
+   ~ConnectionResult
+   ~DisconnectedDevice
+"""
+
+
+from collections import namedtuple, OrderedDict
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+ConnectionResult = namedtuple(
+    "ConnectionResult",
+    "key status elapsed reason")
+ConnectionResult.__doc__ = """
+connection outcome of one device
+
+key : str
+    inventory name of the device
+status : str
+    one of ``connected``, ``slow``, ``missing``
+elapsed : float or None
+    seconds from start of ``connect()`` until connected
+reason : str
+    why the device is missing (empty string otherwise)
+"""
+
+
+class DisconnectedDevice(object):
+    """
+    placeholder for a device that could not be connected
+
+    Any attribute access raises ``RuntimeError`` with the reason.
+    """
+
+    connected = False
+
+    def __init__(self, name, reason):
+        self.name = name
+        self.reason = reason
+
+    def __getattr__(self, attr):
+        msg = "{} is not connected ({}), cannot use .{}".format(
+            self.name, self.reason, attr)
+        raise RuntimeError(msg)
+
+    def __repr__(self):
+        return "DisconnectedDevice(name={!r}, reason={!r})".format(
+            self.name, self.reason)
+
+
+def _unconnected_pvs(obj):
+    """names of PVs in ``obj`` that are not connected"""
+    if hasattr(obj, "walk_signals"):
+        signals = [walk.item for walk in obj.walk_signals()]
+    else:
+        signals = [obj]
+    return [
+        getattr(sig, "pvname", sig.name)
+        for sig in signals
+        if not sig.connected
+    ]
+
+
+class ConnectionManager(object):
+    """
+    create and connect an inventory of devices against a shared deadline
+
+    Parameters
+
+    timeout : float, optional
+        seconds to wait for the *whole* inventory (default: 5)
+    slow : float, optional
+        devices that take longer (seconds) are reported as ``slow``
+        (default: 1)
+
+    .. autosummary::
+
+       ~add
+       ~connect
+       ~report
+    """
+
+    def __init__(self, timeout=5, slow=1.0):
+        self.timeout = timeout
+        self.slow = slow
+        self.inventory = OrderedDict()  # key : (factory, args, kwargs, setup)
+        self.devices = OrderedDict()    # key : device (or placeholder)
+        self.results = OrderedDict()    # key : ConnectionResult
+
+    def add(self, key, factory, *args, setup=None, **kwargs):
+        """
+        add a device to the inventory, create it later in ``connect()``
+
+        Parameters
+
+        key : str
+            name to report the device
+        factory : callable
+            usually the ophyd Device class
+        setup : callable, optional
+            ``setup(device)`` is called once the device is connected
+        args, kwargs :
+            passed to ``factory``
+        """
+        self.inventory[key] = (factory, args, kwargs, setup)
+
+    def _missing(self, key, reason):
+        logger.warning("%s not connected, %s", key, reason)
+        self.results[key] = ConnectionResult(key, "missing", None, reason)
+        self.devices[key] = DisconnectedDevice(key, reason)
+
+    def connect(self, timeout=None):
+        """
+        create, then connect, all devices added since the last call
+
+        :returns: OrderedDict of key : device (or ``DisconnectedDevice``)
+        """
+        timeout = timeout or self.timeout
+        t0 = time.time()
+        batch = OrderedDict()
+        created = OrderedDict()
+
+        # first, create everything: this starts all the CA searches
+        for key, (factory, args, kwargs, setup) in self.inventory.items():
+            batch[key] = None
+            try:
+                created[key] = (factory(*args, **kwargs), setup)
+            except Exception as exc:
+                self._missing(key, str(exc))
+        self.inventory.clear()
+
+        # then wait, all against the same deadline
+        deadline = t0 + timeout
+        for key, (obj, setup) in created.items():
+            remaining = max(deadline - time.time(), 0.001)
+            try:
+                obj.wait_for_connection(timeout=remaining)
+            except TimeoutError:
+                pvs = _unconnected_pvs(obj)
+                reason = "timeout"
+                if len(pvs) > 0:
+                    reason += ": " + ", ".join(pvs[:3])
+                if len(pvs) > 3:
+                    reason += ", ... ({} PVs)".format(len(pvs))
+                self._missing(key, reason)
+                continue
+            elapsed = time.time() - t0
+            if setup is not None:
+                try:
+                    setup(obj)
+                except Exception as exc:
+                    self._missing(key, "setup failed: {}".format(exc))
+                    continue
+            status = "slow" if elapsed > self.slow else "connected"
+            self.results[key] = ConnectionResult(key, status, elapsed, "")
+            self.devices[key] = obj
+
+        return OrderedDict((key, self.devices[key]) for key in batch)
+
+    def report(self):
+        """table of connected, slow, and missing devices"""
+        lines = []
+        fmt = "  {:<20s} {:<10s} {:>8s}  {}"
+        lines.append("device connections")
+        lines.append(fmt.format("device", "status", "seconds", "reason"))
+        order = dict(missing=0, slow=1, connected=2)
+        for result in sorted(
+                self.results.values(),
+                key=lambda r: (order[r.status], r.key)):
+            elapsed = "" if result.elapsed is None else "%.3f" % result.elapsed
+            lines.append(
+                fmt.format(result.key, result.status, elapsed, result.reason))
+        return "\n".join(lines)
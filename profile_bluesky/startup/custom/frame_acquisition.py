@@ -0,0 +1,117 @@
+
+"""
+acquire a block of area detector frames with one Acquire
+
+The camera is set to ``ImageMode`` Multiple and ``NumImages``
+before ``trigger()`` (by the plan, with the other moves).
+``trigger()`` puts Acquire=1 once; the status is done when the
+Acquire monitor returns to 0: no polling, no round trip per frame.
+
+Not a detector: no frames are read and no datums are made.  The
+HDF5 plugin (Capture, opened when the detector is staged) writes
+the frames to the dataset named by ``FrameType``::
+
+    acq = FrameAcquisition(adsimdet.cam, name="acq")
+    yield from bps.mv(adsimdet.cam.num_images, 100)
+    yield from bps.trigger(acq, wait=True)
+    print(acq.frames, acq.frames_per_second)
+
+.. autosummary::
+
+   ~FrameAcquisition
+"""
+
+
+import logging
+import time
+
+from ophyd import DeviceStatus
+
+logger = logging.getLogger(__name__)
+
+
+class FrameAcquisition(object):
+    """
+    one Acquire of the camera: a block of ``NumImages`` frames
+
+    Parameters
+
+    cam : area detector cam (``CamBase``)
+        with ``acquire`` and ``num_images_counter``
+    name : str, optional
+        (default: cam name + ``_frames``)
+    timeout : float, optional
+        seconds the block may take (default: no limit)
+
+    .. autosummary::
+
+       ~trigger
+       ~stop
+       ~frames_per_second
+    """
+
+    def __init__(self, cam, name=None, timeout=None):
+        self.cam = cam
+        self.name = name or cam.name + "_frames"
+        self.parent = None
+        self.timeout = timeout
+        self.frames = 0             # last block
+        self.elapsed = 0            # last block, seconds
+        self._status = None
+        self._cid = None
+        self._t0 = None
+
+    @property
+    def frames_per_second(self):
+        """of the last block"""
+        if self.elapsed <= 0:
+            return 0
+        return self.frames / self.elapsed
+
+    def trigger(self):
+        """
+        start one acquisition (status done when all frames are acquired)
+        """
+        if self._status is not None and not self._status.done:
+            raise RuntimeError("{}: acquisition in progress".format(self.name))
+        status = DeviceStatus(self.cam, timeout=self.timeout)
+        started = []
+
+        def acquire_cb(value=None, **kwargs):
+            if value in (1, "Acquire"):
+                started.append(True)
+            elif value in (0, "Done") and started:
+                self._done(status)
+
+        # unsubscribe however it ends (done, timeout, stop)
+        status.add_callback(lambda *args: self._unsubscribe())
+        self._status = status
+        self.frames = 0
+        self.elapsed = 0
+        self._t0 = time.time()
+        # only changes from now on
+        self._cid = self.cam.acquire.subscribe(acquire_cb, run=False)
+        self.cam.acquire.put(1)
+        return status
+
+    def _done(self, status):
+        self.elapsed = time.time() - self._t0
+        self._unsubscribe()
+        try:
+            self.frames = int(self.cam.num_images_counter.get())
+        except Exception as exc:
+            logger.warning("%s: frames not counted: %s", self.name, exc)
+        if not status.done:
+            status._finished(success=True)
+
+    def _unsubscribe(self):
+        if self._cid is not None:
+            self.cam.acquire.unsubscribe(self._cid)
+            self._cid = None
+
+    def stop(self, *, success=False):
+        """
+        end the acquisition (frames acquired so far are kept)
+        """
+        if self._status is not None and not self._status.done:
+            self.cam.acquire.put(0)
@@ -0,0 +1,294 @@
+
+"""
+sidecar index of the scans in a SPEC data file
+
+The index is a small text file next to the SPEC data file
+(same name, with ``.idx`` appended), one JSON record per scan:
+
+==========  ==================================================
+key         value
+==========  ==================================================
+scan_id     scan number (from the #S line)
+uid         bluesky run uid (from the ``#C ... uid = ...`` line)
+offset      byte offset of the #S line in the data file
+end         byte offset just after the scan
+num_points  number of data lines
+N           value of the #N line
+columns     labels of the #L line
+==========  ==================================================
+
+It lets ``SpecWriterCallback`` find the last scan number and check
+for a duplicate uid without reading the data file, and lets a reader
+seek straight to one scan.  When the data file has changed without
+the index (or has no index), the index is rebuilt from the data file.
+
+EXAMPLES::
+
+    index = SpecScanIndex("/tmp/20180901-101010.dat")
+    index.load()
+    scan = index.read_scan(14)
+    print(scan["columns"], scan["data"][-1])
+
+From the command line (in the startup directory)::
+
+    python -m custom.spec_index rebuild /tmp/*.dat
+    python -m custom.spec_index list /tmp/20180901-101010.dat
+    python -m custom.spec_index show /tmp/20180901-101010.dat 14
+
+.. autosummary::
+
+   ~SpecScanIndex
+   ~parse_scan
+"""
+
+
+import json
+import logging
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = ".idx"
+
+
+def parse_scan(text):
+    """
+    parse the text of one scan
+
+    :returns: dict with keys: scan_id, header (list of str),
+        columns (list of str), data (list of rows, each a list)
+    """
+    scan = dict(scan_id=None, header=[], columns=[], data=[])
+    for line in text.splitlines():
+        if len(line.strip()) == 0:
+            continue
+        if line.startswith("#"):
+            scan["header"].append(line)
+            if line.startswith("#S "):
+                scan["scan_id"] = int(line.split()[1])
+            elif line.startswith("#L "):
+                scan["columns"] = line[3:].split("  ")
+            continue
+        row = []
+        for item in line.split():
+            try:
+                row.append(float(item))
+            except ValueError:
+                row.append(item)
+        scan["data"].append(row)
+    return scan
+
+
+class SpecScanIndex(object):
+    """
+    index of the scans in a SPEC data file
+
+    Parameters
+
+    spec_filename : str
+        name of the SPEC data file (need not exist yet)
+
+    .. autosummary::
+
+       ~exists
+       ~load
+       ~add
+       ~contains
+       ~find
+       ~last_scan_id
+       ~read_scan
+       ~rebuild
+       ~reset
+    """
+
+    def __init__(self, spec_filename):
+        self.spec_filename = spec_filename
+        self.filename = spec_filename + INDEX_SUFFIX
+        self.scans = []         # one dict per scan, file order
+        self.uids = {}          # uid : scan_id
+        self._by_scan_id = {}   # scan_id : record (last one with that number)
+
+    def exists(self):
+        """is there an index file?"""
+        return os.path.exists(self.filename)
+
+    def _data_file_size(self):
+        if not os.path.exists(self.spec_filename):
+            return 0
+        return os.path.getsize(self.spec_filename)
+
+    def load(self):
+        """
+        read the index file
+
+        Rebuilds the index if it is missing or does not
+        match the size of the data file.
+        """
+        self._forget()
+        if self.exists():
+            with open(self.filename, "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if len(line) > 0:
+                        self._remember(json.loads(line))
+            if len(self.scans) == 0 or self.scans[-1].get("end") != self._data_file_size():
+                logger.info("scan index out of date: %s", self.filename)
+                self.rebuild()
+        else:
+            self.rebuild()
+
+    def _forget(self):
+        self.scans = []
+        self.uids = {}
+        self._by_scan_id = {}
+
+    def _remember(self, record):
+        self.scans.append(record)
+        self._by_scan_id[record["scan_id"]] = record
+        if record.get("uid") is not None:
+            self.uids[record["uid"]] = record["scan_id"]
+
+    def add(self, scan_id, uid, offset=None, end=None, num_points=None,
+            N=None, columns=None):
+        """record a new scan, in memory and in the index file"""
+        record = dict(
+            scan_id=scan_id,
+            uid=uid,
+            offset=offset,
+            end=end,
+            num_points=num_points,
+            N=N,
+            columns=columns or [],
+        )
+        self._remember(record)
+        with open(self.filename, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        return record
+
+    def contains(self, uid):
+        """is this uid already in the data file?"""
+        return uid in self.uids
+
+    def find(self, scan_id):
+        """index record of scan number ``scan_id`` (last one if repeated)"""
+        if scan_id not in self._by_scan_id:
+            raise KeyError("scan {} not in {}".format(scan_id, self.spec_filename))
+        return self._by_scan_id[scan_id]
+
+    def last_scan_id(self):
+        """scan number of the last scan (None if no scans)"""
+        if len(self.scans) == 0:
+            return None
+        return self.scans[-1]["scan_id"]
+
+    def read_scan(self, scan_id, parse=True):
+        """
+        read one scan from the data file, without reading the others
+
+        :returns: dict from ``parse_scan()`` (or the text if ``parse=False``)
+        """
+        record = self.find(scan_id)
+        with open(self.spec_filename, "rb") as f:
+            f.seek(record["offset"])
+            text = f.read(record["end"] - record["offset"]).decode()
+        if parse:
+            return parse_scan(text)
+        return text
+
+    def reset(self):
+        """forget all scans (for a new data file)"""
+        self._forget()
+        if self.exists():
+            os.remove(self.filename)
+
+    def rebuild(self):
+        """(re)create the index by reading the whole SPEC data file"""
+        self._forget()
+        if not os.path.exists(self.spec_filename):
+            if self.exists():
+                os.remove(self.filename)
+            return
+        logger.info("building scan index for %s", self.spec_filename)
+        records = []
+        offset = 0
+        content_end = 0     # just after the last non-blank line
+        with open(self.spec_filename, "rb") as f:
+            for raw in f:
+                line = raw.decode().rstrip("\n")
+                if line.startswith("#S ") and len(line.split()) > 1:
+                    if len(records) > 0:
+                        records[-1]["end"] = content_end
+                    records.append(dict(
+                        scan_id=int(line.split()[1]),
+                        uid=None,
+                        offset=offset,
+                        end=None,
+                        num_points=0,
+                        N=None,
+                        columns=[],
+                    ))
+                elif len(records) > 0:
+                    record = records[-1]
+                    if line.startswith("#C ") and " uid = " in line:
+                        if record["uid"] is None:
+                            record["uid"] = line.split(" uid = ")[-1].strip()
+                    elif line.startswith("#N "):
+                        record["N"] = int(line.split()[1])
+                    elif line.startswith("#L "):
+                        record["columns"] = line[3:].split("  ")
+                    elif len(line.strip()) > 0 and not line.startswith("#"):
+                        record["num_points"] += 1
+                offset += len(raw)
+                if len(line.strip()) > 0:
+                    content_end = offset
+        if len(records) > 0:
+            records[-1]["end"] = offset
+        with open(self.filename, "w") as f:
+            for record in records:
+                self._remember(record)
+                f.write(json.dumps(record) + "\n")
+
+
+def main():
+    """rebuild, list, or show scans of SPEC data files (command line)"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog="python -m custom.spec_index",
+        description="scan index of SPEC data files")
+    subcommands = parser.add_subparsers(dest="command")
+    p = subcommands.add_parser("rebuild", help="(re)build the index file(s)")
+    p.add_argument("files", nargs="+", help="SPEC data file(s)")
+    p = subcommands.add_parser("list", help="list the scans in the index")
+    p.add_argument("file", help="SPEC data file")
+    p = subcommands.add_parser("show", help="print one scan")
+    p.add_argument("file", help="SPEC data file")
+    p.add_argument("scan_id", type=int, help="scan number")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        for filename in args.files:
+            index = SpecScanIndex(filename)
+            index.rebuild()
+            print("{}: {} scans".format(index.filename, len(index.scans)))
+    elif args.command == "list":
+        index = SpecScanIndex(args.file)
+        index.load()
+        fmt = "{:>6} {:>10} {:>8}  {}"
+        print(fmt.format("#S", "offset", "points", "uid"))
+        for record in index.scans:
+            print(fmt.format(
+                record["scan_id"], record["offset"],
+                record["num_points"], record["uid"]))
+    elif args.command == "show":
+        index = SpecScanIndex(args.file)
+        index.load()
+        print(index.read_scan(args.scan_id, parse=False))
+    else:
+        parser.print_usage()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,429 @@
+
+"""
+orchestrate the numbered startup files of this IPython profile
+
+IPython runs each ``NN-name.py`` file of the startup directory in
+lexicographical order.  Before this module, every file blocked the
+session on its heavy imports and on the EPICS connections of the
+devices it created.  The loader helps in three ways:
+
+* each startup file declares itself as a *stage* so that
+  dependencies between the files can be checked and timed
+* heavy modules can be imported lazily (on first attribute access)
+* devices are created and connected in background threads;
+  the name in the session namespace is a placeholder
+  until the device is ready and only blocks when it is first used
+
+Set the ``BLUESKY_STARTUP_PROFILE`` environment variable to
+profile each stage (see ``custom.startup_profiler``).
+
+The devices declared by a startup file are connected together
+(see ``custom.connections.ConnectionManager``) as soon as the
+next stage begins.  Devices that do not connect become
+``DisconnectedDevice`` placeholders instead of blocking startup.
+
+EXAMPLE (in a startup file)::
+
+    startup.stage(__file__)
+    m1 = startup.device("m1", EpicsMotor, "prj:m1", name="m1")
+    APS_plans = startup.lazy_import("apstools.plans")
+    ...
+    startup.finish()        # in the last startup file
+
+.. autosummary::
+
+   ~StartupLoader
+   ~LazyDevice
+   ~lazy_import
+"""
+
+
+from collections import OrderedDict
+from concurrent.futures import Future
+import importlib
+import importlib.util
+import logging
+import os
+import sys
+import threading
+import time
+
+from .connections import ConnectionManager
+from .startup_profiler import StartupProfiler
+
+logger = logging.getLogger(__name__)
+
+
+# stage name (startup file without ".py") : stages it needs to be complete
+STARTUP_DEPENDENCIES = OrderedDict([
+    ("00-0-checks", ()),
+    ("00-startup", ("00-0-checks",)),
+    ("01-databroker", ("00-startup",)),
+    ("02-pyepics", ()),
+    ("10-devices", ("00-startup", "02-pyepics")),
+    ("11-motors", ("10-devices",)),
+    ("20-detectors", ("10-devices",)),
+    ("20-signals", ("10-devices",)),
+    ("25-simdetector", ("10-devices",)),
+    ("41-mode_registry", ("10-devices",)),
+    ("50-plans", ("00-startup",)),
+    ("60-metadata", ("00-startup",)),
+    ("70-busy_flyer", ("10-devices",)),
+    ("80-callbacks", ("01-databroker",)),
+])
+
+
+def lazy_import(module_name):
+    """
+    import a module that is only loaded when one of its attributes is used
+
+    Modules already imported are returned directly.
+    """
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.find_spec(module_name)
+    if spec is None:
+        raise ImportError("No module named " + module_name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    loader.exec_module(module)
+    return module
+
+
+def _use_ca_context():
+    """threads that talk to EPICS must share the initial CA context"""
+    epics = sys.modules.get("epics")
+    if epics is not None:
+        epics.ca.use_initial_context()
+
+
+def run_in_background(function, *args, **kwargs):
+    """
+    call ``function(*args, **kwargs)`` in a daemon thread
+
+    :returns: concurrent.futures.Future with the result
+    """
+    future = Future()
+
+    def _runner():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            _use_ca_context()
+            future.set_result(function(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+
+    threading.Thread(target=_runner, daemon=True).start()
+    return future
+
+
+class LazyDevice(object):
+    """
+    placeholder for an object that is being created in the background
+
+    Any use of the placeholder (attribute access, ``isinstance()``,
+    calling it) waits for the background work to finish and then
+    acts on the real object.
+    """
+
+    def __init__(self, name, future, starter=None):
+        object.__setattr__(self, "_lazy_name", name)
+        object.__setattr__(self, "_lazy_future", future)
+        object.__setattr__(self, "_lazy_starter", starter)
+
+    def _lazy_resolve(self):
+        future = object.__getattribute__(self, "_lazy_future")
+        if not future.done():
+            name = object.__getattribute__(self, "_lazy_name")
+            logger.info("waiting for %s to connect", name)
+            starter = object.__getattribute__(self, "_lazy_starter")
+            if starter is not None:
+                starter()       # in case the work has not been started yet
+        return future.result()
+
+    @property
+    def __class__(self):
+        return self._lazy_resolve().__class__
+
+    def __getattr__(self, attr):
+        return getattr(self._lazy_resolve(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._lazy_resolve(), attr, value)
+
+    def __call__(self, *args, **kwargs):
+        return self._lazy_resolve()(*args, **kwargs)
+
+    def __dir__(self):
+        return dir(self._lazy_resolve())
+
+    def __repr__(self):
+        future = object.__getattribute__(self, "_lazy_future")
+        if future.done() and future.exception() is None:
+            return repr(future.result())
+        name = object.__getattribute__(self, "_lazy_name")
+        return "<LazyDevice {} (pending)>".format(name)
+
+
+class StartupLoader(object):
+    """
+    time, order-check, and parallelize the IPython startup files
+
+    Parameters
+
+    namespace : dict
+        The IPython user namespace (``globals()`` of a startup file).
+        Background objects replace their placeholder here once ready.
+    dependencies : dict, optional
+        stage name : tuple of stages that must have run first
+        (default: ``STARTUP_DEPENDENCIES``)
+    connection_timeout : float, optional
+        seconds to wait for each batch of devices to connect
+    profiler : StartupProfiler, optional
+        (default: as configured by ``BLUESKY_STARTUP_PROFILE``)
+
+    .. autosummary::
+
+       ~stage
+       ~finish
+       ~lazy_import
+       ~device
+       ~connect_devices
+       ~background
+       ~wait
+       ~report
+    """
+
+    def __init__(self, namespace, dependencies=None, connection_timeout=10,
+                 profiler=None):
+        self.namespace = namespace
+        self.dependencies = dependencies or STARTUP_DEPENDENCIES
+        self.connection_timeout = connection_timeout
+        self.t0 = time.time()
+        self.stages = OrderedDict()     # stage name : [start, end]
+        self.jobs = OrderedDict()       # background name : [start, end, future]
+        self.connection_batches = []    # ConnectionManager of each batch
+        self._connections = ConnectionManager(timeout=connection_timeout)
+        self._pending = OrderedDict()   # key : (future, placeholder)
+        self._placeholders = {}         # key : placeholder, not yet replaced
+        self._lock = threading.Lock()
+        self._current = None
+        self.profiler = profiler or StartupProfiler.from_environment()
+        if self.profiler is not None:
+            self.profiler.install()
+
+    def stage(self, filename):
+        """
+        call at the top of each startup file (replaces ``print(__file__)``)
+        """
+        print(filename)
+        now = time.time()
+        self._end_stage(now)
+        self._publish_done()
+        self.connect_devices()
+        name = os.path.splitext(os.path.basename(filename))[0]
+        missing = [
+            dep
+            for dep in self.dependencies.get(name, ())
+            if dep not in self.stages or self.stages[dep][1] is None
+        ]
+        if len(missing) > 0:
+            msg = "startup file {} needs {} to run first".format(
+                name, ", ".join(missing))
+            print("WARNING: " + msg)
+        self.stages[name] = [now, None]
+        self._current = name
+        if self.profiler is not None:
+            self.profiler.begin_stage(name)
+
+    def _end_stage(self, now):
+        if self._current is not None:
+            self.stages[self._current][1] = now
+            self._current = None
+            if self.profiler is not None:
+                self.profiler.end_stage()
+
+    def finish(self, verbose=True):
+        """call at the end of the last startup file"""
+        self._end_stage(time.time())
+        self._publish_done()
+        self.connect_devices()
+        if verbose:
+            print(self.report())
+        if self.profiler is not None:
+            self._finish_profile()
+
+    def _finish_profile(self):
+        """profiling: wait for connections, then write & print results"""
+        profiler = self.profiler
+        profiler.finish()
+        self.wait(timeout=self.connection_timeout)
+        profiler.uninstall()
+        for manager in self.connection_batches:
+            profiler.record_connections(manager.results.values())
+        print(profiler.summary())
+        print("startup profile written to", profiler.write())
+
+    def lazy_import(self, module_name):
+        """import a module, loaded on its first use (see ``lazy_import()``)"""
+        return lazy_import(module_name)
+
+    def background(self, key, function, *args, **kwargs):
+        """
+        run ``function(*args, **kwargs)`` in the background
+
+        The result replaces ``namespace[key]`` once it is available.
+        Until then, ``namespace[key]`` is a ``LazyDevice`` placeholder.
+
+        :returns: the placeholder
+        """
+        start = time.time()
+
+        def _timed():
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.jobs[key][1] = time.time()
+
+        self.jobs[key] = [start, None, None]
+        future = run_in_background(_timed)
+        self.jobs[key][2] = future
+        placeholder = LazyDevice(key, future)
+        self._publish_when_done(key, placeholder)
+        return placeholder
+
+    def _publish_when_done(self, key, placeholder):
+        """replace the placeholder in the namespace when its work is done"""
+        def _replace(fut):
+            if fut.exception() is not None:
+                logger.error("%s failed: %s", key, fut.exception())
+                print("Could not create {}: {}".format(key, fut.exception()))
+            else:
+                self._publish(key, placeholder)
+
+        # bound first: the work may already be done (callback runs now)
+        self.namespace[key] = placeholder
+        with self._lock:
+            self._placeholders[key] = placeholder
+        future = object.__getattribute__(placeholder, "_lazy_future")
+        future.add_done_callback(_replace)
+
+    def _publish(self, key, placeholder):
+        """namespace[key]: the result, if it still holds the placeholder"""
+        future = object.__getattribute__(placeholder, "_lazy_future")
+        if self.namespace.get(key, placeholder) is placeholder:
+            self.namespace[key] = future.result()
+
+    def _publish_done(self):
+        """
+        replace placeholders of finished work still in the namespace
+
+        ``name = startup.background(...)`` binds the placeholder
+        again, after the callback if the work was already done.
+        """
+        with self._lock:
+            pending = list(self._placeholders.items())
+        for key, placeholder in pending:
+            future = object.__getattribute__(placeholder, "_lazy_future")
+            if not future.done():
+                continue
+            if future.exception() is None:
+                self._publish(key, placeholder)
+            with self._lock:
+                if self._placeholders.get(key) is placeholder:
+                    del self._placeholders[key]
+
+    def device(self, key, factory, *args, setup=None, **kwargs):
+        """
+        create and connect an ophyd device in the background
+
+        Parameters
+
+        key : str
+            name of the device in the session namespace
+        factory : callable
+            usually the ophyd Device class
+        setup : callable, optional
+            ``setup(device)`` is called once the device is connected
+        args, kwargs :
+            passed to ``factory``
+
+        The device is connected (with the others declared in the
+        same startup file) when the next stage begins or when
+        the placeholder is first used, whichever comes first.
+        A device that does not connect becomes a ``DisconnectedDevice``.
+        """
+        future = Future()
+        placeholder = LazyDevice(key, future, starter=self.connect_devices)
+        with self._lock:
+            self._connections.add(key, factory, *args, setup=setup, **kwargs)
+            self._pending[key] = (future, placeholder)
+        self._publish_when_done(key, placeholder)
+        return placeholder
+
+    def connect_devices(self):
+        """connect, in the background, all devices declared so far"""
+        with self._lock:
+            if len(self._pending) == 0:
+                return
+            batch, self._pending = self._pending, OrderedDict()
+            manager = self._connections
+            self._connections = ConnectionManager(
+                timeout=self.connection_timeout)
+            self.connection_batches.append(manager)
+            start = time.time()
+            for key, (future, _placeholder) in batch.items():
+                self.jobs[key] = [start, None, future]
+
+        def _connect():
+            try:
+                devices = manager.connect()
+            except Exception as exc:
+                for key, (future, _placeholder) in batch.items():
+                    self.jobs[key][1] = time.time()
+                    future.set_exception(exc)
+                return
+            for key, obj in devices.items():
+                self.jobs[key][1] = time.time()
+                batch[key][0].set_result(obj)
+
+        run_in_background(_connect)
+
+    def wait(self, timeout=None):
+        """block until all background work is done"""
+        for name, (_start, _end, future) in list(self.jobs.items()):
+            try:
+                future.result(timeout)
+            except Exception:
+                pass    # already reported by the done callback
+        self._publish_done()
+
+    def report(self):
+        """timing report of each startup stage and background job"""
+        lines = []
+        lines.append("startup timing report (seconds)")
+        fmt = "  {:<28s} {:>8s} {:>8s}"
+        lines.append(fmt.format("stage", "start", "elapsed"))
+        for name, (start, end) in self.stages.items():
+            elapsed = "running" if end is None else "%.3f" % (end - start)
+            lines.append(fmt.format(name, "%.3f" % (start - self.t0), elapsed))
+        if len(self.jobs) > 0:
+            lines.append(fmt.format("background", "start", "elapsed"))
+            for name, (start, end, future) in self.jobs.items():
+                if end is None:
+                    elapsed = "pending"
+                elif future.done() and future.exception() is not None:
+                    elapsed = "FAILED"
+                else:
+                    elapsed = "%.3f" % (end - start)
+                lines.append(fmt.format(name, "%.3f" % (start - self.t0), elapsed))
+        stages_end = [end for _start, end in self.stages.values() if end is not None]
+        if len(stages_end) > 0:
+            lines.append("  time to prompt: %.3f" % (max(stages_end) - self.t0))
+        for manager in self.connection_batches:
+            if len(manager.results) > 0:
+                lines.append(manager.report())
+        return "\n".join(lines)
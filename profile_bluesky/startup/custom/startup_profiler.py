@@ -0,0 +1,325 @@
+
+"""
+profile the time to first prompt of this IPython profile
+
+Records, for each startup file (stage):
+
+* wall time
+* time spent importing modules (and which modules)
+* memory growth (Python allocations, via ``tracemalloc``)
+
+and the connection time of each device connected by the
+startup loader.  Results are written as JSON and a sorted
+summary is printed.
+
+Switch it on with the ``BLUESKY_STARTUP_PROFILE`` environment
+variable (or set it in ``ipython_config.py``).  The value is the
+JSON output file name (``1`` uses ``DEFAULT_OUTPUT``)::
+
+    BLUESKY_STARTUP_PROFILE=/tmp/before.json ipython --profile=bluesky
+
+Compare two profiles (exit status is 1 if *current* regressed)::
+
+    python -m custom.startup_profiler /tmp/before.json /tmp/after.json
+
+.. autosummary::
+
+   ~StartupProfiler
+   ~compare
+"""
+
+
+from collections import OrderedDict
+import builtins
+import datetime
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+ENVIRONMENT_VARIABLE = "BLUESKY_STARTUP_PROFILE"
+DEFAULT_OUTPUT = "/tmp/bluesky_startup_profile.json"
+
+
+class StartupProfiler(object):
+    """
+    instrument the startup files: wall time, imports, memory, connections
+
+    Parameters
+
+    output : str, optional
+        name of the JSON file to write (default: ``DEFAULT_OUTPUT``)
+
+    .. autosummary::
+
+       ~from_environment
+       ~install
+       ~uninstall
+       ~begin_stage
+       ~end_stage
+       ~record_connections
+       ~results
+       ~write
+       ~summary
+    """
+
+    def __init__(self, output=None):
+        self.output = output or DEFAULT_OUTPUT
+        self.t0 = time.time()
+        self.time_to_prompt = None
+        self.stages = OrderedDict()     # name : dict of measurements
+        self.imports = []               # one dict per module imported
+        self.connections = []           # one dict per device
+        self._stage = None
+        self._local = threading.local()
+        self._original_import = None
+        self._started_tracing = False
+        self.peak_memory_kB = None
+
+    @classmethod
+    def from_environment(cls):
+        """profiler configured from the environment, None if not requested"""
+        value = os.environ.get(ENVIRONMENT_VARIABLE, "").strip()
+        if value in ("", "0"):
+            return None
+        if value == "1":
+            value = None
+        return cls(output=value)
+
+    def install(self):
+        """start measuring memory and module imports"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        if self._original_import is None:
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        """stop measuring module imports (and memory, if install() started it)"""
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+        if tracemalloc.is_tracing():
+            self.peak_memory_kB = tracemalloc.get_traced_memory()[1] / 1024
+            if self._started_tracing:
+                # tracing slows everything: not for the rest of the session
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        """replaces ``builtins.__import__`` while installed"""
+        if level != 0 or name in sys.modules:
+            # relative imports are counted in the importing package
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        t0 = time.perf_counter()
+        m0 = tracemalloc.get_traced_memory()[0]
+        stack.append(name)
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            stack.pop()
+            self.imports.append(dict(
+                module=name,
+                stage=self._stage,
+                depth=len(stack),
+                thread=threading.current_thread().name,
+                seconds=time.perf_counter() - t0,
+                memory_kB=(tracemalloc.get_traced_memory()[0] - m0) / 1024,
+            ))
+
+    def begin_stage(self, name):
+        """start measuring a startup file"""
+        self._stage = name
+        self.stages[name] = dict(
+            name=name,
+            _t0=time.perf_counter(),
+            _m0=tracemalloc.get_traced_memory()[0],
+            _n0=len(self.imports),
+        )
+
+    def end_stage(self):
+        """finish measuring the current startup file"""
+        if self._stage is None:
+            return
+        stage = self.stages[self._stage]
+        top_level = [
+            item
+            for item in self.imports[stage.pop("_n0"):]
+            if item["depth"] == 0
+            and item["stage"] == self._stage
+            and item["thread"] == threading.main_thread().name
+        ]
+        stage["seconds"] = time.perf_counter() - stage.pop("_t0")
+        stage["import_seconds"] = sum(item["seconds"] for item in top_level)
+        stage["memory_kB"] = (
+            tracemalloc.get_traced_memory()[0] - stage.pop("_m0")) / 1024
+        self._stage = None
+
+    def finish(self):
+        """startup files are done, the prompt comes next"""
+        self.end_stage()
+        self.time_to_prompt = time.time() - self.t0
+
+    def record_connections(self, results):
+        """
+        record device connection times
+
+        results : iterable of ``custom.connections.ConnectionResult``
+        """
+        for result in results:
+            self.connections.append(dict(
+                device=result.key,
+                status=result.status,
+                seconds=result.elapsed,
+                reason=result.reason,
+            ))
+
+    def results(self):
+        """all measurements as a dict (suitable for JSON)"""
+        return OrderedDict([
+            ("created", datetime.datetime.now().isoformat(" ")),
+            ("python", sys.version.split()[0]),
+            ("time_to_prompt", self.time_to_prompt),
+            ("peak_memory_kB", self._peak_memory_kB()),
+            ("stages", list(self.stages.values())),
+            ("imports", self.imports),
+            ("connections", self.connections),
+        ])
+
+    def _peak_memory_kB(self):
+        if tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()[1] / 1024
+        return self.peak_memory_kB
+
+    def write(self, filename=None):
+        """write the results as JSON"""
+        filename = filename or self.output
+        with open(filename, "w") as f:
+            json.dump(self.results(), f, indent=2)
+        return filename
+
+    def summary(self, top=15):
+        """text summary, slowest items first"""
+        lines = []
+        if self.time_to_prompt is not None:
+            lines.append("time to prompt: %.3f s" % self.time_to_prompt)
+
+        fmt = "  {:<32s} {:>9s} {:>9s} {:>10s}"
+        lines.append("startup files (slowest first)")
+        lines.append(fmt.format("stage", "wall_s", "import_s", "memory_kB"))
+        for stage in sorted(
+                self.stages.values(),
+                key=lambda s: s.get("seconds", 0),
+                reverse=True):
+            if "seconds" not in stage:
+                continue
+            lines.append(fmt.format(
+                stage["name"],
+                "%.3f" % stage["seconds"],
+                "%.3f" % stage["import_seconds"],
+                "%.0f" % stage["memory_kB"]))
+
+        lines.append("top-level imports (slowest first)")
+        lines.append(fmt.format("module", "seconds", "stage", "memory_kB"))
+        top_level = [item for item in self.imports if item["depth"] == 0]
+        for item in sorted(
+                top_level, key=lambda i: i["seconds"], reverse=True)[:top]:
+            lines.append(fmt.format(
+                item["module"],
+                "%.3f" % item["seconds"],
+                str(item["stage"]),
+                "%.0f" % item["memory_kB"]))
+
+        if len(self.connections) > 0:
+            lines.append("device connections (slowest first)")
+            lines.append(fmt.format("device", "seconds", "status", ""))
+            for item in sorted(
+                    self.connections,
+                    key=lambda i: -1 if i["seconds"] is None else i["seconds"],
+                    reverse=True):
+                seconds = item["seconds"]
+                lines.append(fmt.format(
+                    item["device"],
+                    "n/a" if seconds is None else "%.3f" % seconds,
+                    item["status"],
+                    ""))
+        return "\n".join(lines)
+
+
+def compare(baseline, current, tolerance=0.2, minimum=0.05):
+    """
+    find the startup regressions of *current* relative to *baseline*
+
+    Parameters
+
+    baseline, current : dict
+        results from ``StartupProfiler.results()`` (or the JSON files)
+    tolerance : float
+        relative slowdown allowed (0.2 = 20%)
+    minimum : float
+        slowdowns smaller than this (seconds) are ignored
+
+    :returns: list of (item, baseline_s, current_s) that regressed
+    """
+    def _slower(before, after):
+        if before is None or after is None:
+            return False
+        return after - before > max(tolerance * before, minimum)
+
+    regressions = []
+    if _slower(baseline["time_to_prompt"], current["time_to_prompt"]):
+        regressions.append(
+            ("time_to_prompt",
+             baseline["time_to_prompt"],
+             current["time_to_prompt"]))
+    before = {s["name"]: s.get("seconds") for s in baseline["stages"]}
+    for stage in current["stages"]:
+        name = stage["name"]
+        if _slower(before.get(name), stage.get("seconds")):
+            regressions.append((name, before[name], stage["seconds"]))
+    return regressions
+
+
+def main():
+    """compare two startup profiles (command line)"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog="python -m custom.startup_profiler",
+        description="compare two startup profiles, fail on regression")
+    parser.add_argument("baseline", help="JSON file from before the change")
+    parser.add_argument("current", help="JSON file from after the change")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2,
+        help="relative slowdown allowed (default: 0.2)")
+    parser.add_argument(
+        "--minimum", type=float, default=0.05,
+        help="ignore slowdowns smaller than this, seconds (default: 0.05)")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(
+        baseline, current, tolerance=args.tolerance, minimum=args.minimum)
+    for item, before, after in regressions:
+        print("REGRESSION {}: {:.3f} s -> {:.3f} s".format(item, before, after))
+    if len(regressions) == 0:
+        print("no startup regressions: {} s -> {} s".format(
+            *["n/a" if t is None else "%.3f" % t
+              for t in (baseline["time_to_prompt"], current["time_to_prompt"])]))
+    return 1 if len(regressions) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
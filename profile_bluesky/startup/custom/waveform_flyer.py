@@ -0,0 +1,348 @@
+
+"""
+fly scan of any number of waveform channels, collected as event pages
+
+Generalizes ``BusyFlyerDevice`` (70-busy_flyer.py): the channels,
+the trigger signal (put to start), and the done signal (watched
+for the end) are given when the class is made::
+
+    WaveformFlyerBusy = waveform_flyer_class(
+        OrderedDict(time="prj:t_array", axis="prj:x_array", signal="prj:y_array"),
+        trigger_pv="prj:mybusy",
+        time_channel="time")
+    wfly = WaveformFlyerBusy(name="wfly")
+    RE(bp.fly([wfly]))
+
+Single buffered (default): the IOC fills each waveform and updates
+NORD.  As NORD of the first channel advances, the new points are
+read (each waveform once) and kept as one event page.
+
+Double buffered: each channel is a pair of waveforms (such as
+``_A``, ``_B`` suffixes).  The IOC fills one buffer while the flyer
+reads the other, and counts each buffer it has filled in the
+``ready_pv`` (buffer ``k`` is ``k % 2``; the last, partial buffer
+is counted before the done signal).  Each buffer becomes one
+event page.  If the IOC gets more than a whole buffer ahead, the
+overwritten buffers are counted in ``overruns``.
+
+Waveforms are read in one worker thread (not in the Channel
+Access callbacks).  Updates that arrive while a read waits are
+covered by that read, so a fast IOC means fewer, larger pages.
+``describe_collect()`` is made once.  Data keys are the channel
+names prefixed with the flyer's name (``wfly_time``, ...).
+
+.. autosummary::
+
+   ~WaveformFlyer
+   ~WaveformChannel
+   ~waveform_flyer_class
+"""
+
+
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+import numpy as np
+from ophyd import Component, Device, DeviceStatus, EpicsSignal, EpicsSignalRO
+from ophyd.device import DynamicDeviceComponent
+
+logger = logging.getLogger(__name__)
+
+
+class WaveformChannel(Device):
+    """waveform record: array (VAL), length (NELM), points (NORD)"""
+    wave = Component(EpicsSignalRO, "")
+    number_elements = Component(EpicsSignalRO, ".NELM")
+    number_read = Component(EpicsSignalRO, ".NORD")
+
+
+def _buffer_channels(channel_pvs, suffix):
+    defn = OrderedDict()
+    for name, pv in channel_pvs.items():
+        defn[name] = (WaveformChannel, pv + suffix, {})
+    return defn
+
+
+def waveform_flyer_class(channel_pvs, trigger_pv, done_pv=None,
+                         buffer_suffixes=("",), ready_pv=None,
+                         time_channel=None, class_name="WaveformFlyerDevice"):
+    """
+    make a ``WaveformFlyer`` class for these PVs
+
+    Parameters
+
+    channel_pvs : OrderedDict
+        channel name : waveform PV (the first channel's NORD
+        tells of new points)
+    trigger_pv : str
+        PV to put ``trigger_value`` to start (such as a busy record)
+    done_pv : str, optional
+        PV that is ``done_value`` when done (default: ``trigger_pv``)
+    buffer_suffixes : tuple of str, optional
+        ``("_A", "_B")`` for double buffered waveforms (default: ``("",)``)
+    ready_pv : str, optional
+        count of buffers filled (needed with more than one buffer)
+    time_channel : str, optional
+        name of the channel with the time (seconds since epoch)
+        of each point (default: time the points were read)
+    class_name : str, optional
+        name of the new class
+    """
+    if len(buffer_suffixes) > 1 and ready_pv is None:
+        raise ValueError("double buffered waveforms need ready_pv")
+    channel_pvs = OrderedDict(channel_pvs)
+    if time_channel is not None and time_channel not in channel_pvs:
+        msg = "time_channel {!r} is not one of the channels".format(time_channel)
+        raise ValueError(msg)
+
+    attrs = OrderedDict()
+    attrs["trigger_signal"] = Component(EpicsSignal, trigger_pv)
+    attrs["done_signal"] = Component(EpicsSignalRO, done_pv or trigger_pv)
+    if ready_pv is not None:
+        attrs["buffers_ready"] = Component(EpicsSignalRO, ready_pv)
+    for i, suffix in enumerate(buffer_suffixes):
+        attrs["buffer%d" % i] = DynamicDeviceComponent(
+            _buffer_channels(channel_pvs, suffix))
+    attrs["channel_names"] = tuple(channel_pvs.keys())
+    attrs["num_buffers"] = len(buffer_suffixes)
+    attrs["time_channel"] = time_channel
+    return type(class_name, (WaveformFlyer,), attrs)
+
+
+class WaveformFlyer(Device):
+    """
+    ophyd Flyer: waveform channels, collected as event pages
+
+    Make the class with ``waveform_flyer_class()``.
+
+    Parameters
+
+    trigger_value : optional
+        put to the trigger signal to start (default: 1)
+    done_value : optional
+        value of the done signal when done (default: 0)
+
+    .. autosummary::
+
+       ~kickoff
+       ~complete
+       ~stop
+       ~describe_collect
+       ~collect
+       ~collect_pages
+    """
+
+    # set by waveform_flyer_class()
+    channel_names = ()
+    num_buffers = 1
+    time_channel = None
+
+    def __init__(self, prefix="", *, trigger_value=1, done_value=0, **kwargs):
+        super().__init__(prefix, **kwargs)
+        self.trigger_value = trigger_value
+        self.done_value = done_value
+        self.complete_status = None
+        self.points_read = 0        # this flight
+        self.buffers_read = 0       # this flight (double buffered)
+        self.overruns = 0           # buffers overwritten before read
+        self._ready_start = 0       # buffers_ready at kickoff
+        self._pages = deque()
+        self._subscriptions = []
+        self._describe_collect = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._read_lock = threading.Lock()
+        self._read_pending = threading.Event()
+
+    @property
+    def flying(self):
+        """has been kicked off and is not done yet"""
+        return self.complete_status is not None and not self.complete_status.done
+
+    def buffer(self, index):
+        """DDC of the channels in buffer ``index``"""
+        return getattr(self, "buffer%d" % (index % self.num_buffers))
+
+    def kickoff(self):
+        """
+        Start this Flyer
+        """
+        if self.flying:
+            raise RuntimeError("Already kicked off.")
+        self.complete_status = DeviceStatus(self)
+        self.points_read = 0
+        self.buffers_read = 0
+        self.overruns = 0
+        self._pages.clear()
+
+        def done_cb(value=None, **kwargs):
+            if value in (self.done_value, str(self.done_value)):
+                self._executor.submit(self._finish)
+
+        if self.num_buffers > 1:
+            self._ready_start = int(self.buffers_ready.get())
+            new_data = self.buffers_ready
+        else:
+            new_data = getattr(self.buffer0, self.channel_names[0]).number_read
+
+        def data_cb(**kwargs):
+            # one read waiting is enough: it reads all new points
+            if not self._read_pending.is_set():
+                self._read_pending.set()
+                self._executor.submit(self._read)
+
+        # only changes from now on
+        self._subscriptions = [
+            (new_data, new_data.subscribe(data_cb, run=False)),
+            (self.done_signal, self.done_signal.subscribe(done_cb, run=False)),
+        ]
+        self.trigger_signal.put(self.trigger_value)
+
+        kickoff_status = DeviceStatus(self)
+        kickoff_status._finished(success=True)
+        return kickoff_status
+
+    def complete(self):
+        """
+        Wait for flying to be complete
+        """
+        if self.complete_status is None:
+            raise RuntimeError("No collection in progress")
+        return self.complete_status
+
+    def stop(self, *, success=False):
+        """
+        halt the fly scan: put the done value to the trigger
+        """
+        if self.flying:
+            self.trigger_signal.put(self.done_value)
+
+    def _unsubscribe(self):
+        for signal, cid in self._subscriptions:
+            signal.unsubscribe(cid)
+        self._subscriptions = []
+
+    def _finish(self):
+        """(worker thread) read what is left, then done"""
+        self._unsubscribe()
+        try:
+            self._read(final=True)
+        except Exception as exc:
+            logger.error("%s: final read failed: %s", self.name, exc)
+        if self.complete_status is not None and not self.complete_status.done:
+            self.complete_status._finished(success=True)
+
+    # - - - - - - - - - - - read the waveforms
+
+    def _read(self, final=False):
+        """(worker thread) read new points, keep them as event pages"""
+        self._read_pending.clear()
+        with self._read_lock:
+            if self.num_buffers > 1:
+                self._read_buffers(final)
+            else:
+                self._read_new_points()
+
+    def _read_arrays(self, channels):
+        """each waveform of ``channels`` read once, trimmed to the shortest NORD"""
+        arrays = OrderedDict()
+        nord = None
+        for name in self.channel_names:
+            channel = getattr(channels, name)
+            arrays[name] = np.asarray(channel.wave.get())
+            n = min(int(channel.number_read.get()), len(arrays[name]))
+            nord = n if nord is None else min(nord, n)
+        return arrays, nord or 0
+
+    def _read_new_points(self):
+        arrays, nord = self._read_arrays(self.buffer0)
+        if nord > self.points_read:
+            for k, v in arrays.items():
+                arrays[k] = v[self.points_read:nord]
+            self._pages.append(self._page(arrays))
+            self.points_read = nord
+
+    def _read_buffers(self, final=False):
+        filled = int(self.buffers_ready.get()) - self._ready_start
+        # num_buffers ahead: the IOC is writing the next one to read
+        # (unless it is done)
+        intact = self.num_buffers if final else self.num_buffers - 1
+        if filled - self.buffers_read > intact:
+            lost = filled - self.buffers_read - intact
+            logger.warning("%s: %d buffers overwritten before read", self.name, lost)
+            self.overruns += lost
+            self.buffers_read += lost
+        while self.buffers_read < filled:
+            arrays, nord = self._read_arrays(self.buffer(self.buffers_read))
+            for k, v in arrays.items():
+                arrays[k] = v[:nord]
+            self._pages.append(self._page(arrays))
+            self.points_read += nord
+            self.buffers_read += 1
+
+    def _page(self, arrays):
+        """event page (no descriptor, uid, or seq_num) of these points"""
+        n = min(len(v) for v in arrays.values())
+        if self.time_channel is not None:
+            times = arrays[self.time_channel][:n].tolist()
+        else:
+            times = [time.time()] * n
+        data = OrderedDict(
+            (self.data_key(k), v[:n].tolist()) for k, v in arrays.items())
+        timestamps = {k: times for k in data}
+        return dict(time=times, data=data, timestamps=timestamps)
+
+    # - - - - - - - - - - - collect
+
+    def data_key(self, channel):
+        """data key of ``channel``: prefixed with the flyer's name"""
+        return "{}_{}".format(self.name, channel)
+
+    def describe_collect(self):
+        """
+        Describe details for ``collect()`` method (made once)
+        """
+        if self._describe_collect is None:
+            schema = OrderedDict()
+            for name in self.channel_names:
+                wave = getattr(self.buffer0, name).wave
+                schema[self.data_key(name)] = dict(
+                    # (simulated signals have no pvname)
+                    source=getattr(wave, "pvname", wave.name),
+                    dtype="number",
+                    shape=[])
+            self._describe_collect = {self.name: schema}
+        return self._describe_collect
+
+    def _take_pages(self):
+        """pages read since the last call"""
+        pages = []
+        while len(self._pages) > 0:
+            pages.append(self._pages.popleft())
+        if self.complete_status is not None and self.complete_status.done:
+            self.complete_status = None
+        return pages
+
+    def collect_pages(self):
+        """
+        Retrieve data from the flyer as *proto-event-pages*
+
+        Can be called while flying: returns only the pages
+        not collected before.
+        """
+        yield from self._take_pages()
+
+    def collect(self):
+        """
+        Retrieve data from the flyer as *proto-events*
+
+        (for RunEngines that do not support pages)
+        """
+        for page in self._take_pages():
+            keys = list(page["data"].keys())
+            for i, t in enumerate(page["time"]):
+                data = {k: page["data"][k][i] for k in keys}
+                timestamps = {k: t for k in keys}
+                yield dict(time=t, data=data, timestamps=timestamps)
@@ -19,10 +19,24 @@ EXAMPLES
     
     calc1.reset()
 
+    # many records, all puts sent together
+    bulk = synApps_ophyd.BulkPut()
+    scans.reset(bulk)
+    calcs.reset(bulk)
+    bulk.send()
+
+    # a CALC expression, evaluated here for many inputs at once
+    calc = synApps_ophyd.compile_calc("floor(A/B)")
+    steps = calc(A=np.linspace(-10, 10, 1000001), B=2.5)
+
 Compare this effort with a similar project:
 https://github.com/klauer/recordwhat
 """
 
 
+from .bulk_put import *
+from .calc_expression import *
 from .synApps_sscan import *
 from .synApps_swait import *
+from .sscan_flyer import *
+from .swait_sim import *
@@ -0,0 +1,161 @@
+
+"""
+Put many fields at once: gather, send all, wait once
+"""
+
+
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+from ophyd.signal import EpicsSignalBase
+
+try:
+    from epics import ca
+except ImportError:     # caproto control layer
+    ca = None
+
+
+__all__ = """
+    BulkPut
+    BulkPutError
+    """.split()
+
+logger = logging.getLogger(__name__)
+
+
+def all_components(device):
+    """
+    sub-devices & signals of ``device``, made now if lazy
+
+    Lazy ones are made without waiting for their connection,
+    ``BulkPut.send()`` connects them all together.
+    """
+    wait = device.lazy_wait_for_connection
+    device.lazy_wait_for_connection = False
+    try:
+        return [getattr(device, name) for name in device.component_names]
+    finally:
+        device.lazy_wait_for_connection = wait
+
+
+class BulkPutError(RuntimeError):
+    """some puts of a ``BulkPut`` did not succeed: see ``failures``"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        msg = "{} put(s) failed: ".format(len(failures))
+        msg += "; ".join(
+            "{}={!r}: {}".format(name, value, reason)
+            for name, value, reason in failures)
+        super().__init__(msg)
+
+
+class BulkPut(object):
+    """
+    gather field writes of a device tree, then send them all at once
+
+    Each ``put()`` is only noted (the last value of a signal wins).
+    ``send()`` puts every value without waiting (put callback),
+    flushes Channel Access once, then waits for all the callbacks:
+    about one round trip for the lot instead of one per field.
+    Functions given to ``call_after()`` run once all are done.
+
+    EXAMPLE::
+
+        bulk = BulkPut()
+        scans.scan1.reset(bulk)
+        scans.scan2.reset(bulk)
+        bulk.send()
+
+    Parameters
+
+    timeout : float, optional
+        seconds to wait for all the puts (default: 10)
+
+    .. autosummary::
+
+       ~put
+       ~call_after
+       ~send
+    """
+
+    def __init__(self, timeout=10):
+        self.timeout = timeout
+        self.writes = OrderedDict()     # signal : value
+        self.after = []
+
+    def __len__(self):
+        return len(self.writes)
+
+    def put(self, signal, value):
+        """note: put ``value`` to ``signal`` when sent"""
+        self.writes[signal] = value
+
+    def call_after(self, function):
+        """call ``function()`` once all puts are done"""
+        self.after.append(function)
+
+    def send(self, timeout=None):
+        """
+        send all puts, wait for them, raise ``BulkPutError`` on failures
+
+        :returns: number of puts sent
+        """
+        timeout = timeout or self.timeout
+        writes, self.writes = self.writes, OrderedDict()
+        after, self.after = self.after, []
+        failures = []
+        pending = OrderedDict()     # signal : value, until its callback
+        lock = threading.RLock()     # (callback may come during put)
+        all_done = threading.Event()
+
+        def put_done(signal):
+            with lock:
+                pending.pop(signal, None)
+                if len(pending) == 0:
+                    all_done.set()
+
+        # connect all (in parallel: the channels connect in the background)
+        deadline = time.time() + timeout
+        for signal, value in list(writes.items()):
+            try:
+                signal.wait_for_connection(timeout=max(deadline - time.time(), 0.001))
+            except AttributeError:
+                pass    # not an EPICS signal
+            except Exception as exc:
+                failures.append((signal.name, value, exc))
+                del writes[signal]
+
+        with lock:
+            for signal, value in writes.items():
+                try:
+                    if isinstance(signal, EpicsSignalBase):
+                        pending[signal] = value
+                        signal.put(
+                            value, use_complete=True, timeout=timeout,
+                            callback=lambda *args, signal=signal, **kwargs: put_done(signal))
+                    else:
+                        signal.put(value)
+                except Exception as exc:
+                    pending.pop(signal, None)
+                    failures.append((signal.name, value, exc))
+            if len(pending) == 0:
+                all_done.set()
+        if ca is not None:
+            ca.flush_io()
+
+        all_done.wait(max(deadline - time.time(), 0))
+        with lock:
+            for signal, value in pending.items():
+                reason = "no put callback in {} s".format(timeout)
+                failures.append((signal.name, value, reason))
+
+        if len(failures) > 0:
+            for name, value, reason in failures:
+                logger.error("put %s=%r failed: %s", name, value, reason)
+            raise BulkPutError(failures)
+        for function in after:
+            function()
+        return len(writes)
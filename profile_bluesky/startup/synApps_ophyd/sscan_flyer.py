@@ -0,0 +1,466 @@
+
+"""
+Fly scan: the IOC steps the motors (sscan records), data as event pages
+
+The scan is given as for ``bp.grid_scan()`` (first motor is the
+slowest, one motor per dimension, up to 4).  The innermost
+dimension is ``scan1``, the next ``scan2`` (which triggers ``scan1``
+at each of its points), and so on.  The sscan records do all the
+stepping, triggering, and reading in the IOC: no Channel Access
+round trips per point.
+
+EXAMPLE::
+
+    scans = synApps_ophyd.EpicsSscanDevice("prj:", name="scans")
+    sscan_flyer = synApps_ophyd.SscanFlyer(scans, name="sscan_flyer")
+    sscan_flyer.prepare([I0, diode], m2, -1, 1, 11, m1, -2, 2, 41)
+    RE(bp.fly([sscan_flyer]))
+
+Data arrive as event pages:
+
+* each line of the innermost scan, once it is done (DATA=1):
+  innermost readbacks and detectors from the data arrays, outer
+  motors at their planned positions
+* 1-D: also while scanning, as CPT advances (current arrays,
+  posted by the IOC every ``array_post_time``)
+
+After each line, the innermost record waits for the flyer (its
+wait-for-client: ``AWCT=1`` sets ``WCNT`` at each start, the
+flyer puts ``WAIT=0`` once the line's arrays are read), so the
+next line cannot overwrite the arrays before they are read.
+AWCT is put back to 0 when the scan ends.
+
+.. autosummary::
+
+   ~SscanFlyer
+"""
+
+
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+import numpy as np
+from ophyd import Device, DeviceStatus
+
+from .bulk_put import BulkPut
+
+
+__all__ = """
+    SscanFlyer
+    """.split()
+
+logger = logging.getLogger(__name__)
+
+MAX_DETECTORS = 70
+MAX_TRIGGERS = 4
+
+
+def _stepped_pvs(positioner):
+    """(setpoint, readback) PV names of an EpicsMotor or EpicsSignal"""
+    if hasattr(positioner, "user_setpoint"):
+        return positioner.user_setpoint.pvname, positioner.user_readback.pvname
+    if hasattr(positioner, "setpoint_pvname"):
+        return positioner.setpoint_pvname, positioner.pvname
+    raise ValueError("{}: no EPICS PV to step".format(positioner.name))
+
+
+def _pvname(signal):
+    pvname = getattr(signal, "pvname", None)
+    if pvname is None:
+        raise ValueError("{}: not an EPICS signal".format(signal.name))
+    return pvname
+
+
+class SscanFlyer(Device):
+    """
+    ophyd Flyer: a grid scan run by the sscan records of the IOC
+
+    Parameters
+
+    scans : EpicsSscanDevice
+        the sscan records (``scan1`` - ``scan4``)
+    timeout : float, optional
+        seconds to configure the records (default: 10)
+
+    .. autosummary::
+
+       ~prepare
+       ~kickoff
+       ~complete
+       ~stop
+       ~describe_collect
+       ~collect_pages
+       ~collect
+    """
+
+    def __init__(self, scans, timeout=10, **kwargs):
+        super().__init__('', parent=None, **kwargs)
+        self.scans = scans
+        self.records = (scans.scan1, scans.scan2, scans.scan3, scans.scan4)
+        self.timeout = timeout
+
+        self.detectors = []
+        self.dimensions = []        # (positioner, start, stop, num), outermost first
+        self.triggers = []
+        self.settle_time = 0
+        self.detector_delay = 0
+        self.array_post_time = 0.1
+
+        self.lines_read = 0         # of the innermost scan
+        self.points_read = 0        # this fly scan
+        self._in_line = 0           # points of this line already read
+        self._kickoff_status = None
+        self._completion_status = None
+        self._aborted = False
+        self._started = False
+        self._pages = deque()
+        self._subscriptions = []
+        self._describe_collect = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._read_pending = threading.Event()
+
+    @property
+    def flying(self):
+        """has been kicked off and is not done yet"""
+        status = self._completion_status
+        return status is not None and not status.done
+
+    @property
+    def shape(self):
+        """points in each dimension, outermost first"""
+        return [num for _p, _s, _e, num in self.dimensions]
+
+    @property
+    def inner(self):
+        """sscan record of the innermost dimension"""
+        return self.records[0]
+
+    @property
+    def outer(self):
+        """sscan record of the outermost dimension (it is started)"""
+        return self.records[len(self.dimensions) - 1]
+
+    def prepare(self, detectors, *args, triggers=(), settle_time=0,
+                detector_delay=0, array_post_time=0.1):
+        """
+        define the scan (nothing is sent until ``kickoff()``)
+
+        Parameters
+
+        detectors : list
+            EPICS signals read at each point (``D01`` - ``D70``)
+        args :
+            ``motor, start, stop, num``, for each dimension,
+            slowest first (as ``bp.grid_scan()``)
+        triggers : list of (signal, value), optional
+            put at each point before the detectors are read,
+            such as ``[(scaler.count, 1)]`` (``T1`` - ``T4``)
+        settle_time : float, optional
+            seconds after each move (``PDLY``)
+        detector_delay : float, optional
+            seconds after the triggers (``DDLY``)
+        array_post_time : float, optional
+            seconds between updates of the current arrays (``ATIME``)
+        """
+        if self.flying:
+            raise RuntimeError("Cannot prepare while flying.")
+        if len(args) == 0 or len(args) % 4 != 0:
+            raise ValueError("expected: motor, start, stop, num, for each dimension")
+        dimensions = [
+            (args[i], args[i + 1], args[i + 2], int(args[i + 3]))
+            for i in range(0, len(args), 4)]
+        if len(dimensions) > len(self.records):
+            msg = "at most {} dimensions".format(len(self.records))
+            raise ValueError(msg)
+        if not 0 < len(detectors) <= MAX_DETECTORS:
+            raise ValueError("1 to {} detectors".format(MAX_DETECTORS))
+        if len(triggers) > MAX_TRIGGERS:
+            raise ValueError("at most {} triggers".format(MAX_TRIGGERS))
+        for positioner, _start, _stop, num in dimensions:
+            _stepped_pvs(positioner)
+            if num < 1:
+                raise ValueError("{}: num must be positive".format(positioner.name))
+        for det in detectors:
+            _pvname(det)
+
+        self.detectors = list(detectors)
+        self.dimensions = dimensions
+        self.triggers = list(triggers)
+        self.settle_time = settle_time
+        self.detector_delay = detector_delay
+        self.array_post_time = array_post_time
+        self._describe_collect = None
+
+    # - - - - - - - - - - - the fly scan
+
+    def _submit(self, function, *args):
+        """run ``function(*args)`` in the worker thread"""
+        self._executor.submit(self._guarded, function, *args)
+
+    def _guarded(self, function, *args):
+        try:
+            function(*args)
+        except Exception as exc:
+            self._fail(exc)
+
+    def _fail(self, exc):
+        logger.error("%s failed: %s", self.name, exc)
+        self._unsubscribe()
+        try:
+            self._end_wait()
+        except Exception as wait_exc:
+            logger.error("%s: wait-for-client not ended: %s", self.name, wait_exc)
+        for status in (self._kickoff_status, self._completion_status):
+            if status is not None and not status.done:
+                status._finished(success=False)
+
+    def kickoff(self):
+        """
+        Start this Flyer (status is done once the scan has started)
+        """
+        if self.flying:
+            raise RuntimeError("Already kicked off.")
+        if len(self.dimensions) == 0:
+            raise RuntimeError("No scan defined: call prepare() first.")
+        self._kickoff_status = DeviceStatus(self)
+        self._completion_status = DeviceStatus(self)
+        self.lines_read = 0
+        self.points_read = 0
+        self._in_line = 0
+        self._aborted = False
+        self._started = False
+        self._pages.clear()
+        self._submit(self._start)
+        return self._kickoff_status
+
+    def _configure(self, bulk):
+        """all puts to define the scan in the records"""
+        dims = list(reversed(self.dimensions))     # innermost first
+        for k, (positioner, start, stop, num) in enumerate(dims):
+            record = self.records[k]
+            setpoint, readback = _stepped_pvs(positioner)
+            p1 = record.positioners.p1
+            bulk.put(record.npts, num)
+            bulk.put(p1.setpoint_pv, setpoint)
+            bulk.put(p1.readback_pv, readback)
+            bulk.put(p1.mode, "LINEAR")
+            bulk.put(p1.abs_rel, "ABSOLUTE")
+            bulk.put(p1.start, start)
+            bulk.put(p1.end, stop)
+            bulk.put(record.pdly, self.settle_time)
+            bulk.put(record.pasm, "STAY")
+            if k > 0:
+                # each point of this scan runs the scan inside it
+                t1 = record.triggers.t1
+                bulk.put(t1.trigger_pv, self.records[k - 1].exsc.pvname)
+                bulk.put(t1.trigger_value, 1)
+
+        inner = self.inner
+        for i, det in enumerate(self.detectors):
+            channel = getattr(inner.detectors, "d%02d" % (i + 1))
+            bulk.put(channel.input_pv, _pvname(det))
+        for i, (signal, value) in enumerate(self.triggers):
+            trigger = getattr(inner.triggers, "t%d" % (i + 1))
+            bulk.put(trigger.trigger_pv, _pvname(signal))
+            bulk.put(trigger.trigger_value, value)
+        bulk.put(inner.ddly, self.detector_delay)
+        bulk.put(inner.atime, self.array_post_time)
+        # after each line, wait until the flyer has read the arrays
+        bulk.put(inner.awct, 1)
+
+    def _start(self):
+        """(worker thread) configure the records, start the outermost"""
+        bulk = BulkPut(timeout=self.timeout)
+        for record in self.records[:len(self.dimensions)]:
+            record.reset(bulk)
+        self._configure(bulk)
+        bulk.send()
+
+        def exsc_cb(value=None, **kwargs):
+            if value in (1, "SCAN"):
+                self._started = True
+            elif value in (0, "IDLE") and self._started:
+                self._submit(self._finish)
+
+        def data_cb(value=None, **kwargs):
+            if value in (1, "Data ready"):
+                self._submit(self._line_done)
+
+        def cpt_cb(**kwargs):
+            # one read waiting is enough: it reads all new points
+            if not self._read_pending.is_set():
+                self._read_pending.set()
+                self._submit(self._new_points)
+
+        inner, outer = self.inner, self.outer
+        # only changes from now on
+        self._subscriptions = [
+            (outer.exsc, outer.exsc.subscribe(exsc_cb, run=False)),
+            (inner.data_ready, inner.data_ready.subscribe(data_cb, run=False)),
+        ]
+        if len(self.dimensions) == 1:
+            self._subscriptions.append(
+                (inner.cpt, inner.cpt.subscribe(cpt_cb, run=False)))
+        outer.exsc.put(1)
+        self._kickoff_status._finished(success=True)
+
+    def _unsubscribe(self):
+        for signal, cid in self._subscriptions:
+            signal.unsubscribe(cid)
+        self._subscriptions = []
+
+    def _new_points(self):
+        """(1-D) points done since the last read, from the current arrays"""
+        self._read_pending.clear()
+        cpt = int(self.inner.cpt.get())
+        if cpt > self._in_line:
+            self._read_line(cpt, "current_array")
+
+    @property
+    def num_lines(self):
+        """lines of the innermost scan"""
+        return int(np.prod(self.shape[:-1]))
+
+    def _line_done(self):
+        """innermost scan done: the rest of its points, from the data arrays"""
+        self._read_pending.clear()
+        try:
+            if self.lines_read >= self.num_lines:
+                return      # (already read by _finish)
+            num = self.dimensions[-1][3]
+            if self._aborted:
+                num = min(num, int(self.inner.cpt.get()))
+            if num > self._in_line:
+                self._read_line(num, "array")
+            self.lines_read += 1
+            self._in_line = 0
+        finally:
+            # arrays read: the record may go on
+            if int(self.inner.wcnt.get()) > 0:
+                self.inner.wait.put(0)
+
+    def _end_wait(self):
+        """no more waiting for this flyer (AWCT=0, WCNT released)"""
+        inner = self.inner
+        inner.awct.put(0)
+        while int(inner.wcnt.get()) > 0:
+            inner.wait.put(0)
+
+    def _read_line(self, last, array_attr):
+        """page of points ``_in_line:last`` of the innermost line"""
+        first = self._in_line
+        inner = self.inner
+        positioner = self.dimensions[-1][0]
+        arrays = OrderedDict()
+        wave = getattr(inner.positioners.p1, array_attr)
+        arrays[positioner.name] = np.asarray(wave.get())[first:last]
+        for i, det in enumerate(self.detectors):
+            channel = getattr(inner.detectors, "d%02d" % (i + 1))
+            wave = getattr(channel, array_attr)
+            arrays[det.name] = np.asarray(wave.get())[first:last]
+        n = min(len(v) for v in arrays.values())
+
+        # outer motors: planned positions of this line
+        outer_dims = self.dimensions[:-1]
+        if len(outer_dims) > 0:
+            index = np.unravel_index(self.lines_read, self.shape[:-1])
+            for (positioner, start, stop, num), i in zip(outer_dims, index):
+                position = np.linspace(start, stop, num)[i]
+                arrays[positioner.name] = np.full(n, position)
+
+        times = [time.time()] * n
+        data = OrderedDict((k, v[:n].tolist()) for k, v in arrays.items())
+        timestamps = {k: times for k in data}
+        self._pages.append(dict(time=times, data=data, timestamps=timestamps))
+        self._in_line = first + n
+        self.points_read += n
+
+    def _finish(self):
+        """(worker thread) outermost scan done"""
+        self._unsubscribe()
+        if self.lines_read == self.num_lines - 1:
+            self._line_done()   # DATA of the last line not seen (yet)
+        if self.lines_read < self.num_lines and not self._aborted:
+            logger.warning(
+                "%s: %d of %d lines not read",
+                self.name, self.num_lines - self.lines_read, self.num_lines)
+        self._end_wait()
+        if not self._completion_status.done:
+            self._completion_status._finished(success=not self._aborted)
+
+    # - - - - - - - - - - - ophyd Flyer interface
+
+    def complete(self):
+        """
+        Wait for flying to be complete
+        """
+        if self._completion_status is None:
+            raise RuntimeError("No collection in progress")
+        return self._completion_status
+
+    def stop(self, *, success=False):
+        """
+        abort the scan (status then reports failure)
+
+        Every record of the scan is stopped, innermost first
+        (stopping only the outer one leaves the inner line running).
+        """
+        if self.flying:
+            self._aborted = not success
+            for record in self.records[:len(self.dimensions)]:
+                record.exsc.put(0)
+
+    def describe_collect(self):
+        """
+        Describe details for ``collect()`` method (made once)
+        """
+        if self._describe_collect is None:
+            schema = OrderedDict()
+            for positioner, _start, _stop, _num in reversed(self.dimensions):
+                schema[positioner.name] = dict(
+                    source="PV:" + _stepped_pvs(positioner)[1],
+                    dtype="number",
+                    shape=[])
+            for det in self.detectors:
+                schema[det.name] = dict(
+                    source="PV:" + _pvname(det),
+                    dtype="number",
+                    shape=[])
+            self._describe_collect = {self.name: schema}
+        return self._describe_collect
+
+    def read_configuration(self):
+        return OrderedDict()
+
+    def describe_configuration(self):
+        return OrderedDict()
+
+    def _take_pages(self):
+        """pages read since the last call"""
+        pages = []
+        while len(self._pages) > 0:
+            pages.append(self._pages.popleft())
+        return pages
+
+    def collect_pages(self):
+        """
+        Retrieve data from the flyer as *proto-event-pages*
+
+        Can be called while flying: returns only the pages
+        not collected before.
+        """
+        yield from self._take_pages()
+
+    def collect(self):
+        """
+        Retrieve data from the flyer as *proto-events*
+        """
+        for page in self._take_pages():
+            keys = list(page["data"].keys())
+            for i, t in enumerate(page["time"]):
+                data = {k: page["data"][k][i] for k in keys}
+                timestamps = {k: t for k in keys}
+                yield dict(time=t, data=data, timestamps=timestamps)
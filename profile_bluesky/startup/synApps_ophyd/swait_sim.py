@@ -0,0 +1,251 @@
+
+"""
+swait calc records as synthetic detectors, in this process (no IOC)
+
+Each simulator has the CALC expression and channel values (A-L)
+that the ``swait_setup_*()`` functions write to a swait record,
+and evaluates the same expression (``compile_calc()``) with numpy:
+channel A (the motor readback) is an array of positions, RNDM one
+random number each.  One point (``sim(x)``) is computed by the
+simulator's own formula (plain python, the same values), much faster
+than numpy for a single number.
+
+* batches: ``sim.evaluate(positions)`` -- all points at once
+* point by point: ``sim(position)``
+* in a bluesky plan: ``sim.signal(motor, name="noisy")`` is a
+  detector that evaluates at the motor's position when triggered
+
+EXAMPLE::
+
+    sim = GaussianSim(center=-1, width=0.05, scale=1e5, noise=0.05, seed=1)
+    y = sim.evaluate(np.linspace(-1.5, -0.5, 1000000))
+
+    noisy = sim.signal(m1, name="noisy")
+    RE(bp.scan([noisy], m1, -1.5, -0.5, 219))
+
+.. autosummary::
+
+   ~SwaitSimulator
+   ~GaussianSim
+   ~LorentzianSim
+   ~PseudoVoigtSim
+   ~RandomSim
+   ~IncrementerSim
+"""
+
+
+import math
+
+import numpy as np
+
+from .calc_expression import compile_calc
+
+
+__all__ = """
+    CALC_GAUSSIAN
+    CALC_LORENTZIAN
+    CALC_PSEUDOVOIGT
+    CALC_RANDOM
+    CALC_INCREMENTER
+    SwaitSimulator
+    GaussianSim
+    LorentzianSim
+    PseudoVoigtSim
+    RandomSim
+    IncrementerSim
+    """.split()
+
+# CALC expressions, as written to the swait records
+CALC_GAUSSIAN = "D*(0.95+E*RNDM)/exp(((A-b)/c)^2)"
+CALC_LORENTZIAN = "D*(0.95+E*RNDM)/(1+((A-b)/c)^2)"
+CALC_PSEUDOVOIGT = "D*(0.95+E*RNDM)*(F/(1+((A-B)/C)^2)+(1-F)/exp(((A-B)/C)^2))"
+CALC_RANDOM = "RNDM"
+CALC_INCREMENTER = "(A+1) % B"
+
+CHANNELS = "A B C D E F G H I J K L".split()
+
+
+class SwaitSimulator(object):
+    """
+    one swait record: VAL from CALC and channels A-L
+
+    Subclasses define ``calc``, and ``_evaluate(a)``
+    (``a``: array of channel A values) if not simply CALC,
+    and ``_evaluate_one(a)`` (``a``: one value, a float).
+
+    Parameters
+
+    seed : int, optional
+        of the random numbers (RNDM), for repeatable results
+    channels :
+        values of channels ``A`` - ``L`` (default: 0)
+
+    .. autosummary::
+
+       ~evaluate
+       ~signal
+    """
+
+    calc = "0"
+    description = ""
+
+    def __init__(self, seed=None, **channels):
+        self.channels = {letter: 0 for letter in CHANNELS}
+        for letter, value in channels.items():
+            if letter.upper() not in self.channels:
+                raise KeyError("no swait channel {}".format(letter))
+            self.channels[letter.upper()] = value
+        self._rng = np.random.RandomState(seed)
+        self._calc = compile_calc(self.calc)
+
+    def __repr__(self):
+        terms = ["calc={!r}".format(self.calc)]
+        terms += [
+            "{}={}".format(k, v)
+            for k, v in sorted(self.channels.items()) if v != 0]
+        return "{}({})".format(self.__class__.__name__, ", ".join(terms))
+
+    def rndm(self, n):
+        """``n`` random numbers (RNDM: uniform, 0 to 1)"""
+        return self._rng.random_sample(n)
+
+    def evaluate(self, positions):
+        """
+        VAL for each of ``positions`` (channel A), as a numpy array
+        """
+        a = np.asarray(positions, dtype=float)
+        return self._evaluate(a.ravel()).reshape(a.shape)
+
+    def _inputs(self):
+        """the channels CALC uses (not A), as numbers"""
+        return {
+            k: float(self.channels[k])
+            for k in self._calc.operands if k != "A"}
+
+    def _evaluate(self, a):
+        return self._calc(rng=self._rng, shape=a.shape, A=a, **self._inputs())
+
+    def _evaluate_one(self, a):
+        return self._calc(rng=self._rng, A=a, **self._inputs())
+
+    def __call__(self, position):
+        """VAL at one position"""
+        return float(self._evaluate_one(float(position)))
+
+    def signal(self, positioner, name=None, **kwargs):
+        """
+        ophyd detector: when triggered, VAL at the positioner's position
+
+        ``kwargs`` are passed to ``ophyd.sim.SynSignal``
+        """
+        from ophyd.sim import SynSignal
+        return SynSignal(
+            func=lambda: self(positioner.position),
+            name=name or self.__class__.__name__.lower(),
+            **kwargs)
+
+
+class _PeakSim(SwaitSimulator):
+    """peak at B, width C, scale D, noise E (as swait_setup_gaussian)"""
+
+    def __init__(self, center=0, width=1, scale=1, noise=0.05, seed=None, **channels):
+        if width <= 0:
+            raise ValueError("width must be > 0")
+        if not 0.0 <= noise <= 1.0:
+            raise ValueError("noise must be between 0 and 1")
+        super().__init__(
+            seed=seed, B=center, C=width, D=scale, E=noise, **channels)
+
+    def _noisy_scale(self):
+        """D*(0.95+E*RNDM), one point"""
+        c = self.channels
+        return c["D"] * (0.95 + c["E"] * self._rng.random_sample())
+
+    def _z2(self, a):
+        """((A-B)/C)^2, one point"""
+        c = self.channels
+        return ((a - c["B"]) / c["C"]) ** 2
+
+
+class GaussianSim(_PeakSim):
+    """noisy Gaussian: as ``swait_setup_gaussian()``"""
+
+    calc = CALC_GAUSSIAN
+    description = "noisy Gaussian curve"
+
+    def _evaluate_one(self, a):
+        return self._noisy_scale() * math.exp(-self._z2(a))
+
+
+class LorentzianSim(_PeakSim):
+    """noisy Lorentzian: as ``swait_setup_lorentzian()``"""
+
+    calc = CALC_LORENTZIAN
+    description = "noisy Lorentzian curve"
+
+    def _evaluate_one(self, a):
+        return self._noisy_scale() / (1 + self._z2(a))
+
+
+class PseudoVoigtSim(_PeakSim):
+    """
+    noisy pseudo-Voigt: Lorentzian fraction ``eta`` (F), Gaussian ``1-eta``
+    """
+
+    calc = CALC_PSEUDOVOIGT
+    description = "noisy pseudo-Voigt curve"
+
+    def __init__(self, center=0, width=1, scale=1, noise=0.05, eta=0.5, seed=None):
+        if not 0.0 <= eta <= 1.0:
+            raise ValueError("eta must be between 0 and 1")
+        super().__init__(
+            center=center, width=width, scale=scale, noise=noise,
+            seed=seed, F=eta)
+
+    def _evaluate_one(self, a):
+        eta = self.channels["F"]
+        scale = self._noisy_scale()
+        z2 = self._z2(a)
+        return scale * (eta / (1 + z2) + (1 - eta) * math.exp(-z2))
+
+
+class RandomSim(SwaitSimulator):
+    """uniform random numbers: as ``swait_setup_random_number()``"""
+
+    calc = CALC_RANDOM
+    description = "uniform random numbers"
+
+    def _evaluate_one(self, a):
+        return self._rng.random_sample()
+
+
+class IncrementerSim(SwaitSimulator):
+    """
+    counts up to ``limit``, then from 0: as ``swait_setup_incrementer()``
+
+    Channel A is VAL (each processing adds one), the positions
+    only give the number of values.
+    """
+
+    calc = CALC_INCREMENTER
+    description = "incrementer"
+
+    def __init__(self, limit=100000, start=0):
+        super().__init__(A=start, B=limit)
+
+    def _evaluate(self, a):
+        c = self.channels
+        # A: previous VAL, for each processing
+        previous = c["A"] + np.arange(a.size)
+        values = self._calc(A=previous, B=c["B"])     # float array
+        if values.size > 0:
+            c["A"] = int(values[-1])
+        return values
+
+    def _evaluate_one(self, a):
+        c = self.channels
+        limit = math.trunc(c["B"])
+        if limit == 0:
+            return math.nan     # as numpy's fmod
+        c["A"] = int(math.fmod(math.trunc(c["A"] + 1), limit))
+        return float(c["A"])
@@ -1,5 +1,13 @@
 print(__file__)
 
+# local packages: synApps_ophyd/ (here) and the modules in local_code/
+import os
+import sys
+for _path in (os.path.dirname(__file__),
+              os.path.join(os.path.dirname(__file__), "local_code")):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
 # Make ophyd listen to pyepics.
 from ophyd import setup_ophyd
 setup_ophyd()
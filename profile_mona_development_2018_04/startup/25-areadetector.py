@@ -6,6 +6,9 @@ from ophyd.areadetector.filestore_mixins import FileStoreHDF5IterativeWrite
 from ophyd import Component, Device, EpicsSignalWithRBV
 from ophyd.areadetector import ADComponent
 
+from ad_stream_flyer import ADStreamFlyer
+from synApps_ophyd.calc_expression import compile_calc
+
 
 image_file_path = "/tmp"
 
@@ -70,6 +73,11 @@ def ad_continuous_setup(det, acq_time=0.1, acq_period=0.005):
     det.cam.image_mode.put("Continuous")
 
 
+# CALC of the swait records that trigger the detector
+DET_MOTION_CALC = "floor(A/B)"
+DET_TRIGGER_CALC = "C&&(A!=B)"
+
+
 def setup_det_trigger(motor, det, motion_calc, trigger_calc, increment=2.5):
     """
     Prepare to trigger simulated area detector when motor is moved.
@@ -80,7 +88,7 @@ def setup_det_trigger(motor, det, motion_calc, trigger_calc, increment=2.5):
     motion_calc.desc.put("motion increment")
     motion_calc.channels.A.input_pv.put(motor.user_readback.pvname)
     motion_calc.channels.B.value.put(increment)
-    motion_calc.calc.put("floor(A/B)")
+    motion_calc.calc.put(DET_MOTION_CALC)
     motion_calc.oopt.put("Every Time")
     motion_calc.scan.put("I/O Intr")
 
@@ -89,7 +97,7 @@ def setup_det_trigger(motor, det, motion_calc, trigger_calc, increment=2.5):
     trigger_calc.channels.A.input_pv.put(trigger_calc.channels.B.value.pvname)
     trigger_calc.channels.B.input_pv.put(motion_calc.val.pvname)
     trigger_calc.channels.C.input_pv.put(motor.direction_of_travel.pvname)
-    trigger_calc.calc.put("C&&(A!=B)")
+    trigger_calc.calc.put(DET_TRIGGER_CALC)
     trigger_calc.oopt.put("Transition To Non-zero")
     trigger_calc.outn.put(det.cam.prefix + "Acquire")
     trigger_calc.scan.put("I/O Intr")
@@ -105,6 +113,28 @@ def setup_det_trigger(motor, det, motion_calc, trigger_calc, increment=2.5):
     """
 
 
+def det_trigger_positions(positions, increment=2.5):
+    """
+    motor readbacks at which setup_det_trigger() would take a frame
+
+    Evaluates both CALC expressions here (no IOC), for all of
+    ``positions`` (successive motor readbacks) at once:
+    motion_calc, then trigger_calc (A: previous motion step,
+    B: this one, C: 1 if moving positive), output on each
+    transition to non-zero.  To check the trigger logic,
+    for example: ``det_trigger_positions(np.linspace(-10, 10, 1000001))``
+    """
+    x = np.asarray(positions, dtype=float)
+    if x.size < 2:
+        return x[:0]
+    steps = compile_calc(DET_MOTION_CALC)(A=x, B=increment)
+    previous = np.concatenate((steps[:1], steps[:-1]))
+    direction = np.concatenate(([0], np.diff(x) > 0))
+    val = compile_calc(DET_TRIGGER_CALC)(A=previous, B=steps, C=direction)
+    transition = (val != 0) & (np.concatenate(([0], val[:-1])) == 0)
+    return x[transition]
+
+
 def det_pre_acquire(det, max_frames=10000):
     # enable the HDF5 plugin
     det.hdf1.enable.put("Enable")
@@ -136,4 +166,13 @@ try:
 except NameError:
     pass
 
-# TODO: set up a flyer to move the motor, acquire images, and finish up
+
+# fly scan: move the motor, stream the triggered frames to HDF5 files
+try:
+    ad_flyer = ADStreamFlyer(
+        m3, simdet,
+        pos_start=-2.0, pos_finish=2.0,
+        write_path=image_file_path,
+        name="ad_flyer")
+except NameError:
+    pass
@@ -1,5 +1,16 @@
 print(__file__)
 
+from synApps_ophyd.swait_sim import GaussianSim, LorentzianSim, RandomSim
+
+
+def random_peak_parameters(start=-1.5, stop=-0.5):
+    """center, width, scale, noise of a random peak between start & stop"""
+    return dict(
+        center = start + np.random.uniform()*(stop-start),
+        width = 0.002 + 0.1*np.random.uniform(),
+        scale = 100000 * np.random.uniform(),
+        noise = 0.05 + 0.1*np.random.uniform())
+
 
 def simulate_peak(swait, motor, profile=None, start=-1.5, stop=-0.5):
     if profile is not None:
@@ -7,15 +18,23 @@ def simulate_peak(swait, motor, profile=None, start=-1.5, stop=-0.5):
             gaussian = swait_setup_gaussian,
             lorentzian = swait_setup_lorentzian,
         )[profile]
-        kw = dict(
-            center = start + np.random.uniform()*(stop-start), 
-            width = 0.002 + 0.1*np.random.uniform(), 
-            scale = 100000 * np.random.uniform(), 
-            noise = 0.05 + 0.1*np.random.uniform())
+        kw = random_peak_parameters(start, stop)
         simulator(swait, motor, **kw)
     else:
         swait_setup_random_number(swait)
 
+
+def synthetic_peak(profile=None, start=-1.5, stop=-0.5, seed=None):
+    """as simulate_peak(), evaluated in this process (no IOC)"""
+    if profile is None:
+        return RandomSim(seed=seed)
+    simulator = dict(
+        gaussian = GaussianSim,
+        lorentzian = LorentzianSim,
+    )[profile]
+    return simulator(seed=seed, **random_peak_parameters(start, stop))
+
+
 def both_peaks(calc=None, dets=None, motor=None):
     calc = calc or calc1
     dets = dets or [noisy,]
@@ -25,3 +44,13 @@ def both_peaks(calc=None, dets=None, motor=None):
     yield from bp.scan(dets, motor, start, stop, 219)
     simulate_peak(calc, motor, profile="lorentzian")
     yield from bp.scan(dets, motor, start, stop, 219)
+
+
+def both_peaks_synthetic(motor=None, num=219):
+    """as both_peaks(), with synthetic detectors (no IOC)"""
+    if motor is None:
+        from ophyd.sim import motor
+    start, stop = -1.5, -0.5
+    for profile in ("gaussian", "lorentzian"):
+        det = synthetic_peak(profile, start, stop).signal(motor, name="noisy")
+        yield from bp.scan([det], motor, start, stop, num)
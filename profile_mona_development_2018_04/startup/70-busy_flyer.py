@@ -2,9 +2,10 @@ print(__file__)
 
 """flyer example with the busy record"""
 
-from collections import deque, OrderedDict
+from collections import OrderedDict
 import os
-import subprocess
+
+from busy_sim import BusyIocSimulator, sim_device
 
 
 class BusyRecord(Device):
@@ -29,6 +30,14 @@ class BusyFlyer(Device):
     """
     use the busyExample.py code to make a pseudo-scan
     
+    The scan is run by ``simulator`` (in this process, see
+    ``local_code/busy_sim.py``) or, without a simulator, by
+    ``local_code/busyExample.py`` run separately with the IOC.
+    
+    Kickoff sets the busy record, the scan is complete when the
+    busy record returns to 0 (a monitor, no thread waits).
+    Collect reads the x & y waveforms once each, all the points.
+    
     http://nsls-ii.github.io/ophyd/architecture.html#fly-able-interface
     """
     busy = Component(BusyRecord, 'prj:mybusy')
@@ -37,70 +46,72 @@ class BusyFlyer(Device):
     xArr = Component(MyWaveform, 'prj:x_array')
     yArr = Component(MyWaveform, 'prj:y_array')
     
-    def __init__(self, **kwargs):
+    def __init__(self, simulator=None, **kwargs):
         super().__init__('', parent=None, **kwargs)
-        self.status = None
+        self.simulator = simulator
+        self.waves = (self.xArr, self.yArr)
         self._completion_status = None
-        self._data = deque()
+        self._busy_cid = None
+        self._aborted = False
+        self._describe_collect = None
    
-    def launch_external_program(self):
+    def launch_simulator(self):
         """
-        launch external program in a thread
-        
-        https://docs.python.org/3/library/subprocess.html#subprocess.run
+        start the in-process simulator (its event loop thread)
         """
-        path = os.path.dirname(__file__)
-        path = os.path.join(path, "local_code", "busyExample.py")
-        
-        def _runner():
-            subprocess.run([path, "/dev/null"], stdout=subprocess.PIPE)
-        
-        thread = threading.Thread(target=_runner, daemon=True)
-        thread.start()
+        if self.simulator is not None:
+            self.simulator.start()
    
-    def terminate_external_program(self):
+    def terminate_simulator(self):
         """
-        tell external program to quit
+        end any simulated scan, stop the simulator
         """
-        yield from mv(self.signal.calc, "0")
-        yield from mv(self.signal.proc, 1)
-
-    def activity(self):
-        if self._completion_status is None:
-            return
-
-        yield from mv(busy.state, 1)
-        # ... waiting for it to complete ...
-        self.terminate_external_program()
-        self._completion_status._finished(success=True)
+        if self.simulator is not None:
+            self.simulator.stop()
 
     def set(self, value):
         """
         Prepare this Flyer
         """
-        self.terminate_external_program()
-        self.launch_external_program()
+        self.terminate_simulator()
+        self.launch_simulator()
+        status = DeviceStatus(self)
+        status._finished(success=True)
+        return status
+
+    @property
+    def flying(self):
+        """has been kicked off and is not done yet"""
+        status = self._completion_status
+        return status is not None and not status.done
     
     def kickoff(self):
         """
         Start this flyer
         """
-        if self._completion_status is not None:
+        if self.flying:
             raise RuntimeError("Already kicked off.")
-        self._data = deque()
-
+        self.launch_simulator()
+        self._aborted = False
         self._completion_status = DeviceStatus(device=self)
 
-        thread = threading.Thread(target=self.activity, daemon=True)
-        thread.start()
+        def busy_cb(value=None, **kwargs):
+            if value in (0, "Done"):
+                self._unsubscribe()
+                self._completion_status._finished(success=not self._aborted)
 
-        return self._completion_status
-    
-    def describe_collect(self):
-        """
-        Provide schema & meta-data from ``collect()``
-        """
-        pass
+        # only changes from now on
+        self._busy_cid = self.busy.state.subscribe(busy_cb, run=False)
+        self.busy.state.put(1)
+
+        kickoff_status = DeviceStatus(self)
+        kickoff_status._finished(success=True)
+        return kickoff_status
+
+    def _unsubscribe(self):
+        if self._busy_cid is not None:
+            self.busy.state.unsubscribe(self._busy_cid)
+            self._busy_cid = None
     
     def complete(self):
         """
@@ -108,29 +119,84 @@ class BusyFlyer(Device):
         """
         if self._completion_status is None:
             raise RuntimeError("No collection in progress")
-        
-        # TODO: something?
-
         return self._completion_status
     
+    def describe_collect(self):
+        """
+        Provide schema & meta-data from ``collect()`` (made once)
+        """
+        if self._describe_collect is None:
+            schema = OrderedDict()
+            for item in self.waves:
+                schema[item.name] = dict(
+                    # (simulated signals have no pvname)
+                    source=getattr(item.wave, "pvname", item.wave.name),
+                    dtype="number",
+                    shape=[])
+            self._describe_collect = {self.name: schema}
+        return self._describe_collect
+
+    def read_waveforms(self):
+        """
+        read each waveform once, trimmed to the points collected (NORD)
+        
+        :returns: OrderedDict of name : numpy array, all the same length
+        """
+        arrays = OrderedDict()
+        for item in self.waves:
+            arrays[item.name] = np.asarray(item.wave.get())
+        nord = min(
+            [int(item.number_read.get()) for item in self.waves]
+            + [len(v) for v in arrays.values()])
+        for k, v in arrays.items():
+            arrays[k] = v[:nord]
+        return arrays
+
+    def _page(self):
+        """the scan as one event page (all points: time of the read)"""
+        if self.flying:
+            raise RuntimeError("No reading until done!")
+        self._completion_status = None
+        arrays = self.read_waveforms()
+        n = min(len(v) for v in arrays.values())
+        times = [time.time()] * n
+        data = OrderedDict((k, v.tolist()) for k, v in arrays.items())
+        timestamps = {k: times for k in data}
+        return dict(time=times, data=data, timestamps=timestamps)
+    
     def collect(self):
         """
         Retrieve data from the flyer as *proto-events*
+        """
+        page = self._page()
+        keys = list(page["data"].keys())
+        for i, t in enumerate(page["time"]):
+            data = {k: page["data"][k][i] for k in keys}
+            timestamps = {k: t for k in keys}
+            yield dict(time=t, data=data, timestamps=timestamps)
 
-        Yields:	
-
-        event_data : dict
-
-            Must have the keys {‘time’, ‘timestamps’, ‘data’}.
-
+    def collect_pages(self):
+        """
+        Retrieve data from the flyer as one *proto-event-page*
         """
-        # TODO: want to monitor the two arrays
-        pass
+        page = self._page()
+        if len(page["time"]) > 0:
+            yield page
 
     def stop(self, *, success=False):
         """
         halt activity (motion) before it is complete
+        
+        Clearing the busy record ends the scan after the step
+        in progress, its status then reports failure.
         """
-        pass
+        if self.flying:
+            self._aborted = not success
+            self.busy.state.put(0)
+            self.motor.stop()
 
 ifly = BusyFlyer(name="ifly")
+
+# same, with simulated records (no IOC needed)
+_busy_sim = BusyIocSimulator()
+ifly_sim = sim_device(BusyFlyer, _busy_sim, simulator=_busy_sim, name="ifly_sim")
@@ -7,13 +7,23 @@ import APS_BlueSky_tools.filewriters
 from APS_BlueSky_tools.zmq_pair import ZMQ_Pair, mona_zmq_sender
 import bluesky.plan_stubs as bps
 
+from dispatcher import DocumentDispatcher
+
+
+# Callbacks get documents through the dispatcher: each one has its
+# own queue and thread, the RunEngine does not wait for them.
+# print(dispatcher.report()) shows queue depth and lag.
+# RE() returns once the run is collected and in the SPEC file (stop_wait).
+dispatcher = DocumentDispatcher(RE)
 
 doc_collector = APS_BlueSky_tools.callbacks.DocumentCollectorCallback()
-callback_db['doc_collector'] = RE.subscribe(doc_collector.receiver)
+callback_db['doc_collector'] = dispatcher.subscribe(
+    doc_collector.receiver, name="doc_collector", stop_wait=10)
 
 specwriter = APS_BlueSky_tools.filewriters.SpecWriterCallback()
 specwriter.newfile(os.path.join("/tmp", specwriter.spec_filename))
-callback_db['specwriter'] = RE.subscribe(specwriter.receiver)
+callback_db['specwriter'] = dispatcher.subscribe(
+    specwriter.receiver, name="specwriter", stop_wait=60)
 print("SPEC data file:", specwriter.spec_filename)
 
 
@@ -128,20 +138,25 @@ def demo_setup_mona_callback_as_zmq_client(host=None):
         
         # ... use the queue
         
+        dispatcher.wait()   # documents still queued are sent
         zmq_talker.end()
         exit   # end the ipython BlueSky session
     
+    The talker gets documents through the dispatcher (``block``:
+    none are lost, the RunEngine waits only if 1000 are queued).
     """
     prune_list = "doc_collector specwriter zmq_talker BestEffortCallback".split()
     prune_list = "specwriter zmq_talker BestEffortCallback".split()
     for key in prune_list:
         if key in callback_db:
-            RE.unsubscribe(callback_db[key])
+            # (also the callbacks subscribed directly to RE)
+            dispatcher.unsubscribe(callback_db[key])
             del callback_db[key]
     zmq_talker = MonaCallback0MQ(
         detector=adsimdet.image,
         signal_name=adsimdet.image.array_counter.name,
         rotation_name=m1.user_readback.name,
         host=host)
-    callback_db['zmq_talker'] = RE.subscribe(zmq_talker.receiver)
+    callback_db['zmq_talker'] = dispatcher.subscribe(
+        zmq_talker.receiver, name="zmq_talker", policy="block")
     return zmq_talker
@@ -0,0 +1,425 @@
+
+"""
+ADStreamFlyer: hardware triggered area detector fly scan, streamed to HDF5
+
+Motor motion triggers the camera (see ``setup_det_trigger()`` in
+25-areadetector.py).  Instead of capturing all frames in memory
+and writing one file at the end (``det_pre_acquire()`` and
+``det_post_acquire()``), the HDF5 plugin writes each frame as it
+arrives (``Stream`` mode) and the flyer hands the frames on
+while the motor is still moving:
+
+* each HDF5 file is a *resource*, registered once the file is open
+  (at kickoff for the first file)
+* as the ArrayCounter advances, the frames written since the last
+  update (NumCaptured) become one *datum page* and one *event page*
+* a file holds at most ``frames_per_file`` frames (from
+  ``max_file_bytes`` and the frame size); the plugin closes the
+  file when it is full and the flyer opens the next one
+
+Frames that arrive while the next file is being opened are not
+written; ``frames_lost`` counts them.
+
+``stop()`` halts the motor.  While flying, the fly scan ends as if
+the motor had arrived: the last file is closed, its frames get
+their datums, and the plugin is restored.  While moving to
+``pos_start``, the fly scan ends there (fails), the plugin restored.
+
+USAGE (in an IPython startup file)::
+
+    ad_flyer = ADStreamFlyer(m3, simdet, pos_start=-2, pos_finish=2, name="ad_flyer")
+    RE(bp.fly([ad_flyer]))
+
+.. autosummary::
+
+   ~ADStreamFlyer
+"""
+
+
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
+import time
+import uuid
+
+from ophyd import Device, DeviceStatus
+
+from spin_flyer import status_when, when_done
+
+logger = logging.getLogger(__name__)
+
+BYTES_PER_PIXEL = {
+    "Int8": 1, "UInt8": 1,
+    "Int16": 2, "UInt16": 2,
+    "Int32": 4, "UInt32": 4,
+    "Float32": 4, "Float64": 8,
+}
+
+
+def new_uid():
+    return str(uuid.uuid4())
+
+
+class ADStreamFlyer(Device):
+    """
+    move a motor, stream the triggered frames to HDF5 files
+
+    Kickoff
+
+    * motor moved to ``pos_start`` (taxi)
+    * HDF5 plugin set to stream frames, first file opened (resource)
+    * motion started towards ``pos_finish`` (fly)
+
+    Complete
+
+    * done when the motor has arrived and the last file is closed
+
+    Collect
+
+    * ``collect_asset_docs()``: resources and datum pages
+    * ``collect_pages()``: event pages (one image datum per frame),
+      ``collect()``: the same as events
+
+    All can be called while flying, each returns what is new.
+
+    Parameters
+
+    motor : EpicsMotor
+        its motion triggers the frames
+    detector : area detector
+        with ``hdf1`` plugin
+    pos_start, pos_finish : float
+        motion of the fly scan
+    write_path : str, optional
+        directory for the HDF5 files, as seen by the IOC
+        (default: ``/tmp``)
+    file_name : str, optional
+        HDF5 file names: ``file_name_NNNN.h5`` (default: ``name``)
+    max_file_bytes : int, optional
+        largest HDF5 file, image data (default: 2 GB)
+    timeout : float, optional
+        seconds to wait for the HDF5 plugin (default: 10)
+
+    .. autosummary::
+
+       ~kickoff
+       ~complete
+       ~stop
+       ~describe_collect
+       ~collect_asset_docs
+       ~collect_pages
+       ~collect
+    """
+
+    def __init__(self,
+                 motor,
+                 detector,
+                 pos_start=-20,
+                 pos_finish=20,
+                 write_path="/tmp",
+                 file_name=None,
+                 max_file_bytes=2 * 1024**3,
+                 timeout=10,
+                 **kwargs):
+        super().__init__('', parent=None, **kwargs)
+        self.motor = motor
+        self.detector = detector
+        self.pos_start = pos_start
+        self.pos_finish = pos_finish
+        self.write_path = write_path
+        self.file_name = file_name or self.name
+        self.max_file_bytes = max_file_bytes
+        self.timeout = timeout
+        self.stream_name = self.name
+        self.image_key = self.name + "_image"
+
+        self.frames_per_file = 1
+        self.frames_written = 0     # this fly scan, all files
+        self.frames_lost = 0        # arrived while no file was open
+        self.files = []             # full names of this fly scan's files
+
+        self._kickoff_status = None
+        self._completion_status = None
+        self._flying = False
+        self._stop_requested = False
+        self._resource = None       # resource document of the open file
+        self._frames_in_file = 0    # frames of the open file, with datums
+        self._asset_docs = deque()
+        self._pages = deque()
+        self._shape = None
+        self._subscriptions = []
+        self._update_pending = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    # - - - - - - - - - - - the fly scan, one stage at a time
+
+    def _submit(self, function, *args):
+        """run ``function(*args)`` in the worker thread"""
+        self._executor.submit(self._guarded, function, *args)
+
+    def _guarded(self, function, *args):
+        try:
+            function(*args)
+        except Exception as exc:
+            self._fail(exc)
+
+    def _fail(self, exc):
+        logger.error("%s failed: %s", self.name, exc)
+        self._flying = False
+        self._unsubscribe()
+        try:
+            self._restore_plugin()
+        except Exception as restore_exc:
+            logger.error("%s: HDF5 plugin not restored: %s", self.name, restore_exc)
+        for status in (self._kickoff_status, self._completion_status):
+            if status is not None and not status.done:
+                status._finished(success=False)
+
+    def _after(self, status, function, *args):
+        """when ``status`` is done, continue with ``function(*args)``"""
+        def _continue(st):
+            if st.success:
+                self._submit(function, *args)
+            else:
+                reason = "stopped" if self._stop_requested else "did not succeed"
+                msg = "{}: {} {}".format(self.name, function.__name__, reason)
+                self._submit(self._fail, RuntimeError(msg))
+        when_done(status, _continue)
+
+    def kickoff(self):
+        """
+        Start this Flyer (status is done once the motor flies)
+        """
+        if self._completion_status is not None and not self._completion_status.done:
+            raise RuntimeError("Already kicked off.")
+        self._kickoff_status = DeviceStatus(self)
+        self._completion_status = DeviceStatus(self)
+        self.frames_written = 0
+        self.frames_lost = 0
+        self.files = []
+        self._stop_requested = False
+        self._asset_docs.clear()
+        self._pages.clear()
+        self._submit(self._prepare)
+        return self._kickoff_status
+
+    def _prepare(self):
+        cam, hdf = self.detector.cam, self.detector.hdf1
+        self._shape = [
+            int(cam.array_size.array_size_y.get()),
+            int(cam.array_size.array_size_x.get())]
+        frame_bytes = self._shape[0] * self._shape[1]
+        frame_bytes *= BYTES_PER_PIXEL.get(cam.data_type.get(as_string=True), 8)
+        self.frames_per_file = max(1, self.max_file_bytes // max(frame_bytes, 1))
+
+        hdf.enable.put("Enable")
+        hdf.file_path.put(self.write_path)
+        hdf.file_name.put(self.file_name)
+        hdf.file_template.put("%s%s_%4.4d.h5")
+        hdf.auto_increment.put("Yes")
+        hdf.file_write_mode.put("Stream")
+        hdf.num_capture.put(self.frames_per_file)
+
+        self._after(self.motor.set(self.pos_start), self._open_file, self._fly)
+
+    def _open_file(self, then=None):
+        """start capture, a new file: then ``then()``"""
+        hdf = self.detector.hdf1
+        opened = status_when(
+            self, hdf.capture, lambda value: value in (1, "Capture"),
+            timeout=self.timeout)
+        hdf.capture.put(1)
+        self._after(opened, self._file_opened, then)
+
+    def _file_opened(self, then=None):
+        """new resource for the open file"""
+        full_name = self.detector.hdf1.full_file_name.get(as_string=True)
+        self.files.append(full_name)
+        self._resource = dict(
+            uid=new_uid(),
+            spec="AD_HDF5",
+            root="/",
+            resource_path=os.path.relpath(full_name, "/"),
+            resource_kwargs=dict(frame_per_point=1),
+            path_semantics="posix",
+        )
+        self._frames_in_file = 0
+        self._asset_docs.append(("resource", self._resource))
+        if then is not None:
+            then()
+
+    def _fly(self):
+        hdf = self.detector.hdf1
+
+        def frames_cb(**kwargs):
+            # one update waiting is enough: it reads NumCaptured
+            if not self._update_pending.is_set():
+                self._update_pending.set()
+                self._submit(self._new_frames)
+
+        def capture_cb(value=None, **kwargs):
+            if value in (0, "Done") and self._flying:
+                self._submit(self._file_full)
+
+        def moved(st):
+            # arrived or stopped: close the last file either way
+            if not st.success and not self._stop_requested:
+                logger.warning("%s: fly move did not succeed", self.name)
+            self._submit(self._landed)
+
+        hdf.array_counter.put(0)    # counts the frames of this flight
+        self._kickoff_status._finished(success=True)
+        if self._stop_requested:    # stopped before the fly move
+            self._landed()
+            return
+        self._subscriptions = [
+            (hdf.array_counter, hdf.array_counter.subscribe(frames_cb, run=False)),
+            (hdf.capture, hdf.capture.subscribe(capture_cb, run=False)),
+        ]
+        self._flying = True
+        when_done(self.motor.set(self.pos_finish), moved)
+
+    def _new_frames(self):
+        """datum & event pages for the frames written since last time"""
+        self._update_pending.clear()
+        if self._resource is None:
+            return
+        written = int(self.detector.hdf1.num_captured.get())
+        first, last = self._frames_in_file, min(written, self.frames_per_file)
+        if last <= first:
+            return
+        now = time.time()
+        res_uid = self._resource["uid"]
+        datum_ids = ["{}/{}".format(res_uid, i) for i in range(first, last)]
+        self._asset_docs.append(("datum_page", dict(
+            resource=res_uid,
+            datum_id=datum_ids,
+            datum_kwargs=dict(point_number=list(range(first, last))),
+        )))
+        n = len(datum_ids)
+        self._pages.append(dict(
+            time=[now] * n,
+            data={self.image_key: datum_ids},
+            timestamps={self.image_key: [now] * n},
+            filled={self.image_key: [False] * n},
+        ))
+        self._frames_in_file = last
+        self.frames_written += n
+
+    def _file_full(self):
+        """plugin closed the file (NumCapture reached): open the next one"""
+        self._new_frames()
+        self._resource = None
+        self._open_file()
+
+    def _landed(self):
+        """motor arrived: end capture, close the last file"""
+        self._flying = False
+        hdf = self.detector.hdf1
+        closed = status_when(
+            self, hdf.capture, lambda value: value in (0, "Done"),
+            timeout=self.timeout)
+        if hdf.capture.get() in (0, "Done"):
+            closed = DeviceStatus(self)
+            closed._finished(success=True)
+        else:
+            hdf.capture.put(0)
+        self._after(closed, self._closed)
+
+    def _closed(self):
+        self._unsubscribe()
+        self._new_frames()
+        self._resource = None
+        counted = int(self.detector.hdf1.array_counter.get())
+        self.frames_lost = max(0, counted - self.frames_written)
+        if self.frames_lost:
+            logger.warning(
+                "%s: %d frames not written (between files)",
+                self.name, self.frames_lost)
+        self._restore_plugin()
+        self._completion_status._finished(success=True)
+
+    def _restore_plugin(self):
+        """HDF5 plugin: capture ended, Single mode, disabled"""
+        hdf = self.detector.hdf1
+        if hdf.capture.get() not in (0, "Done"):
+            hdf.capture.put(0)
+        hdf.file_write_mode.put("Single")
+        hdf.num_capture.put(1)
+        hdf.enable.put("Disable")
+
+    def _unsubscribe(self):
+        for signal, cid in self._subscriptions:
+            signal.unsubscribe(cid)
+        self._subscriptions = []
+
+    # - - - - - - - - - - - ophyd Flyer interface
+
+    def complete(self):
+        """
+        Wait for flying to be complete
+        """
+        if self._completion_status is None:
+            raise RuntimeError("No collection in progress")
+        return self._completion_status
+
+    def stop(self, *, success=False):
+        """
+        halt the motor (taxi or fly move)
+
+        While flying, the last file is closed as after a full scan.
+        """
+        if self._completion_status is not None and not self._completion_status.done:
+            self._stop_requested = True
+            self.motor.stop()
+
+    def describe_collect(self):
+        """
+        Provide schema & meta-data from ``collect()``
+        """
+        dd = OrderedDict()
+        dd[self.image_key] = dict(
+            source="PV:" + self.detector.hdf1.prefix,
+            dtype="array",
+            shape=self._shape or [],
+            external="FILESTORE:")
+        return {self.stream_name: dd}
+
+    def read_configuration(self):
+        return OrderedDict()
+
+    def describe_configuration(self):
+        return OrderedDict()
+
+    def _take(self, queue):
+        items = []
+        while len(queue) > 0:
+            items.append(queue.popleft())
+        return items
+
+    def collect_asset_docs(self):
+        """
+        resource and datum page documents, new since the last call
+        """
+        yield from self._take(self._asset_docs)
+
+    def collect_pages(self):
+        """
+        Retrieve data from the flyer as *proto-event-pages*
+        """
+        yield from self._take(self._pages)
+
+    def collect(self):
+        """
+        Retrieve data from the flyer as *proto-events*
+        """
+        for page in self._take(self._pages):
+            for i, t in enumerate(page["time"]):
+                yield dict(
+                    time=t,
+                    data={k: v[i] for k, v in page["data"].items()},
+                    timestamps={k: v[i] for k, v in page["timestamps"].items()},
+                    filled={k: v[i] for k, v in page["filled"].items()},
+                )
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+"""
+benchmark: SpinFlyer turnaround between spins
+
+polling vs. event driven vs. pipelined (file write during the next taxi)
+
+Runs a multi-spin fly scan with simulated devices (no EPICS IOC):
+the motor takes ``--move`` seconds for each move and the HDF5 file
+takes ``--write`` seconds to write.  Reports the total time, the
+time the devices were busy, and the idle (dead) time per spin.
+
+The *polling* variant reproduces the previous SpinFlyer sequence:
+blocking moves (ophyd's ``wait(status)`` polls every 50 ms), poll
+the WriteFile readback every 10 ms and ``complete()`` polls the
+motor every 50 ms.
+"""
+
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+from ophyd import DeviceStatus, Signal
+
+sys.path.insert(0, os.path.dirname(__file__))
+from spin_flyer import SpinFlyer
+
+
+class SimMotor(object):
+    """motor: each move takes ``move_time`` seconds"""
+
+    def __init__(self, move_time):
+        self.move_time = move_time
+        self.position = 0.0
+        self.moving = False
+        self.name = "sim_motor"
+
+    def set(self, position):
+        status = DeviceStatus(self)
+        self.moving = True
+
+        def _arrived():
+            self.position = position
+            self.moving = False
+            status._finished(success=True)
+
+        threading.Timer(self.move_time, _arrived).start()
+        return status
+
+    def move(self, position, wait=True, poll_rate=0.05):
+        """as EpicsMotor.move: ophyd's ``wait(status)`` polls every 50 ms"""
+        status = self.set(position)
+        while wait and not status.done:
+            time.sleep(poll_rate)
+        return status
+
+    def describe_configuration(self):
+        return {}
+
+
+class SimWriteFile(Signal):
+    """HDF5 WriteFile: readback is 1 for ``write_time`` seconds after put(1)"""
+
+    write_time = 0
+    hdf1 = None
+
+    def put(self, value, **kwargs):
+        super().put(value, **kwargs)
+        if value:
+            file_name = self.hdf1.file_name.get()
+            threading.Timer(self.write_time, self._written, args=(file_name,)).start()
+
+    def _written(self, file_name):
+        self.hdf1.full_file_name.put("/tmp/{}.h5".format(file_name))
+        super().put(0)
+
+
+class _Obj(object):
+    pass
+
+
+def sim_detector(write_time):
+    """area detector with the cam & hdf1 signals SpinFlyer uses"""
+    det = _Obj()
+    det.cam = _Obj()
+    det.hdf1 = _Obj()
+    det.cam.array_counter = Signal(name="array_counter", value=0)
+    for attr in "enable file_write_mode num_capture capture".split():
+        setattr(det.hdf1, attr, Signal(name=attr, value=0))
+    det.hdf1.file_name = Signal(name="file_name", value="spin")
+    det.hdf1.full_file_name = Signal(name="full_file_name", value="")
+    det.hdf1.write_file = SimWriteFile(name="write_file", value=0)
+    det.hdf1.write_file.write_time = write_time
+    det.hdf1.write_file.hdf1 = det.hdf1
+    det.describe_configuration = lambda: {}
+    return det
+
+
+class PollingSpinFlyer(SpinFlyer):
+    """the previous sequence: blocking moves and polling"""
+
+    poll_delay_s = 0.05
+
+    def kickoff(self):
+        self._data.clear()
+        self._completion_status = DeviceStatus(device=self)
+        threading.Thread(target=self._spin_sequence, daemon=True).start()
+        return self._completion_status
+
+    def _spin_sequence(self):
+        self.return_position = self.motor.position
+        for spin_num in range(self.num_spins):
+            self.timings.append({})
+            self.motor.move(self.pos_start + self.pre_start)
+            self.pre_fly(file_name=self.file_name(spin_num))
+            self.motor.move(self.pos_finish)
+            self.post_fly()
+            time.sleep(0.01)    # (the previous code's first poll)
+            while self.detector.hdf1.write_file.get():
+                time.sleep(0.01)    # wait for file to be written
+            self._data.append(self._spin_event(spin_num))
+        self.motor.move(self.return_position, wait=False)
+        self._completion_status._finished(success=True)
+
+    def complete(self):
+        while self.motor.moving:
+            time.sleep(self.poll_delay_s)
+        return self._completion_status
+
+
+class SerialSpinFlyer(SpinFlyer):
+    """event driven, but the next taxi waits for the file to be written"""
+
+    def _write(self, spin):
+        written = self._stage(self.file_written(), spin, "write")
+        self.post_fly()
+        self._after([written], self._spin_done, spin)
+        if spin + 1 < self.num_spins:
+            self._after([written], self._taxi, spin + 1)
+        else:
+            self._after([written], self._return)
+
+    def _return(self):
+        moved = self.motor.set(self.return_position)
+        self._after([moved], self._sequence_done)
+
+
+def run(flyer_class, spins, move_time, write_time):
+    """one fly scan, return total seconds"""
+    busy = Signal(name="busy", value=0)
+    flyer = flyer_class(
+        SimMotor(move_time), sim_detector(write_time), busy,
+        num_spins=spins, name="spin_flyer")
+    t0 = time.time()
+    flyer.kickoff()
+    status = flyer.complete()
+    while not status.done:
+        time.sleep(0.001)
+    elapsed = time.time() - t0
+    events = list(flyer.collect())
+    assert len(events) == spins
+    file_names = set(e["data"]["full_file_name"] for e in events)
+    assert len(file_names) == spins, "file names collide"
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--spins", type=int, default=10)
+    parser.add_argument("--move", type=float, default=0.05, help="seconds per move")
+    parser.add_argument("--write", type=float, default=0.03, help="seconds per file")
+    args = parser.parse_args()
+
+    m, w, n = args.move, args.write, args.spins
+    ideal = dict(
+        serial=n * (2 * m + w) + m,
+        pipelined=m + n * m + (n - 1) * max(m, w) + max(m, w),
+    )
+    print("{} spins, {:.0f} ms moves, {:.0f} ms file writes".format(n, 1000 * m, 1000 * w))
+    print("device time: serial {serial:.3f} s, pipelined {pipelined:.3f} s".format(**ideal))
+    fmt = "{:<10s} {:>10s} {:>12s} {:>14s}"
+    print(fmt.format("flyer", "total_s", "ms/spin", "dead ms/spin"))
+    variants = (
+        ("polling", PollingSpinFlyer, "serial"),
+        ("events", SerialSpinFlyer, "serial"),
+        ("pipelined", SpinFlyer, "pipelined"),
+    )
+    for label, cls, kind in variants:
+        total = run(cls, n, m, w)
+        print(fmt.format(
+            label,
+            "%.3f" % total,
+            "%.1f" % (1000 * total / n),
+            "%.1f" % (1000 * (total - ideal[kind]) / n)))
+
+if __name__ == "__main__":
+    main()
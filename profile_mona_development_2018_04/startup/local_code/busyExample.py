@@ -28,6 +28,14 @@ Description:
 #. set the swait.PROC field to 1 (recalculate a new value)
 #. To end the python program abruptly, press ^C in the terminal
 
+Options (``./busyExample.py -h``) set the number of steps
+(at most the waveforms' NELM) and how often the waveforms are
+written: after ``--batch`` new points (default: NELM/100) or
+``--period`` seconds (default: 0.1), whichever comes first, and
+at the end of the scan.  The points
+are kept in arrays allocated once (NELM long), each write sends
+the points so far (the IOC sets NORD to that number).
+
 Custom EPICS database (``P="prj:"``)::
 
     record(waveform, "$(P)x_array")
@@ -73,10 +81,12 @@ EXAMPLE::
 """
 
 
+import argparse
 import epics        # http://cars9.uchicago.edu/software/python/pyepics3
 import logging
 import numpy
 import threading
+import time
 
 logging.basicConfig(level=logging.INFO) 
 
@@ -91,7 +101,8 @@ MAX_WAVEFORM_LENGTH = 256
 
 class Demonstrator(object):
     
-    def __init__(self, busy_pv_name, motor_pv_name, calc_pv_name, x_pv_name, y_pv_name):
+    def __init__(self, busy_pv_name, motor_pv_name, calc_pv_name, x_pv_name, y_pv_name,
+                 num_steps=5, batch_size=None, publish_period=0.1):
         self.busy = epics.PV(busy_pv_name)
         
         # motor: the independent variable
@@ -106,15 +117,38 @@ class Demonstrator(object):
         # waveforms: the results
         self.x = epics.PV(x_pv_name)
         self.y = epics.PV(y_pv_name)
+        self.waveforms = (self.x, self.y)
 
         self.cb_index = None
         self.processing = False
         
         # arbitrary choices for a demo program
-        self.num_steps = min(5, MAX_WAVEFORM_LENGTH)
         self.step_size = 2.1
         self.origin = -1.23456
 
+        # points of a scan, in arrays as long as the waveforms (NELM)
+        self.nelm = self.waveform_length()
+        self.buffers = [numpy.zeros(self.nelm) for _ in self.waveforms]
+        if num_steps > self.nelm:
+            logging.warning(
+                "%d steps requested, waveforms hold %d", num_steps, self.nelm)
+        self.num_steps = min(num_steps, self.nelm)
+        if batch_size is None:
+            batch_size = self.nelm // 100
+        self.batch_size = max(1, batch_size)    # write after this many points
+        if publish_period is not None and publish_period <= 0:
+            publish_period = None
+        self.publish_period = publish_period    # ... or after this many seconds
+        self.publish_count = 0                  # waveform writes, this scan
+
+    def waveform_length(self):
+        """shortest NELM of the waveforms"""
+        lengths = [epics.caget(pv.pvname + ".NELM") for pv in self.waveforms]
+        lengths = [int(n) for n in lengths if n is not None]
+        if len(lengths) == 0:
+            return MAX_WAVEFORM_LENGTH
+        return min(lengths)
+
     def monitor(self):
         if self.cb_index is None:
             self.cb_index = self.busy.add_callback(self.busy_callback)
@@ -139,7 +173,10 @@ class Demonstrator(object):
         logging.info("process() start")
         self.processing = True
         self.motor.move(self.origin, wait=True)
-        x, y = [], []
+        self.publish_count = 0
+        points = 0      # points in the buffers
+        published = 0   # points written to the waveforms
+        last_publish = time.time()
         for step_number in range(self.num_steps):
             if self.busy.value != 1:
                 logging.info("process() interrupted")
@@ -147,20 +184,65 @@ class Demonstrator(object):
             target = self.origin + step_number * self.step_size
             self.motor.move(target, wait=True)
             self.calc_proc.put(1)   # get a new value
-            x.append(self.motor.readback)
-            y.append(self.calc.value)
-            print(x[-1], y[-1])
-            self.x.put(numpy.array(x))
-            self.y.put(numpy.array(y))
+            values = (self.motor.readback, self.calc.value)
+            for buffer, value in zip(self.buffers, values):
+                buffer[points] = value
+            points += 1
+            logging.debug("point %d: %s", points, values)
+            now = time.time()
+            if (points - published >= self.batch_size
+                    or (self.publish_period is not None
+                        and now - last_publish >= self.publish_period)):
+                self.publish(points)
+                published = points
+                last_publish = now
+        if points > published:
+            self.publish(points)
         self.busy.put(0)
         self.processing = False
-        logging.info("process() complete")
+        logging.info(
+            "process() complete: %d points, %d waveform writes",
+            points, self.publish_count)
+
+    def publish(self, points):
+        """write the first ``points`` of each buffer to its waveform (NORD=points)"""
+        for pv, buffer in zip(self.waveforms, self.buffers):
+            pv.put(buffer[:points])
+        self.publish_count += 1
+
+
+def get_options():
+    parser = argparse.ArgumentParser(description="busy record demonstration")
+    parser.add_argument(
+        "--steps", type=int, default=5,
+        help="steps in a scan, at most NELM (default: 5)")
+    parser.add_argument(
+        "--batch", type=int, default=None,
+        help="write the waveforms after this many new points (default: NELM/100)")
+    parser.add_argument(
+        "--period", type=float, default=0.1,
+        help="... or after this many seconds (default: 0.1, 0: not used)")
+    return parser.parse_args()
 
 
 def main():
-    process = Demonstrator(BUSY_PV, MOTOR_PV, CALC_PV, X_PV, Y_PV)
+    options = get_options()
+    process = Demonstrator(
+        BUSY_PV, MOTOR_PV, CALC_PV, X_PV, Y_PV,
+        num_steps=options.steps,
+        batch_size=options.batch,
+        publish_period=options.period)
+    finished = threading.Event()
+
+    def calc_callback(value=None, **kwargs):
+        if value == 0:
+            finished.set()      # client set the calc to 0: time to quit
+
+    process.calc.add_callback(calc_callback)
     process.monitor()
-    while process.calc.value != 0:
+    if process.calc.value == 0:
+        finished.set()
+    while not finished.wait(1.0):   # sleeps, wakes to allow ^C
         pass
     process.unmonitor()     # not really needed, we're quitting anyway
 
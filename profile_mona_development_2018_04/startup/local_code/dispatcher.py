@@ -0,0 +1,321 @@
+
+"""
+deliver RunEngine documents to slow callbacks out of band
+
+A callback subscribed directly with ``RE.subscribe()`` runs in the
+RunEngine's loop: a slow database insert or file write delays the
+next motor move.  The ``DocumentDispatcher`` subscribes a small
+function instead that puts each document on a bounded queue.
+A worker thread (one per callback) takes the documents from the
+queue, in order, and calls the callback.
+
+When a queue is full, the callback's *policy* decides:
+
+==========  =====================================================
+policy      when the queue is full
+==========  =====================================================
+block       wait for room (no document is lost, acquisition
+            slows to the pace of the callback)
+drop        discard the new *event* (or *event_page*, *datum*)
+coalesce    a new *event* replaces the newest waiting event of
+            its descriptor (live displays: only the latest values)
+==========  =====================================================
+
+Documents that define a run (*start*, *descriptor*, *resource*,
+*stop*, ...) are never dropped or replaced, they wait for room.
+
+A callback that must be done with a run when ``RE()`` returns
+(such as the databroker insert, so ``db[-1]`` finds the whole run)
+is subscribed with ``stop_wait``: at the *stop* document, the
+RunEngine waits (up to that many seconds) for its queue to empty.
+
+A callback's exceptions are logged and counted (``errors`` in
+``report()``), the RunEngine does not see them.  The last one is
+raised again at the *stop* document (with ``stop_wait``) or by
+``wait()``.
+
+Callbacks that draw (such as ``BestEffortCallback``) must stay
+in the main thread: subscribe them with ``RE.subscribe()``.
+
+EXAMPLE::
+
+    dispatcher = DocumentDispatcher(RE)
+    callback_db['specwriter'] = dispatcher.subscribe(
+        specwriter.receiver, name="specwriter", policy="block")
+    ...
+    print(dispatcher.report())  # queue depth & lag of each callback
+    dispatcher.wait()           # until all queued documents are handled
+                                # (raises a callback's exception)
+
+.. autosummary::
+
+   ~DocumentDispatcher
+   ~QueuedCallback
+"""
+
+
+import atexit
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("block", "drop", "coalesce")
+
+# documents that may be discarded (drop) or replaced (coalesce)
+EXPENDABLE_DOCUMENTS = ("event", "event_page", "bulk_events", "datum", "datum_page")
+
+
+class QueuedCallback(object):
+    """
+    call ``callback(name, doc)`` in a worker thread, from a bounded queue
+
+    Parameters
+
+    callback : callable
+        receives ``(name, doc)``, as for ``RE.subscribe()``
+    name : str, optional
+        name to report (default: name of the callback)
+    maxsize : int, optional
+        most documents waiting in the queue (default: 1000)
+    policy : str, optional
+        ``block``, ``drop``, or ``coalesce`` (default: ``block``)
+    stop_wait : float, optional
+        at the *stop* document, seconds to wait for the queue to empty
+        (default: None, do not wait)
+
+    .. autosummary::
+
+       ~__call__
+       ~wait
+       ~raise_error
+       ~close
+       ~status
+    """
+
+    def __init__(self, callback, name=None, maxsize=1000, policy="block",
+                 stop_wait=None):
+        if policy not in POLICIES:
+            msg = "policy must be one of {}, received {!r}".format(POLICIES, policy)
+            raise ValueError(msg)
+        self.callback = callback
+        self.name = name or getattr(callback, "__name__", repr(callback))
+        self.policy = policy
+        self.stop_wait = stop_wait
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.received = 0
+        self.handled = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.error = None       # last exception, not yet raised again
+        self.max_depth = 0
+        self.lag = 0            # seconds, most recent document
+        self.max_lag = 0        # seconds
+        self._closed = False
+        self._worker = threading.Thread(
+            target=self._run, name="dispatch-" + self.name, daemon=True)
+        self._worker.start()
+
+    def __call__(self, name, doc):
+        """RunEngine subscription: queue the document"""
+        self.received += 1
+        item = (name, doc, time.time())
+        if self.policy == "block" or name not in EXPENDABLE_DOCUMENTS:
+            self.queue.put(item)
+        else:
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                if self.policy == "coalesce" and self._replace(item):
+                    self.coalesced += 1
+                else:
+                    self.dropped += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        if name == "stop" and self.stop_wait is not None:
+            if not self.wait(self.stop_wait):
+                logger.warning(
+                    "callback %s: run not handled after %s s (%d waiting)",
+                    self.name, self.stop_wait, self.queue.qsize())
+            self.raise_error()
+
+    def _replace(self, item):
+        """coalesce: replace the newest waiting event of the same descriptor"""
+        name, doc, _t = item
+        if name != "event":
+            return False
+        with self.queue.mutex:
+            waiting = self.queue.queue      # collections.deque
+            for i in range(len(waiting) - 1, -1, -1):
+                w_name, w_doc, w_time = waiting[i]
+                if w_name == "event" and w_doc["descriptor"] == doc["descriptor"]:
+                    waiting[i] = (name, doc, w_time)
+                    return True
+        return False
+
+    def _run(self):
+        """worker thread: handle documents in order"""
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                name, doc, enqueued = item
+                self.lag = time.time() - enqueued
+                self.max_lag = max(self.max_lag, self.lag)
+                try:
+                    self.callback(name, doc)
+                    self.handled += 1
+                except Exception as exc:
+                    self.errors += 1
+                    self.error = exc
+                    logger.exception(
+                        "callback %s failed on %s document: %s", self.name, name, exc)
+            finally:
+                self.queue.task_done()
+
+    def wait(self, timeout=None):
+        """
+        wait until all queued documents are handled
+
+        :returns: True if the queue is empty, False if timed out
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while self.queue.unfinished_tasks > 0:
+            if deadline is not None and time.time() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def raise_error(self):
+        """raise the callback's last exception (once), if any"""
+        exc, self.error = self.error, None
+        if exc is not None:
+            raise exc
+
+    def close(self, timeout=None):
+        """handle the queued documents, then stop the worker thread"""
+        if not self._closed:
+            self._closed = True
+            try:
+                self.queue.put(None, timeout=timeout)
+            except queue.Full:
+                logger.warning(
+                    "callback %s: %d documents not handled",
+                    self.name, self.queue.qsize())
+                return
+            self._worker.join(timeout)
+
+    def status(self):
+        """dict of the queue measurements"""
+        return dict(
+            name=self.name,
+            policy=self.policy,
+            depth=self.queue.qsize(),
+            max_depth=self.max_depth,
+            maxsize=self.queue.maxsize,
+            received=self.received,
+            handled=self.handled,
+            dropped=self.dropped,
+            coalesced=self.coalesced,
+            errors=self.errors,
+            lag=self.lag,
+            max_lag=self.max_lag,
+        )
+
+
+class DocumentDispatcher(object):
+    """
+    subscribe callbacks to a RunEngine, each with its own queue and thread
+
+    Parameters
+
+    RE : RunEngine
+        the RunEngine to subscribe
+
+    .. autosummary::
+
+       ~subscribe
+       ~unsubscribe
+       ~wait
+       ~close
+       ~report
+    """
+
+    def __init__(self, RE):
+        self.RE = RE
+        self.callbacks = {}     # RE subscription token : QueuedCallback
+        atexit.register(self.close, timeout=5)
+
+    def subscribe(self, callback, name=None, maxsize=1000, policy="block",
+                  stop_wait=None):
+        """
+        subscribe ``callback`` to all documents, through a queue
+
+        (arguments as ``QueuedCallback``)
+
+        :returns: token from ``RE.subscribe()`` (so
+            ``RE.unsubscribe(token)`` works as before)
+        """
+        queued = QueuedCallback(
+            callback, name=name, maxsize=maxsize, policy=policy,
+            stop_wait=stop_wait)
+        token = self.RE.subscribe(queued)
+        self.callbacks[token] = queued
+        return token
+
+    def unsubscribe(self, token):
+        """unsubscribe, handle the queued documents, stop the worker"""
+        self.RE.unsubscribe(token)
+        queued = self.callbacks.pop(token, None)
+        if queued is not None:
+            queued.close()
+
+    def wait(self, timeout=None):
+        """
+        wait until every callback has handled its queued documents
+
+        Then raises the last exception of a callback, if any.
+
+        :returns: True if all queues are empty, False if timed out
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        done = True
+        for queued in list(self.callbacks.values()):
+            remaining = None if deadline is None else max(deadline - time.time(), 0)
+            if not queued.wait(remaining):
+                done = False
+                break
+        for queued in list(self.callbacks.values()):
+            queued.raise_error()
+        return done
+
+    def close(self, timeout=None):
+        """handle all queued documents, then stop the worker threads"""
+        for queued in list(self.callbacks.values()):
+            queued.close(timeout)
+
+    def report(self):
+        """table of queue depth, lag, and losses of each callback"""
+        lines = []
+        fmt = "  {:<20s} {:<8s} {:>11s} {:>8s} {:>8s} {:>7s} {:>7s} {:>6s} {:>8s} {:>8s}"
+        lines.append("document dispatch")
+        lines.append(fmt.format(
+            "callback", "policy", "depth", "received", "handled",
+            "dropped", "merged", "errors", "lag_s", "max_lag"))
+        for queued in self.callbacks.values():
+            s = queued.status()
+            lines.append(fmt.format(
+                s["name"],
+                s["policy"],
+                "{}/{}".format(s["depth"], s["max_depth"]),
+                str(s["received"]),
+                str(s["handled"]),
+                str(s["dropped"]),
+                str(s["coalesced"]),
+                str(s["errors"]),
+                "%.3f" % s["lag"],
+                "%.3f" % s["max_lag"]))
+        return "\n".join(lines)
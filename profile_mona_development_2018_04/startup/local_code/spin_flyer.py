@@ -0,0 +1,482 @@
+
+"""
+SpinFlyer: spins of the tomo stage, run as an ophyd Flyer object
+
+Each stage of a spin starts from the completion callbacks of the
+stages it waits for (motor done moving, HDF5 file written), there
+is no polling and no thread waits on a sleep.  Callbacks hand the
+next stage to one worker thread, so the EPICS puts and gets of
+a stage never run in a Channel Access callback.
+
+Stages of one spin:
+
+======  ============================================  =======================
+stage   action                                        done when
+======  ============================================  =======================
+taxi    move to ``pos_start + pre_start``             motor done moving
+fly     prepare HDF5 capture, move to ``pos_finish``  motor done moving
+write   end capture, write the HDF5 file              WriteFile_RBV back to 0
+======  ============================================  =======================
+
+The spins are pipelined: while the HDF5 file of spin N is written,
+the motor taxis for spin N+1 (after the last spin: returns to where
+it started).  Spin N+1 flies once both are done, so the HDF5 plugin
+is not re-armed while it writes.  Each spin writes its own file
+(``file_name_template``) so the files cannot collide.
+
+::
+
+    spin N    | taxi | fly | write |
+    spin N+1                | taxi  | fly | write |
+
+Each collected event has the file name and the seconds of each
+stage of its spin.
+
+USAGE (in an IPython startup file, local_code/ is on
+``sys.path`` from 00-startup.py)::
+
+    from spin_flyer import SpinFlyer
+    spin_flyer = SpinFlyer(m3, simdet, mybusy.state, name="spin_flyer")
+    spin_flyer.num_spins = 5
+    RE(bp.fly([spin_flyer]))
+
+.. autosummary::
+
+   ~SpinFlyer
+   ~status_when
+   ~when_done
+"""
+
+
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+from ophyd import Device, DeviceStatus
+
+logger = logging.getLogger(__name__)
+
+
+def when_done(status, callback):
+    """
+    call ``callback(status)`` once ``status`` is done (any ophyd version)
+
+    Any number of callbacks may be added to the same status.
+    """
+    if hasattr(status, "add_callback"):
+        status.add_callback(callback)
+        return
+    # older ophyd: one finished_cb, it calls all of them in turn
+    callbacks = getattr(status, "_when_done_callbacks", None)
+    if callbacks is None:
+        callbacks = status._when_done_callbacks = []
+
+        def _call_all(*args, **kwargs):
+            for cb in list(callbacks):
+                cb(status)
+
+        status.finished_cb = _call_all
+    if status.done:
+        callback(status)
+    else:
+        callbacks.append(callback)
+
+
+def status_when(device, signal, predicate, timeout=None):
+    """
+    status that is done when ``predicate(value)`` of ``signal`` is True
+
+    Only updates after this call are considered.  The status fails
+    after ``timeout`` seconds (if given).
+
+    :returns: DeviceStatus of ``device``
+    """
+    status = DeviceStatus(device)
+    lock = threading.Lock()
+
+    def _finish(success):
+        with lock:
+            if status.done:
+                return
+            signal.unsubscribe(cid)
+            if timer is not None:
+                timer.cancel()
+            status._finished(success=success)
+
+    def _cb(value=None, **kwargs):
+        if predicate(value):
+            _finish(True)
+
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, _finish, args=(False,))
+        timer.daemon = True
+    cid = signal.subscribe(_cb, run=False)
+    if timer is not None:
+        timer.start()
+    return status
+
+
+class SpinFlyer(Device):
+    """
+    spins of the tomo stage, run as ophyd Flyer object
+
+    Kickoff
+
+    * motor starts at initial position
+    * for each spin:
+
+      * moved to pre-start (taxi) position
+      * detector prepared for acquisition on motor increments
+      * motion towards end position (fly)
+      * HDF5 file written, during the next taxi
+
+    * motor returned to initial position (during the last write)
+
+    Complete
+
+    * done when the motor has returned
+
+    Collect
+
+    * one event per spin: name of the HDF5 file and
+      seconds of each stage (``<name>_taxi_s``, ...)
+
+    Parameters
+
+    motor : EpicsMotor
+        rotation stage
+    detector : area detector
+        with ``hdf1`` plugin (images triggered by motor motion)
+    busy : EpicsSignal
+        set while a ``set()`` operation is running
+    num_spins : int, optional
+        spins in one fly scan (default: 1)
+    write_timeout : float, optional
+        seconds to wait for an HDF5 file to be written (default: 60)
+    file_name_template : str, optional
+        HDF5 file name of each spin, formatted with ``name``,
+        ``start`` (kickoff time: YYYYmmdd_HHMMSS) and ``spin``
+        (default: ``"{name}_{start}_{spin:03d}"``)
+
+    .. autosummary::
+
+       ~taxi
+       ~fly
+       ~set
+       ~pre_fly
+       ~post_fly
+       ~file_name
+       ~file_written
+       ~kickoff
+       ~complete
+       ~collect
+       ~describe_collect
+    """
+
+    def __init__(self,
+                 motor,
+                 detector,
+                 busy,
+                 pre_start=-0.5,
+                 pos_start=-20,
+                 pos_finish=20,
+                 loop=None,         # not used, kept for existing callers
+                 num_spins=1,
+                 write_timeout=60,
+                 file_name_template="{name}_{start}_{spin:03d}",
+                 **kwargs):
+        super().__init__('', parent=None, **kwargs)
+        self.motor = motor
+        self.detector = detector
+        self.busy = busy
+        self.pre_start = pre_start
+        self.return_position = motor.position
+        self.pos_start = pos_start
+        self.pos_finish = pos_finish
+        self.stream_name = "spin_flyer_stream"
+
+        self.num_spins = num_spins
+        self.write_timeout = write_timeout
+        self.file_name_template = file_name_template
+        self.stages = ("taxi", "fly", "write")
+        self.timings = []           # per spin: OrderedDict(stage=seconds)
+        self.idle_s = 0             # seconds a stage was ready but not started
+
+        self._completion_status = None
+        self._data = deque()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._start_time = None
+
+    def taxi(self):
+        """move to the pre_start position, returns the motor's status"""
+        # pre_start position is far enough before pos_start to ramp up to speed
+        position = self.pos_start + self.pre_start
+        return self.motor.set(position)
+
+    def fly(self):
+        """move to the finish position, returns the motor's status"""
+        return self.motor.set(self.pos_finish)
+
+    def set(self, value):       # interface for BlueSky plans
+        """value is either Taxi, Fly, or Return"""
+        value = str(value).lower()
+        if value not in ("fly", "taxi", "return"):
+            msg = "value should be either Taxi, Fly, or Return."
+            msg += " received " + str(value)
+            raise ValueError(msg)
+
+        if self.busy.get():
+            raise RuntimeError("spin is operating")
+
+        status = DeviceStatus(self)
+
+        def _done(success=True):
+            self.busy.put(False)
+            status._finished(success=success)
+
+        def _fly_done(st):
+            self._submit(self.post_fly)
+            self._submit(_done, st.success)
+
+        self.busy.put(True)
+        if value == "taxi":
+            when_done(self.taxi(), lambda st: _done(st.success))
+        elif value == "fly":
+            self.pre_fly()
+            when_done(self.fly(), _fly_done)
+        elif value == "return":
+            st = self.motor.set(self.return_position)
+            when_done(st, lambda st: _done(st.success))
+        return status
+
+    def file_name(self, spin):
+        """HDF5 file name (no extension) for ``spin`` (0-based)"""
+        return self.file_name_template.format(
+            name=self.name, start=self._start_time, spin=spin + 1)
+
+    def pre_fly(self, max_frames=10000, file_name=None):
+        """ """
+        if file_name is not None:
+            # one file per spin
+            self.detector.hdf1.file_name.put(file_name)
+
+        # reset the array counter
+        self.detector.cam.array_counter.put(0)
+
+        # enable the HDF5 plugin
+        self.detector.hdf1.enable.put("Enable")
+
+        # prepare to capture a stream of image frames in one array
+        self.detector.hdf1.file_write_mode.put("Capture")
+
+        # collect as many as this number
+        self.detector.hdf1.num_capture.put(max_frames)
+
+        # start to capture the stream
+        self.detector.hdf1.capture.put("Capture")
+
+    def post_fly(self):
+        """ """
+        # stream is now fully captured
+        self.detector.hdf1.capture.put("Done")
+
+        # write the HDF5 file
+        self.detector.hdf1.write_file.put(1)
+
+        # reset the HDF5 plugin to some default settings
+        self.detector.hdf1.file_write_mode.put("Single")
+        self.detector.hdf1.num_capture.put(1)
+        self.detector.hdf1.enable.put("Disable")
+
+    def file_written(self):
+        """
+        status: done when the HDF5 file has been written
+
+        Call before ``post_fly()``: WriteFile_RBV goes to 1 while
+        the file is written and then back to 0.
+        """
+        seen = []
+
+        def _written(value):
+            if value:
+                seen.append(value)
+            return len(seen) > 0 and not value
+
+        return status_when(
+            self, self.detector.hdf1.write_file, _written,
+            timeout=self.write_timeout)
+
+    def kickoff(self):
+        """
+        Start a flyer
+        """
+        if self._completion_status is not None:
+            raise RuntimeError("Already kicked off.")
+        self._data = deque()
+        self.timings = []
+        self.idle_s = 0
+        self.return_position = self.motor.position
+        self._start_time = time.strftime("%Y%m%d_%H%M%S")
+        self._completion_status = DeviceStatus(device=self)
+        self._submit(self._taxi, 0)
+
+        kickoff_status = DeviceStatus(self)
+        kickoff_status._finished(success=True)
+        return kickoff_status
+
+    # - - - - - - - - - - - the spin sequence, pipelined
+
+    def _submit(self, function, *args):
+        """run ``function(*args)`` in the worker thread"""
+        self._executor.submit(self._guarded, function, *args)
+
+    def _guarded(self, function, *args):
+        try:
+            function(*args)
+        except Exception as exc:
+            self._fail(exc)
+
+    def _fail(self, exc):
+        logger.error("spin flyer failed: %s", exc)
+        status = self._completion_status
+        if status is not None and not status.done:
+            status._finished(success=False)
+
+    def _after(self, statuses, function, *args):
+        """
+        when all ``statuses`` are done, continue with ``function(*args)``
+
+        The time the last status was done is kept, to measure
+        the idle time until ``function`` starts the next stage.
+        """
+        remaining = [len(statuses)]
+        lock = threading.Lock()
+
+        def _continue(st):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if not st.success:
+                msg = "a stage of spin flyer {} did not succeed".format(self.name)
+                self._submit(self._fail, RuntimeError(msg))
+            elif last:
+                self._submit(self._ready, time.time(), function, *args)
+
+        for status in statuses:
+            when_done(status, _continue)
+
+    def _ready(self, ready_time, function, *args):
+        """start the next stage, count the time since it could have started"""
+        if self._completion_status is None or self._completion_status.done:
+            return      # failed or stopped
+        self.idle_s += time.time() - ready_time
+        function(*args)
+
+    def _stage(self, status, spin, name):
+        """time stage ``name`` of ``spin``, from now until ``status`` is done"""
+        while len(self.timings) <= spin:
+            self.timings.append(OrderedDict())
+        timings = self.timings[spin]
+        t0 = time.time()
+
+        def _record(st):
+            timings[name] = time.time() - t0
+
+        when_done(status, _record)
+        return status
+
+    def _taxi(self, spin):
+        taxied = self._stage(self.taxi(), spin, "taxi")
+        self._after([taxied], self._fly, spin)
+
+    def _fly(self, spin):
+        self.pre_fly(file_name=self.file_name(spin))
+        flown = self._stage(self.fly(), spin, "fly")
+        self._after([flown], self._write, spin)
+
+    def _write(self, spin):
+        """write the file of this spin, meanwhile taxi for the next (or return)"""
+        written = self._stage(self.file_written(), spin, "write")
+        self.post_fly()     # also disables the HDF5 plugin: no frames in the taxi
+        self._after([written], self._spin_done, spin)
+        if spin + 1 < self.num_spins:
+            moved = self._stage(self.taxi(), spin + 1, "taxi")
+            self._after([written, moved], self._fly, spin + 1)
+        else:
+            moved = self._stage(self.motor.set(self.return_position), spin, "return")
+            self._after([written, moved], self._sequence_done)
+
+    def _spin_done(self, spin):
+        self._data.append(self._spin_event(spin))
+
+    def _sequence_done(self):
+        self._completion_status._finished(success=True)
+
+    def _spin_event(self, spin):
+        """proto-event of one spin: file name and stage timings"""
+        event = OrderedDict()
+        event["time"] = time.time()
+        event["seq_num"] = spin + 1
+        event["data"] = {}
+        event["timestamps"] = {}
+        for d_item in (self.detector.hdf1.full_file_name,):
+            d = d_item.read()
+            for k, v in d.items():
+                event['data'][k] = v['value']
+                event['timestamps'][k] = v['timestamp']
+        timings = self.timings[spin]
+        for stage in self.stages:
+            k = self._timing_key(stage)
+            event['data'][k] = timings.get(stage, 0)
+            event['timestamps'][k] = event["time"]
+        return event
+
+    def _timing_key(self, stage):
+        return "{}_{}_s".format(self.name, stage)
+
+    # - - - - - - - - - - -
+
+    def describe_collect(self):
+        """
+        Provide schema & meta-data from ``collect()``
+        """
+        dd = dict()
+        dd.update(self.detector.hdf1.full_file_name.describe())
+        for stage in self.stages:
+            dd[self._timing_key(stage)] = dict(
+                source="SpinFlyer", dtype="number", shape=[], units="s")
+        return {self.stream_name: dd}
+
+    def read_configuration(self):
+        """
+        """
+        return OrderedDict()
+
+    def describe_configuration(self):
+        """
+        """
+        dd = dict()
+        for obj in (self.motor, self.detector, self.busy):
+            dd.update(obj.describe_configuration())
+        return OrderedDict()
+
+    def complete(self):
+        """
+        Wait for flying to be complete
+        """
+        if self._completion_status is None:
+            raise RuntimeError("No collection in progress")
+        return self._completion_status
+
+    def collect(self):
+        """
+        Retrieve data from the flyer as *proto-events*
+        """
+        if self._completion_status is None or not self._completion_status.done:
+            raise RuntimeError("No reading until done!")
+        self._completion_status = None
+
+        yield from self._data
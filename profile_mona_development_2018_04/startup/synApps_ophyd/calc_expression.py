@@ -0,0 +1,413 @@
+
+"""
+EPICS calc expressions (CALC field of swait, calc, calcout), evaluated with numpy
+
+``compile_calc()`` parses the expression once (the compiled
+expressions are cached) into numpy ufunc calls.  Each input (A-L,
+VAL) may be a number or an array: the result is computed for all
+elements at once, as the record would compute it for each::
+
+    calc = compile_calc("D*(0.95+E*RNDM)/exp(((A-b)/c)^2)")
+    y = calc(A=np.linspace(-2, 2, 1000000), B=0, C=0.5, D=1e5, E=0.05)
+
+    trigger = compile_calc("C&&(A!=B)")
+    trigger(A=0, B=1, C=1)      # 1.0
+
+Syntax (names are not case sensitive):
+
+==============  ===============================================
+operands        ``A`` - ``L``, ``VAL``, numbers (also ``0x1F``)
+constants       ``PI D2R R2D S2R R2S``
+random          ``RNDM`` (uniform, 0 to 1), ``NRNDM`` (normal)
+unary           ``- + ! ~ NOT``
+binary          ``^ ** * / % + - >? <?``,
+                ``< <= > >= = == != #``,
+                ``&& & AND >> <<``, ``|| | OR XOR``
+conditional     ``a ? b : c``
+functions       ``ABS SQR SQRT EXP LOG LN LOGE SIN COS TAN ASIN ACOS
+                ATAN ATAN2 SINH COSH TANH CEIL FLOOR NINT ISINF``,
+                ``MAX MIN ISNAN FINITE`` (any number of arguments)
+==============  ===============================================
+
+Binary operators are listed from high to low precedence, each
+group left to right.  Unary operators bind tighter than any binary
+operator (``-2^2`` is 4), ``?:`` is the loosest.  As in EPICS:
+``%`` and the bit operators act on the values truncated to
+integers, ``=`` is a comparison, ``LOG`` is base 10, ``SQR`` is the
+square root, ``ATAN2(a,b)`` is C's ``atan2(b,a)``, and true is 1.
+Division by zero gives inf or NaN (no exception).
+Assignment (``:=``) and several statements (``;``) are not supported.
+
+.. autosummary::
+
+   ~compile_calc
+   ~evaluate_calc
+   ~CalcExpression
+   ~CalcSyntaxError
+"""
+
+
+from functools import lru_cache
+import math
+import re
+
+import numpy as np
+
+
+__all__ = """
+    compile_calc
+    evaluate_calc
+    CalcExpression
+    CalcSyntaxError
+    """.split()
+
+OPERANDS = tuple("ABCDEFGHIJKL") + ("VAL",)
+
+CONSTANTS = dict(
+    PI=math.pi,
+    D2R=math.pi / 180,
+    R2D=180 / math.pi,
+    S2R=math.pi / 180 / 3600,
+    R2S=180 * 3600 / math.pi,
+)
+
+# operator: (precedence, python template)
+BINARY = {
+    "^": (7, "np.power({0}, {1})"),
+    "**": (7, "np.power({0}, {1})"),
+    "*": (6, "np.multiply({0}, {1})"),
+    "/": (6, "np.true_divide({0}, {1})"),
+    "%": (6, "np.fmod(np.trunc({0}), np.trunc({1}))"),
+    "+": (5, "np.add({0}, {1})"),
+    "-": (5, "np.subtract({0}, {1})"),
+    ">?": (4, "np.maximum({0}, {1})"),
+    "<?": (4, "np.minimum({0}, {1})"),
+    "<": (3, "_f(np.less({0}, {1}))"),
+    "<=": (3, "_f(np.less_equal({0}, {1}))"),
+    ">": (3, "_f(np.greater({0}, {1}))"),
+    ">=": (3, "_f(np.greater_equal({0}, {1}))"),
+    "=": (3, "_f(np.equal({0}, {1}))"),
+    "==": (3, "_f(np.equal({0}, {1}))"),
+    "!=": (3, "_f(np.not_equal({0}, {1}))"),
+    "#": (3, "_f(np.not_equal({0}, {1}))"),
+    "&&": (2, "_f(np.logical_and({0}, {1}))"),
+    "&": (2, "_f(np.bitwise_and(_i({0}), _i({1})))"),
+    "AND": (2, "_f(np.bitwise_and(_i({0}), _i({1})))"),
+    ">>": (2, "_f(np.right_shift(_i({0}), _i({1})))"),
+    "<<": (2, "_f(np.left_shift(_i({0}), _i({1})))"),
+    "||": (1, "_f(np.logical_or({0}, {1}))"),
+    "|": (1, "_f(np.bitwise_or(_i({0}), _i({1})))"),
+    "OR": (1, "_f(np.bitwise_or(_i({0}), _i({1})))"),
+    "XOR": (1, "_f(np.bitwise_xor(_i({0}), _i({1})))"),
+}
+
+UNARY = {
+    "-": "np.negative({0})",
+    "+": "{0}",
+    "!": "_f(np.logical_not({0}))",
+    "NOT": "_f(np.logical_not({0}))",
+    "~": "_f(np.invert(_i({0})))",
+}
+
+# function: (number of arguments (None: any), python template)
+FUNCTIONS = {
+    "ABS": (1, "np.absolute({0})"),
+    "SQR": (1, "np.sqrt({0})"),
+    "SQRT": (1, "np.sqrt({0})"),
+    "EXP": (1, "np.exp({0})"),
+    "LOG": (1, "np.log10({0})"),
+    "LN": (1, "np.log({0})"),
+    "LOGE": (1, "np.log({0})"),
+    "SIN": (1, "np.sin({0})"),
+    "COS": (1, "np.cos({0})"),
+    "TAN": (1, "np.tan({0})"),
+    "ASIN": (1, "np.arcsin({0})"),
+    "ACOS": (1, "np.arccos({0})"),
+    "ATAN": (1, "np.arctan({0})"),
+    "ATAN2": (2, "np.arctan2({1}, {0})"),
+    "SINH": (1, "np.sinh({0})"),
+    "COSH": (1, "np.cosh({0})"),
+    "TANH": (1, "np.tanh({0})"),
+    "CEIL": (1, "np.ceil({0})"),
+    "FLOOR": (1, "np.floor({0})"),
+    "NINT": (1, "_nint({0})"),
+    "ISINF": (1, "_f(np.isinf({0}))"),
+    "MAX": (None, "np.maximum({0}, {1})"),
+    "MIN": (None, "np.minimum({0}, {1})"),
+    "ISNAN": (None, "_f(np.logical_or({0}, {1}))"),
+    "FINITE": (None, "_f(np.logical_and({0}, {1}))"),
+}
+# arguments of the functions with any number: each one first
+EACH_ARGUMENT = {
+    "MAX": "{0}",
+    "MIN": "{0}",
+    "ISNAN": "np.isnan({0})",
+    "FINITE": "np.isfinite({0})",
+}
+
+TOKEN = re.compile(r"""
+    \s*(?:
+    (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+    |(?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    |(?P<op>:=|\*\*|>=|<=|==|!=|&&|\|\||>>|<<|>\?|<\?|[-+*/%^<>=\#!~&|?:(),;])
+    )""", re.VERBOSE)
+
+
+class CalcSyntaxError(ValueError):
+    """the expression is not valid EPICS calc syntax"""
+
+
+def _f(x):
+    """true/false as 1/0 (as the record)"""
+    return np.asarray(x, dtype=float)
+
+
+def _i(x):
+    """truncated to integer (bit operators)"""
+    return np.trunc(x).astype(np.int64)
+
+
+def _nint(x):
+    """nearest integer, halves away from zero"""
+    return np.where(np.greater_equal(x, 0), np.floor(np.add(x, 0.5)), np.ceil(np.subtract(x, 0.5)))
+
+
+def _tokenize(expression):
+    tokens = []
+    pos = 0
+    text = expression.rstrip()
+    while pos < len(text):
+        match = TOKEN.match(text, pos)
+        if match is None or match.end() == pos:
+            msg = "cannot read {!r} at position {}".format(text[pos:], pos)
+            raise CalcSyntaxError(msg)
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "name":
+            value = value.upper()
+            if value in ("AND", "OR", "XOR", "NOT"):
+                kind = "op"
+        elif kind == "op" and value in (":=", ";"):
+            msg = "{!r} is not supported: {}".format(value, expression)
+            raise CalcSyntaxError(msg)
+        tokens.append((kind, value, match.start(kind)))
+        pos = match.end()
+    tokens.append(("end", None, len(text)))
+    return tokens
+
+
+class _Parser(object):
+    """expression -> python source (numpy ufunc calls)"""
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = _tokenize(expression)
+        self.index = 0
+        self.operands = set()
+        self.random = False
+
+    def error(self, msg):
+        _kind, value, pos = self.tokens[self.index]
+        where = "end" if value is None else "{!r} (position {})".format(value, pos)
+        return CalcSyntaxError("{} at {}: {}".format(msg, where, self.expression))
+
+    def peek(self):
+        return self.tokens[self.index]
+
+    def take(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def expect(self, value):
+        if self.peek()[1] != value:
+            raise self.error("expected {!r}".format(value))
+        self.take()
+
+    def parse(self):
+        source = self.conditional()
+        if self.peek()[0] != "end":
+            raise self.error("unexpected")
+        return source
+
+    def conditional(self):
+        condition = self.binary(1)
+        if self.peek()[1] != "?" or self.peek()[0] != "op":
+            return condition
+        self.take()
+        if_true = self.conditional()
+        self.expect(":")
+        if_false = self.conditional()
+        return "np.where({}, {}, {})".format(condition, if_true, if_false)
+
+    def binary(self, min_precedence):
+        left = self.unary()
+        while True:
+            kind, value, _pos = self.peek()
+            if kind != "op" or value not in BINARY:
+                return left
+            precedence, template = BINARY[value]
+            if precedence < min_precedence:
+                return left
+            self.take()
+            right = self.binary(precedence + 1)     # left to right
+            left = template.format(left, right)
+
+    def unary(self):
+        kind, value, _pos = self.peek()
+        if kind == "op" and value in UNARY:
+            self.take()
+            return UNARY[value].format(self.unary())
+        return self.primary()
+
+    def primary(self):
+        kind, value, _pos = self.peek()
+        if kind == "number":
+            self.take()
+            number = int(value, 16) if value[:2] in ("0x", "0X") else float(value)
+            return repr(float(number))
+        if kind == "op" and value == "(":
+            self.take()
+            source = self.conditional()
+            self.expect(")")
+            return "({})".format(source)
+        if kind == "name":
+            if value in OPERANDS:
+                self.take()
+                self.operands.add(value)
+                return value
+            if value in CONSTANTS:
+                self.take()
+                return repr(CONSTANTS[value])
+            if value in ("RNDM", "NRNDM"):
+                self.take()
+                self.random = True
+                return "_{}()".format(value.lower())
+            if value in FUNCTIONS:
+                return self.function()
+            raise self.error("unknown name")
+        raise self.error("expected a value")
+
+    def function(self):
+        _kind, name, _pos = self.take()
+        self.expect("(")
+        args = [self.conditional()]
+        while self.peek()[1] == ",":
+            self.take()
+            args.append(self.conditional())
+        self.expect(")")
+        num_args, template = FUNCTIONS[name]
+        if num_args is None:
+            each = [EACH_ARGUMENT[name].format(arg) for arg in args]
+            source = each[0]
+            for arg in each[1:]:
+                source = template.format(source, arg)
+            if len(each) == 1 and name in ("ISNAN", "FINITE"):
+                source = "_f({})".format(source)
+            return source
+        if len(args) != num_args:
+            msg = "{} takes {} argument(s)".format(name, num_args)
+            raise self.error(msg)
+        return template.format(*args)
+
+
+class CalcExpression(object):
+    """
+    a compiled EPICS calc expression: call with the inputs
+
+    Make with ``compile_calc()`` (cached).
+
+    Parameters
+
+    expression : str
+        EPICS calc syntax (such as a swait record CALC field)
+
+    Attributes: ``expression``, ``source`` (python, numpy),
+    ``operands`` (inputs used, sorted), ``random`` (uses RNDM).
+
+    .. autosummary::
+
+       ~__call__
+    """
+
+    def __init__(self, expression):
+        parser = _Parser(expression)
+        self.expression = expression
+        self.source = parser.parse()
+        self.operands = tuple(sorted(parser.operands))
+        self.random = parser.random
+        self._code = compile(self.source, "<calc {!r}>".format(expression), "eval")
+        # names of the expression, operands default to 0
+        self._namespace = dict(np=np, _f=_f, _i=_i, _nint=_nint)
+        self._namespace.update((name, 0.0) for name in self.operands)
+
+    def __repr__(self):
+        return "CalcExpression({!r})".format(self.expression)
+
+    def __call__(self, rng=None, shape=None, **inputs):
+        """
+        evaluate, for all elements of the inputs
+
+        Parameters
+
+        inputs :
+            ``A`` - ``L``, ``VAL`` (numbers or arrays, default 0),
+            names not case sensitive
+        rng : numpy.random.RandomState, optional
+            for RNDM & NRNDM (default: numpy's)
+        shape : tuple, optional
+            of the result, if no input is an array of that shape
+
+        :returns: numpy array (shape of the inputs, broadcast),
+            or float if all inputs are numbers
+        """
+        namespace = dict(self._namespace)
+        arrays = []     # inputs that are not numbers: shape of the result
+        for name, value in inputs.items():
+            if name not in OPERANDS:
+                name = name.upper()
+                if name not in OPERANDS:
+                    raise KeyError("no calc input {}".format(name))
+            if isinstance(value, (int, float)):
+                value = float(value)
+            else:
+                value = np.asarray(value, dtype=float)
+                arrays.append(value)
+            if name in namespace:   # only the operands used
+                namespace[name] = value
+
+        # as if each element were processed by the record
+        if shape is not None:
+            arrays.append(np.broadcast_to(0.0, shape))
+        size = np.broadcast(*arrays).shape if len(arrays) > 0 else ()
+        if self.random:
+            rng = rng or np.random
+            n = size or None     # scalar
+            namespace["_rndm"] = lambda: rng.random_sample(n)
+            namespace["_nrndm"] = lambda: rng.standard_normal(n)
+
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            result = eval(self._code, namespace)
+        if size == ():
+            return float(result)
+        result = np.asarray(result, dtype=float)
+        if result.shape != size:
+            result = np.broadcast_to(result, size).copy()
+        if result.ndim == 0:
+            return float(result)
+        return result
+
+
+@lru_cache(maxsize=256)
+def compile_calc(expression):
+    """
+    compiled ``CalcExpression`` of ``expression`` (cached)
+
+    raises ``CalcSyntaxError`` if not valid
+    """
+    return CalcExpression(expression)
+
+
+def evaluate_calc(expression, rng=None, shape=None, **inputs):
+    """``expression`` (compiled once) evaluated with these inputs"""
+    return compile_calc(expression)(rng=rng, shape=shape, **inputs)
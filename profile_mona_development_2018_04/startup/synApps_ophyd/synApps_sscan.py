@@ -13,6 +13,8 @@ from ophyd.device import (
     FormattedComponent as FC)
 from ophyd import EpicsSignal, EpicsSignalRO
 
+from .bulk_put import BulkPut, all_components
+
 
 __all__ = """
     EpicsSscanRecord  
@@ -35,22 +37,27 @@ class EpicsSscanPositioner(Device):
     abs_rel = FC(EpicsSignal, '{self.prefix}.P{self._ch_num}AR')
     mode = FC(EpicsSignal, '{self.prefix}.P{self._ch_num}SM')
     units = FC(EpicsSignalRO, '{self.prefix}.P{self._ch_num}EU')
+    array = FC(EpicsSignalRO, '{self.prefix}.P{self._ch_num}RA')
+    current_array = FC(EpicsSignalRO, '{self.prefix}.P{self._ch_num}CA')
 
     def __init__(self, prefix, num, **kwargs):
         self._ch_num = num
         super().__init__(prefix, **kwargs)
     
-    def reset(self):
+    def reset(self, bulk=None):
         """set all fields to default values"""
-        self.readback_pv.put("")
-        self.setpoint_pv.put("")
-        self.start.put(0)
-        self.center.put(0)
-        self.end.put(0)
-        self.step_size.put(0)
-        self.width.put(0)
-        self.abs_rel.put("ABSOLUTE")
-        self.mode.put("LINEAR")
+        puts = BulkPut() if bulk is None else bulk
+        puts.put(self.readback_pv, "")
+        puts.put(self.setpoint_pv, "")
+        puts.put(self.start, 0)
+        puts.put(self.center, 0)
+        puts.put(self.end, 0)
+        puts.put(self.step_size, 0)
+        puts.put(self.width, 0)
+        puts.put(self.abs_rel, "ABSOLUTE")
+        puts.put(self.mode, "LINEAR")
+        if bulk is None:
+            puts.send()
 
 
 class EpicsSscanDetector(Device):
@@ -58,14 +65,19 @@ class EpicsSscanDetector(Device):
     
     input_pv = FC(EpicsSignal, '{self.prefix}.D{self._ch_num}PV')
     current_value = FC(EpicsSignal, '{self.prefix}.D{self._ch_num}CV')
+    array = FC(EpicsSignalRO, '{self.prefix}.D{self._ch_num}DA')
+    current_array = FC(EpicsSignalRO, '{self.prefix}.D{self._ch_num}CA')
     
     def __init__(self, prefix, num, **kwargs):
         self._ch_num = num
         super().__init__(prefix, **kwargs)
     
-    def reset(self):
+    def reset(self, bulk=None):
         """set all fields to default values"""
-        self.input_pv.put("")
+        puts = BulkPut() if bulk is None else bulk
+        puts.put(self.input_pv, "")
+        if bulk is None:
+            puts.send()
 
 
 class EpicsSscanTrigger(Device):
@@ -78,42 +90,54 @@ class EpicsSscanTrigger(Device):
         self._ch_num = num
         super().__init__(prefix, **kwargs)
     
-    def reset(self):
+    def reset(self, bulk=None):
         """set all fields to default values"""
-        self.trigger_pv.put("")
-        self.trigger_value.put(1)
+        puts = BulkPut() if bulk is None else bulk
+        puts.put(self.trigger_pv, "")
+        puts.put(self.trigger_value, 1)
+        if bulk is None:
+            puts.send()
 
 
-def _sscan_positioners(channel_list):
+def _sscan_positioners(channel_list, lazy=True):
     defn = OrderedDict()
     for chan in channel_list:
         attr = 'p{}'.format(chan)
-        defn[attr] = (EpicsSscanPositioner, '', {'num': chan})
+        defn[attr] = (EpicsSscanPositioner, '', {'num': chan, 'lazy': lazy})
     return defn
 
 
-def _sscan_detectors(channel_list):
+def _sscan_detectors(channel_list, lazy=True):
     defn = OrderedDict()
     for chan in channel_list:
         attr = 'd{}'.format(chan)
-        defn[attr] = (EpicsSscanDetector, '', {'num': chan})
+        defn[attr] = (EpicsSscanDetector, '', {'num': chan, 'lazy': lazy})
     return defn
 
 
-def _sscan_triggers(channel_list):
+def _sscan_triggers(channel_list, lazy=True):
     defn = OrderedDict()
     for chan in channel_list:
-        attr = 'd{}'.format(chan)
-        defn[attr] = (EpicsSscanTrigger, '', {'num': chan})
+        attr = 't{}'.format(chan)
+        defn[attr] = (EpicsSscanTrigger, '', {'num': chan, 'lazy': lazy})
     return defn
 
 
 class EpicsSscanRecord(Device):
-    """EPICS synApps sscan record: used as $(P):userCalc$(N)"""
+    """
+    EPICS synApps sscan record: used as $(P):scan$(N)
+    
+    Each positioner, detector, and trigger channel is made when
+    first used, without waiting for its PVs to connect (as the
+    other signals).  ``wait_for_connection()`` or a ``BulkPut``
+    waits for them.  ``read()`` or ``describe()`` of the record
+    makes all channels (up to 78).
+    """
     
     desc = Cpt(EpicsSignal, '.DESC')
     faze = Cpt(EpicsSignalRO, '.FAZE')
     data_state = Cpt(EpicsSignalRO, '.DSTATE')
+    data_ready = Cpt(EpicsSignalRO, '.DATA')
     npts = Cpt(EpicsSignal, '.NPTS')
     cpt = Cpt(EpicsSignalRO, '.CPT')
     pasm = Cpt(EpicsSignal, '.PASM')
@@ -153,33 +177,50 @@ class EpicsSscanRecord(Device):
         )
     )
     
-    def reset(self):
-        """set all fields to default values"""
-        self.desc.put(self.desc.pvname.split(".")[0])
-        self.npts.put(1000)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
         for part in (self.positioners, self.detectors, self.triggers):
-            for ch_name in part.read_attrs:
-                channel = part.__getattr__(ch_name)
-                channel.reset()
-        self.a1pv.put("")
-        self.acqm.put("NORMAL")
+            # using a channel does not block until its PVs connect
+            part.lazy_wait_for_connection = False
+    
+    def reset(self, bulk=None):
+        """
+        set all fields to default values
+        
+        All puts are gathered in ``bulk`` (a ``BulkPut``).
+        Without ``bulk``, they are sent now, together.
+        """
+        puts = BulkPut() if bulk is None else bulk
+        puts.put(self.desc, self.desc.pvname.split(".")[0])
+        puts.put(self.npts, 1000)
+        for part in (self.positioners, self.detectors, self.triggers):
+            for channel in all_components(part):
+                channel.reset(puts)
+        puts.put(self.a1pv, "")
+        puts.put(self.acqm, "NORMAL")
         if self.name.find("scanH") > 0:
-            self.acqt.put("1D ARRAY")
+            puts.put(self.acqt, "1D ARRAY")
         else:
-            self.acqt.put("SCALAR")
-        self.aspv.put("")
-        self.bspv.put("")
-        self.pasm.put("STAY")
-        self.bswait.put("Wait")
-        self.a1cd.put(1)
-        self.ascd.put(1)
-        self.bscd.put(1)
-        self.refd.put(1)
-        self.atime.put(0)
-        self.awct.put(0)
-        self.copyto.put(0)
-        self.ddly.put(0)
-        self.pdly.put(0)
+            puts.put(self.acqt, "SCALAR")
+        puts.put(self.aspv, "")
+        puts.put(self.bspv, "")
+        puts.put(self.pasm, "STAY")
+        puts.put(self.bswait, "Wait")
+        puts.put(self.a1cd, 1)
+        puts.put(self.ascd, 1)
+        puts.put(self.bscd, 1)
+        puts.put(self.refd, 1)
+        puts.put(self.atime, 0)
+        puts.put(self.awct, 0)
+        puts.put(self.copyto, 0)
+        puts.put(self.ddly, 0)
+        puts.put(self.pdly, 0)
+        puts.call_after(self._clear_wait)
+        if bulk is None:
+            puts.send()
+
+    def _clear_wait(self):
+        """release the waits of clients (WCNT)"""
         while self.wcnt.get() > 0:
             self.wait.put(0)
 
@@ -197,10 +238,13 @@ class EpicsSscanDevice(Device):
     scanH = Cpt(EpicsSscanRecord, 'scanH')
     resume_delay = Cpt(EpicsSignal, 'scanResumeSEQ.DLY1')
 
-    def reset(self):
-        """set all fields to default values"""
-        self.scan1.reset()
-        self.scan2.reset()
-        self.scan3.reset()
-        self.scan4.reset()
-        self.scanH.reset()
+    def reset(self, bulk=None):
+        """set all fields to default values (all five records together)"""
+        puts = BulkPut() if bulk is None else bulk
+        self.scan1.reset(puts)
+        self.scan2.reset(puts)
+        self.scan3.reset(puts)
+        self.scan4.reset(puts)
+        self.scanH.reset(puts)
+        if bulk is None:
+            puts.send()
@@ -13,6 +13,11 @@ from ophyd.device import (
     FormattedComponent as FC)
 from ophyd import EpicsSignal, EpicsSignalRO, EpicsMotor
 
+from .bulk_put import BulkPut, all_components
+from .swait_sim import (
+    CALC_GAUSSIAN, CALC_LORENTZIAN, CALC_PSEUDOVOIGT,
+    CALC_RANDOM, CALC_INCREMENTER)
+
 
 __all__ = """
     EpicsSwaitRecord 
@@ -20,6 +25,7 @@ __all__ = """
     swait_setup_random_number 
     swait_setup_gaussian
     swait_setup_lorentzian 
+    swait_setup_pseudovoigt
     swait_setup_incrementer
 	""".split()
 
@@ -35,22 +41,31 @@ class EpicsSwaitRecordChannel(Device):
         self._ch_letter = letter
         super().__init__(prefix, **kwargs)
 
-    def reset(self):
+    def reset(self, bulk=None):
         """set all fields to default values"""
-        self.value.put(0)
-        self.input_pv.put("")
-        self.input_trigger.put("Yes")
+        puts = BulkPut() if bulk is None else bulk
+        puts.put(self.value, 0)
+        puts.put(self.input_pv, "")
+        puts.put(self.input_trigger, "Yes")
+        if bulk is None:
+            puts.send()
 
 
-def _swait_channels(channel_list):
+def _swait_channels(channel_list, lazy=True):
     defn = OrderedDict()
     for chan in channel_list:
-        defn[chan] = (EpicsSwaitRecordChannel, '', {'letter': chan})
+        defn[chan] = (EpicsSwaitRecordChannel, '', {'letter': chan, 'lazy': lazy})
     return defn
 
 
 class EpicsSwaitRecord(Device):
-    """synApps swait record: used as $(P):userCalc$(N)"""
+    """
+    synApps swait record: used as $(P):userCalc$(N)
+    
+    Each channel (A-L) is made when first used, without waiting
+    for its PVs to connect (as the other signals).
+    ``wait_for_connection()`` or a ``BulkPut`` waits for them.
+    """
     desc = Cpt(EpicsSignal, '.DESC')
     scan = Cpt(EpicsSignal, '.SCAN')
     calc = Cpt(EpicsSignal, '.CALC')
@@ -71,22 +86,34 @@ class EpicsSwaitRecord(Device):
         )
     )
     
-    def reset(self):
-        """set all fields to default values"""
-        self.desc.put(self.desc.pvname.split(".")[0])
-        self.scan.put("Passive")
-        self.calc.put("0")
-        self.prec.put("5")
-        self.dold.put(0)
-        self.doln.put("")
-        self.dopt.put("Use VAL")
-        self.flnk.put("0")
-        self.odly.put(0)
-        self.oopt.put("Every Time")
-        self.outn.put("")
-        for letter in self.channels.read_attrs:
-            channel = self.channels.__getattr__(letter)
-            channel.reset()
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # using a channel does not block until its PVs connect
+        self.channels.lazy_wait_for_connection = False
+    
+    def reset(self, bulk=None):
+        """
+        set all fields to default values
+        
+        All puts are gathered in ``bulk`` (a ``BulkPut``).
+        Without ``bulk``, they are sent now, together.
+        """
+        puts = BulkPut() if bulk is None else bulk
+        puts.put(self.desc, self.desc.pvname.split(".")[0])
+        puts.put(self.scan, "Passive")
+        puts.put(self.calc, "0")
+        puts.put(self.prec, "5")
+        puts.put(self.dold, 0)
+        puts.put(self.doln, "")
+        puts.put(self.dopt, "Use VAL")
+        puts.put(self.flnk, "0")
+        puts.put(self.odly, 0)
+        puts.put(self.oopt, "Every Time")
+        puts.put(self.outn, "")
+        for channel in all_components(self.channels):
+            channel.reset(puts)
+        if bulk is None:
+            puts.send()
 
 
 class EpicsUserCalcsDevice(Device):
@@ -104,25 +131,28 @@ class EpicsUserCalcsDevice(Device):
     calc9 = Cpt(EpicsSwaitRecord, 'userCalc9')
     calc10 = Cpt(EpicsSwaitRecord, 'userCalc10')
 
-    def reset(self):
-        """set all fields to default values"""
-        self.calc1.reset()
-        self.calc2.reset()
-        self.calc3.reset()
-        self.calc4.reset()
-        self.calc5.reset()
-        self.calc6.reset()
-        self.calc7.reset()
-        self.calc8.reset()
-        self.calc9.reset()
-        self.calc10.reset()
+    def reset(self, bulk=None):
+        """set all fields to default values (all ten records together)"""
+        puts = BulkPut() if bulk is None else bulk
+        self.calc1.reset(puts)
+        self.calc2.reset(puts)
+        self.calc3.reset(puts)
+        self.calc4.reset(puts)
+        self.calc5.reset(puts)
+        self.calc6.reset(puts)
+        self.calc7.reset(puts)
+        self.calc8.reset(puts)
+        self.calc9.reset(puts)
+        self.calc10.reset(puts)
+        if bulk is None:
+            puts.send()
 
 
 def swait_setup_random_number(swait, **kw):
     """setup swait record to generate random numbers"""
     swait.reset()
     swait.scan.put("Passive")
-    swait.calc.put("RNDM")
+    swait.calc.put(CALC_RANDOM)
     swait.scan.put(".1 second")
     swait.desc.put("uniform random numbers")
 
@@ -140,7 +170,7 @@ def swait_setup_gaussian(swait, motor, center=0, width=1, scale=1, noise=0.05):
     swait.channels.C.value.put(width)
     swait.channels.D.value.put(scale)
     swait.channels.E.value.put(noise)
-    swait.calc.put("D*(0.95+E*RNDM)/exp(((A-b)/c)^2)")
+    swait.calc.put(CALC_GAUSSIAN)
     swait.scan.put("I/O Intr")
     swait.desc.put("noisy Gaussian curve")
 
@@ -158,11 +188,30 @@ def swait_setup_lorentzian(swait, motor, center=0, width=1, scale=1, noise=0.05)
     swait.channels.C.value.put(width)
     swait.channels.D.value.put(scale)
     swait.channels.E.value.put(noise)
-    swait.calc.put("D*(0.95+E*RNDM)/(1+((A-b)/c)^2)")
+    swait.calc.put(CALC_LORENTZIAN)
     swait.scan.put("I/O Intr")
     swait.desc.put("noisy Lorentzian curve")
 
 
+def swait_setup_pseudovoigt(swait, motor, center=0, width=1, scale=1, noise=0.05, eta=0.5):
+    """setup swait record for noisy pseudo-Voigt (eta: Lorentzian fraction)"""
+    assert(isinstance(motor, EpicsMotor))
+    assert(width > 0)
+    assert(0.0 <= noise <= 1.0)
+    assert(0.0 <= eta <= 1.0)
+    swait.reset()
+    swait.scan.put("Passive")
+    swait.channels.A.input_pv.put(motor.user_readback.pvname)
+    swait.channels.B.value.put(center)
+    swait.channels.C.value.put(width)
+    swait.channels.D.value.put(scale)
+    swait.channels.E.value.put(noise)
+    swait.channels.F.value.put(eta)
+    swait.calc.put(CALC_PSEUDOVOIGT)
+    swait.scan.put("I/O Intr")
+    swait.desc.put("noisy pseudo-Voigt curve")
+
+
 def swait_setup_incrementer(swait, scan=None, limit=100000):
     """setup swait record as an incrementer"""
     # consider a noisy background, as well (needs a couple calcs)
@@ -172,6 +221,6 @@ def swait_setup_incrementer(swait, scan=None, limit=100000):
     pvname = swait.val.pvname.split(".")[0]
     swait.channels.A.input_pv.put(pvname)
     swait.channels.B.value.put(limit)
-    swait.calc.put("(A+1) % B")
+    swait.calc.put(CALC_INCREMENTER)
     swait.scan.put(scan)
     swait.desc.put("incrementer")